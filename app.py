@@ -0,0 +1,428 @@
+import gzip
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional
+
+from flask import Flask, Response, jsonify, render_template, request
+from flask_cors import CORS
+
+from main import AVAILABLE_STEPS, GRADE_RANGES, calculate_grades, calculate_metrics
+from salary_histogram import DEFAULT_PERCENTILES, SalaryHistogram, grades_from_percentiles, json_default
+from salary_stats import SOURCES, category_role_ids, load_normalized, load_salary_stats, load_sketch, stats_metrics
+from search_index import SearchIndex, build_search_index
+from skill_analytics import DEFAULT_MIN_COUNT, load_skill_matrix, skill_medians, skill_premiums
+from storage import DB_PATH, connect, migrate
+
+app = Flask(__name__)
+CORS(app)
+
+GRADE_NAMES = {'I': 'Intern', 'J': 'Junior', 'M': 'Middle', 'S': 'Senior', 'L': 'Lead'}
+DEFAULT_STEP = 10000
+RECORDS_LIMIT = 5000
+
+
+class LRUCache:
+    # Потокобезопасный LRU для готовых ответов API
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+
+response_cache = LRUCache()
+_local = threading.local()
+_version_lock = threading.Lock()
+_version_conn = None
+
+
+def get_conn() -> sqlite3.Connection:
+    # Своё соединение на поток: sqlite3 не любит общих соединений
+    if getattr(_local, 'conn', None) is None:
+        _local.conn = connect(DB_PATH)
+        migrate(_local.conn)
+    return _local.conn
+
+
+def data_version() -> int:
+    # PRAGMA data_version меняется, когда другое соединение (парсер)
+    # закоммитило изменения. Сервер сам не пишет, поэтому это и есть
+    # версия данных для ключей кэша.
+    global _version_conn
+    with _version_lock:
+        if _version_conn is None:
+            _version_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        return _version_conn.execute('PRAGMA data_version').fetchone()[0]
+
+
+@lru_cache(maxsize=1)
+def load_roles_data() -> Dict:
+    try:
+        with open('roles.json', 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+@lru_cache(maxsize=1)
+def load_roles() -> Dict[str, str]:
+    # id роли -> название
+    return {
+        role['id']: role['name']
+        for category in load_roles_data().get('categories', [])
+        for role in category.get('roles', [])
+    }
+
+
+@lru_cache(maxsize=1)
+def search_index() -> SearchIndex:
+    # Строится один раз при старте: названия ролей и заголовки из базы
+    return build_search_index(load_roles_data(), get_conn())
+
+
+@lru_cache(maxsize=1)
+def _roles_by_name() -> Dict[str, str]:
+    return {name.casefold(): role_id for role_id, name in load_roles().items()}
+
+
+def resolve_role(position: Optional[str]) -> Optional[str]:
+    if not position:
+        return None
+    position = position.strip()
+    if position in load_roles():
+        return position
+    # Название роли, иначе любая подсказка поиска (заголовок из базы)
+    return _roles_by_name().get(position.casefold()) or search_index().role_id(position)
+
+
+def _month(date: Optional[str]) -> Optional[str]:
+    return date[:7] if date else None
+
+
+@lru_cache(maxsize=64)
+def role_histograms(role_id: str, start_month: Optional[str], end_month: Optional[str], version: int) -> tuple:
+    # Отсортированные зарплаты роли за период; version в ключе сбрасывает
+    # кэш после новой загрузки данных
+    conn = get_conn()
+    histograms = []
+    for kind in ('resumes', 'vacancies'):
+        frame = load_normalized(conn, kind, role_ids=[role_id])
+        # parsed_month — неупорядоченная category, диапазон сравнивается по строкам
+        months = frame['parsed_month'].astype(object)
+        if start_month:
+            frame = frame[months >= start_month]
+            months = months[months >= start_month]
+        if end_month:
+            frame = frame[months <= end_month]
+        histograms.append(SalaryHistogram(frame['salary_rub']))
+    return tuple(histograms)
+
+
+def _build_entry(payload) -> Dict:
+    body = json.dumps(payload, ensure_ascii=False, default=json_default).encode('utf-8')
+    return {
+        'body': body,
+        # Сжимаем один раз при построении, дальше отдаём готовые байты
+        'gzip': gzip.compress(body, compresslevel=6) if len(body) >= 1024 else None,
+        'etag': hashlib.sha1(body).hexdigest(),
+    }
+
+
+def _json_response(entry: Dict) -> Response:
+    if request.if_none_match.contains(entry['etag']):
+        response = Response(status=304)
+        response.set_etag(entry['etag'])
+        return response
+
+    use_gzip = entry['gzip'] is not None and 'gzip' in request.accept_encodings
+    response = Response(entry['gzip'] if use_gzip else entry['body'], mimetype='application/json')
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(entry['etag'])
+    return response
+
+
+def cached_json(key: tuple, build) -> Response:
+    full_key = key + (data_version(),)
+    entry = response_cache.get(full_key)
+    if entry is None:
+        entry = _build_entry(build())
+        response_cache.put(full_key, entry)
+    return _json_response(entry)
+
+
+def _error(message: str, status: int = 400):
+    return jsonify({'error': message}), status
+
+
+def _step_arg() -> int:
+    step = request.args.get('step', DEFAULT_STEP, type=int)
+    return step if step and step > 0 else DEFAULT_STEP
+
+
+def _grade_ranges_arg() -> Dict[str, tuple]:
+    # Границы грейдов можно передать JSON-ом: {"J": [60000, 150000], ...}
+    raw = request.args.get('grades')
+    if not raw:
+        return GRADE_RANGES
+    ranges = json.loads(raw)
+    return {level: (float(bounds[0]), float(bounds[1])) for level, bounds in ranges.items()}
+
+
+def _grade_rows(histogram: SalaryHistogram, step: int, grade_ranges: Dict[str, tuple]) -> list:
+    grades = calculate_grades(histogram, step, grade_ranges)
+    rows = []
+    for level, (grade_min, grade_max) in grade_ranges.items():
+        values = histogram.range_values(grade_min, grade_max)
+        name = GRADE_NAMES.get(level, level)
+        rows.append({
+            'grade': name,
+            'experience': name,
+            'count': int(len(values)),
+            'avg_salary': float(values.mean()) if len(values) else None,
+            'min': float(values[0]) if len(values) else None,
+            'max': float(values[-1]) if len(values) else None,
+            **grades[level],
+        })
+    return rows
+
+
+def _series(role_id: str, kind: str, start_month: Optional[str], end_month: Optional[str]) -> list:
+    # Помесячная медиана из предрасчитанной salary_stats
+    return [
+        {'date': row['parsed_month'], 'salary': row['p50'], 'count': row['count']}
+        for row in load_salary_stats(get_conn(), kind, role_id)
+        if (not start_month or row['parsed_month'] >= start_month)
+        and (not end_month or row['parsed_month'] <= end_month)
+    ]
+
+
+@app.route('/api/search/positions')
+def search_positions():
+    query = request.args.get('query', '').strip()
+    limit = min(request.args.get('limit', 10, type=int), 100)
+    # Ответ зависит только от индекса, поэтому без версии данных
+    return jsonify(search_index().search(query, limit))
+
+
+@app.route('/api/salary-data')
+def salary_data():
+    position = request.args.get('position')
+    role_id = resolve_role(position)
+    if role_id is None:
+        return _error(f"Неизвестная должность: {position}", 404)
+    step = _step_arg()
+    start_month = _month(request.args.get('start_date'))
+    end_month = _month(request.args.get('end_date'))
+
+    def build():
+        # Диапазоны — из salary_stats; шаг, не кратный базовому, — по строкам
+        metrics = stats_metrics(get_conn(), role_id, step, start_month, end_month)
+        if metrics is None:
+            resume_hist, vacancy_hist = role_histograms(role_id, start_month, end_month, data_version())
+            metrics = calculate_metrics(resume_hist, vacancy_hist, step)
+        return {
+            'position': load_roles().get(role_id),
+            'role_id': role_id,
+            'step': step,
+            'ranges': [{'range': key, **value} for key, value in metrics.items()],
+            'vacancies': _series(role_id, 'vacancies', start_month, end_month),
+            'resumes': _series(role_id, 'resumes', start_month, end_month),
+        }
+
+    return cached_json(('salary-data', role_id, step, start_month, end_month), build)
+
+
+@app.route('/api/grade-stats')
+def grade_stats():
+    position = request.args.get('position')
+    role_id = resolve_role(position)
+    if role_id is None:
+        return _error(f"Неизвестная должность: {position}", 404)
+    step = _step_arg()
+    try:
+        grade_ranges = _grade_ranges_arg()
+    except (ValueError, TypeError, IndexError, AttributeError):
+        return _error("Некорректный параметр grades")
+    start_month = _month(request.args.get('start_date'))
+    end_month = _month(request.args.get('end_date'))
+
+    def build():
+        resume_hist, vacancy_hist = role_histograms(role_id, start_month, end_month, data_version())
+        return {
+            'vacancies': _grade_rows(vacancy_hist, step, grade_ranges),
+            'resumes': _grade_rows(resume_hist, step, grade_ranges),
+        }
+
+    grade_key = tuple(sorted(grade_ranges.items()))
+    return cached_json(('grade-stats', role_id, step, grade_key, start_month, end_month), build)
+
+
+@app.route('/api/category-stats')
+def category_stats():
+    # Перцентили по группе ролей (категория roles.json или несколько position)
+    # за произвольный период: слияние помесячных скетчей, без чтения строк
+    category = request.args.get('category')
+    if category:
+        role_ids = category_role_ids(load_roles_data(), category)
+    else:
+        role_ids = [resolve_role(position) for position in request.args.getlist('position')]
+    role_ids = sorted({role_id for role_id in role_ids if role_id})
+    if not role_ids:
+        return _error("Не указаны роли: нужен category или position", 404)
+    start_month = _month(request.args.get('start_date'))
+    end_month = _month(request.args.get('end_date'))
+
+    def build():
+        result = {'role_ids': role_ids}
+        for kind in ('vacancies', 'resumes'):
+            sketch = load_sketch(get_conn(), kind, role_ids, start_month, end_month)
+            result[kind] = {
+                'count': sketch.n,
+                'percentiles': dict(zip((f"p{q}" for q in DEFAULT_PERCENTILES),
+                                        sketch.percentiles(DEFAULT_PERCENTILES).tolist())),
+                'rank_error': sketch.rank_error_bound,
+            }
+        return result
+
+    return cached_json(('category-stats', tuple(role_ids), start_month, end_month), build)
+
+
+@app.route('/api/skill-stats')
+def skill_stats():
+    # Медиана зарплаты по навыкам роли и надбавка за навык относительно
+    # записей той же роли без него
+    position = request.args.get('position')
+    role_id = resolve_role(position)
+    if role_id is None:
+        return _error(f"Неизвестная должность: {position}", 404)
+    kind = request.args.get('kind', 'vacancies')
+    if kind not in SOURCES:
+        return _error(f"Неизвестный тип данных: {kind}")
+    min_count = max(request.args.get('min_count', DEFAULT_MIN_COUNT, type=int), 1)
+    limit = request.args.get('limit', 100, type=int)
+    start_month = _month(request.args.get('start_date'))
+    end_month = _month(request.args.get('end_date'))
+
+    def build():
+        matrix = load_skill_matrix(get_conn(), kind, [role_id], start_month, end_month)
+        medians = skill_medians(matrix, min_count).head(limit)
+        premiums = skill_premiums(matrix, min_count).set_index('skill_id')
+        return {
+            'position': load_roles().get(role_id),
+            'role_id': role_id,
+            'kind': kind,
+            'count': matrix.shape[0],
+            'skills': [{
+                'skill': row.skill,
+                'count': int(row.count),
+                'p25': row.p25,
+                'median': row.median,
+                'p75': row.p75,
+                'median_without': premiums['median_without'].get(row.skill_id),
+                'premium': premiums['premium'].get(row.skill_id),
+            } for row in medians.itertuples(index=False)],
+        }
+
+    return cached_json(('skill-stats', role_id, kind, min_count, limit, start_month, end_month), build)
+
+
+@app.route('/api/data/<position>')
+def position_data(position):
+    role_id = resolve_role(position)
+    if role_id is None:
+        return _error(f"Неизвестная должность: {position}", 404)
+    limit = request.args.get('limit', RECORDS_LIMIT, type=int)
+
+    def build():
+        conn = get_conn()
+        vacancies = conn.execute(
+            'SELECT hh_id, position, company, salary_from, salary_to, currency, experience, skills, parsed_date '
+            'FROM vacancies WHERE role_id = ? ORDER BY parsed_date DESC LIMIT ?', (role_id, limit)
+        ).fetchall()
+        resumes = conn.execute(
+            'SELECT hh_id, title, salary_from, salary_currency, experience_years, skills, parsed_date '
+            'FROM resumes WHERE role_id = ? ORDER BY parsed_date DESC LIMIT ?', (role_id, limit)
+        ).fetchall()
+        return {
+            'positionId': role_id,
+            'vacancies': [{
+                'id': row[0], 'positionId': role_id, 'title': row[1], 'company': row[2],
+                'salary_from': row[3], 'salary_to': row[4], 'currency': row[5],
+                'salary': row[3] if row[4] is None else row[4] if row[3] is None else (row[3] + row[4]) / 2,
+                'experience': row[6], 'skills': [skill for skill in (row[7] or '').split(', ') if skill],
+                'date': (row[8] or '')[:10],
+            } for row in vacancies],
+            'resumes': [{
+                'id': row[0], 'positionId': role_id, 'title': row[1], 'salary': row[2], 'currency': row[3],
+                'experience': row[4], 'skills': [skill for skill in (row[5] or '').split(', ') if skill],
+                'date': (row[6] or '')[:10],
+            } for row in resumes],
+        }
+
+    return cached_json(('data', role_id, limit), build)
+
+
+@app.route('/update_grades', methods=['POST'])
+def update_grades():
+    # Пересчёт грейдов при перетаскивании границ: только срезы уже
+    # отсортированных зарплат, без обращения к базе
+    payload = request.get_json(silent=True) or {}
+    # Страница присылает role_id, отрисованный в index(); position — для внешних клиентов
+    role_id = resolve_role(payload.get('position')) or resolve_role(str(payload.get('role_id') or ''))
+    custom_grade_ranges = payload.get('custom_grade_ranges') or {}
+    if role_id is None:
+        return _error("Не указана должность: нужен position или role_id", 404)
+    _, vacancy_hist = role_histograms(role_id, None, None, data_version())
+    return jsonify(grades_from_percentiles({
+        level: vacancy_hist.label_percentiles(labels)
+        for level, labels in custom_grade_ranges.items()
+    }))
+
+
+@app.route('/', methods=['GET', 'POST'])
+def index():
+    position = request.values.get('position')
+    step = request.values.get('step', DEFAULT_STEP, type=int)
+    if step not in AVAILABLE_STEPS:
+        step = DEFAULT_STEP
+    role_id = resolve_role(position)
+    if role_id is None:
+        metrics, grades = [], {level: {'grade1': 0, 'grade2': 0, 'grade3': 0} for level in GRADE_RANGES}
+    else:
+        # Доли — из salary_stats, грейды — по отсортированным зарплатам вакансий
+        resume_hist, vacancy_hist = role_histograms(role_id, None, None, data_version())
+        fractions = (stats_metrics(get_conn(), role_id, step, percentiles=None)
+                     or calculate_metrics(resume_hist, vacancy_hist, step))
+        metrics = [
+            {'range': key, 'resume_fraction': value['resume_fraction'], 'vacancy_fraction': value['vacancy_fraction']}
+            for key, value in fractions.items()
+        ]
+        grades = calculate_grades(vacancy_hist, step, GRADE_RANGES)
+    return render_template('index.html', metrics=json.dumps(metrics), grades=grades, current_step=step,
+                           position=position or '', role_id=role_id)
+
+
+if __name__ == '__main__':
+    search_index()
+    app.run(host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,138 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from main import AVAILABLE_STEPS, GRADE_RANGES, calculate_grades, calculate_metrics_for_steps
+from salary_histogram import DEFAULT_PERCENTILES, SalaryHistogram, json_default
+from salary_stats import load_normalized
+from storage import DB_PATH, connect
+
+REPORT_DIR = 'reports'
+PERCENTILE_COLUMNS = [f"p{q}" for q in DEFAULT_PERCENTILES]
+
+# Соединение с базой открывается один раз на процесс пула
+_worker_conn = None
+
+
+def _init_worker(db_path: str):
+    global _worker_conn
+    _worker_conn = connect(db_path)
+
+
+def load_role_names(path: str = 'roles.json') -> Dict[str, str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        roles_data = json.load(f)
+    return {
+        role['id']: role['name']
+        for category in roles_data.get('categories', [])
+        for role in category.get('roles', [])
+    }
+
+
+def roles_in_db(conn) -> List[str]:
+    rows = conn.execute('SELECT DISTINCT role_id FROM vacancies UNION SELECT DISTINCT role_id FROM resumes').fetchall()
+    return sorted({row[0] for row in rows if row[0] is not None}, key=lambda role_id: (len(role_id), role_id))
+
+
+def build_role_report(role_id: str, steps=AVAILABLE_STEPS) -> Dict:
+    resume_hist = SalaryHistogram(load_normalized(_worker_conn, 'resumes', role_ids=[role_id])['salary_rub'])
+    vacancy_hist = SalaryHistogram(load_normalized(_worker_conn, 'vacancies', role_ids=[role_id])['salary_rub'])
+    return {
+        'role_id': role_id,
+        'resumes': resume_hist.total,
+        'vacancies': vacancy_hist.total,
+        'metrics': calculate_metrics_for_steps(resume_hist, vacancy_hist, steps),
+        'grades': {step: calculate_grades(vacancy_hist, step, GRADE_RANGES) for step in steps},
+    }
+
+
+def write_role_report(report: Dict, report_dir: str, role_name: Optional[str] = None):
+    role_id = report['role_id']
+    with open(os.path.join(report_dir, f"role_{role_id}.json"), 'w', encoding='utf-8') as f:
+        json.dump({'name': role_name, **report}, f, ensure_ascii=False, default=json_default)
+
+    # В CSV только непустые диапазоны, как и в выводе main.py
+    with open(os.path.join(report_dir, f"role_{role_id}.csv"), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['step', 'range', 'resume_fraction', 'vacancy_fraction'] + PERCENTILE_COLUMNS)
+        for step, metrics in report['metrics'].items():
+            for range_key, values in metrics.items():
+                if values['resume_fraction'] > 0 or values['vacancy_fraction'] > 0:
+                    writer.writerow([step, range_key, values['resume_fraction'], values['vacancy_fraction']]
+                                    + list(np.round(values['percentiles'], 2)))
+
+
+def process_role(role_id: str, report_dir: str, role_name: Optional[str], steps) -> Dict:
+    # Отчёт пишется прямо в процессе пула: обратно уходит только сводка
+    report = build_role_report(role_id, steps)
+    write_role_report(report, report_dir, role_name)
+    return {'role_id': role_id, 'name': role_name, 'resumes': report['resumes'], 'vacancies': report['vacancies']}
+
+
+def run_batch(role_ids: List[str], role_names: Dict[str, str], steps=AVAILABLE_STEPS,
+              report_dir: str = REPORT_DIR, db_path: str = DB_PATH, workers: Optional[int] = None) -> List[Dict]:
+    os.makedirs(report_dir, exist_ok=True)
+    # Ошибка одной роли не останавливает пакет: роль попадает в сводку
+    # с текстом ошибки, остальные отчёты сохраняются
+    workers = workers or os.cpu_count() or 1
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(db_path,)) as executor:
+        futures = {
+            executor.submit(process_role, role_id, report_dir, role_names.get(role_id), tuple(steps)): role_id
+            for role_id in role_ids
+        }
+        for future in as_completed(futures):
+            role_id = futures[future]
+            try:
+                results[role_id] = future.result()
+            except Exception as e:
+                print(f"Ошибка при построении отчёта для роли {role_id}: {e}")
+                results[role_id] = {'role_id': role_id, 'name': role_names.get(role_id), 'error': str(e)}
+    summary = [results[role_id] for role_id in role_ids]
+
+    with open(os.path.join(report_dir, 'summary.csv'), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['role_id', 'name', 'resumes', 'vacancies', 'error'])
+        writer.writeheader()
+        writer.writerows(summary)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отчёты по зарплатам для всех ролей из базы")
+    parser.add_argument('--steps', type=int, nargs='+', default=list(AVAILABLE_STEPS), help="Шаги диапазонов")
+    parser.add_argument('--roles', nargs='+', help="Только указанные role_id")
+    parser.add_argument('--workers', type=int, default=None, help="Число процессов (по умолчанию — все ядра)")
+    parser.add_argument('--out', default=REPORT_DIR, help="Каталог для отчётов")
+    parser.add_argument('--db', default=DB_PATH, help="Путь к базе")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    try:
+        role_ids = args.roles or roles_in_db(conn)
+    except sqlite3.OperationalError as e:
+        print(f"Не удалось прочитать роли из базы {args.db}: {e}")
+        return
+    finally:
+        conn.close()
+    try:
+        role_names = load_role_names()
+    except (OSError, ValueError):
+        role_names = {}
+
+    started = time.perf_counter()
+    summary = run_batch(role_ids, role_names, args.steps, args.out, args.db, args.workers)
+    failed = [row['role_id'] for row in summary if row.get('error')]
+    print(f"Обработано ролей: {len(summary) - len(failed)} за {time.perf_counter() - started:.1f} с, "
+          f"отчёты в {args.out}")
+    if failed:
+        print(f"С ошибками ({len(failed)}): {', '.join(failed)}")
+
+if __name__ == "__main__":
+    main()
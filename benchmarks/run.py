@@ -0,0 +1,227 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import stub_server, synthetic
+from main import GRADE_RANGES, calculate_grades, calculate_metrics, load_histograms
+from parse_vacancies_resumes import HHAPIParser, crawl_role, save_resumes_to_db, save_vacancies_to_db
+from rate_limiter import TokenBucket
+from salary_histogram import SalaryHistogram
+from salary_parser import convert_salary, convert_salary_column
+from storage import DBWriter
+
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.jsonl')
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+SUITES = ('parse', 'metrics', 'db', 'crawler')
+# Построчный convert_salary медленный, на больших объёмах мерим его на срезе
+ROWWISE_LIMIT = 200_000
+# Насколько результат должен быть хуже прошлого, чтобы считаться регрессией
+REGRESSION_THRESHOLD = 1.2
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(func: Callable, repeat: int = 3) -> float:
+    # Лучшее время из repeat запусков: меньше всего зависит от фонового шума
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+class Recorder:
+    def __init__(self, commit: Optional[str]):
+        self.results: List[Dict] = []
+        self.commit = commit
+
+    def add(self, name: str, size: int, seconds: float, unit_count: Optional[int] = None, **extra):
+        unit_count = size if unit_count is None else unit_count
+        result = {
+            'name': name,
+            'size': size,
+            'seconds': round(seconds, 6),
+            'per_second': round(unit_count / seconds, 1) if seconds > 0 else None,
+            **extra,
+        }
+        self.results.append(result)
+        print(f"  {name:<40} {size:>10} {seconds * 1000:>10.1f} мс  {result['per_second'] or 0:>14,.0f}/с")
+
+
+def bench_parse(recorder: Recorder, size: int, workdir: str, repeat: int):
+    vacancies = pd.Series(synthetic.salary_strings(size, 'vacancies', seed=size))
+    rowwise = vacancies.iloc[:ROWWISE_LIMIT]
+    recorder.add('convert_salary (apply)', len(rowwise), measure(lambda: rowwise.apply(convert_salary), 1))
+    recorder.add('convert_salary_column', size, measure(lambda: convert_salary_column(vacancies), repeat))
+
+    path = os.path.join(workdir, f"vacancies_{size}.csv")
+    synthetic.write_csv(path, size, 'vacancies', seed=size)
+    resumes_path = os.path.join(workdir, f"resumes_{size}.csv")
+    synthetic.write_csv(resumes_path, size, 'resumes', seed=size)
+    recorder.add('load_histograms (csv, потоково)', size * 2,
+                 measure(lambda: load_histograms(resumes_path, path, cache_dir=None), 1))
+    cache_dir = os.path.join(workdir, 'salary_cache')
+    load_histograms(resumes_path, path, cache_dir=cache_dir)
+    recorder.add('load_histograms (mmap-кэш)', size * 2,
+                 measure(lambda: load_histograms(resumes_path, path, cache_dir=cache_dir), repeat))
+
+
+def bench_metrics(recorder: Recorder, size: int, repeat: int):
+    rng = np.random.default_rng(size)
+    resumes = pd.DataFrame({'resume_salary_rub': rng.lognormal(11.6, 0.5, size)})
+    vacancies = pd.DataFrame({'vacancy_salary_rub': rng.lognormal(11.7, 0.5, size)})
+    for step in (5000, 50000):
+        recorder.add(f'calculate_metrics step={step}', size,
+                     measure(lambda: calculate_metrics(resumes, vacancies, step), repeat))
+    recorder.add('calculate_grades step=10000', size,
+                 measure(lambda: calculate_grades(vacancies, 10000, GRADE_RANGES), repeat))
+    histogram = SalaryHistogram(vacancies['vacancy_salary_rub'])
+    recorder.add('calculate_grades (готовая гистограмма)', size,
+                 measure(lambda: calculate_grades(histogram, 10000, GRADE_RANGES), repeat))
+
+
+def bench_db(recorder: Recorder, size: int, workdir: str, repeat: int):
+    vacancies = synthetic.api_vacancies(size)
+    resumes = synthetic.api_resumes(size)
+
+    def save_with(writer_factory, save):
+        db_path = os.path.join(workdir, f"bench_{size}.db")
+
+        def run():
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+            with writer_factory(db_path) as writer:
+                save(writer)
+        return run
+
+    recorder.add('DBWriter.add_vacancies', size, measure(
+        save_with(DBWriter, lambda writer: writer.add_vacancies(vacancies, '1')), repeat))
+    recorder.add('DBWriter.add_resumes', size, measure(
+        save_with(DBWriter, lambda writer: writer.add_resumes(resumes, '1')), repeat))
+    # Путь сборщика: сохранение порциями по странице с flush на каждый вызов
+    page = 20
+    recorder.add('save_vacancies_to_db (по страницам)', size, measure(save_with(DBWriter, lambda writer: [
+        save_vacancies_to_db(vacancies[i:i + page], '1', writer) for i in range(0, size, page)
+    ]), 1))
+    recorder.add('save_resumes_to_db (по страницам)', size, measure(save_with(DBWriter, lambda writer: [
+        save_resumes_to_db(resumes[i:i + page], '1', writer) for i in range(0, size, page)
+    ]), 1))
+
+
+def bench_crawler(recorder: Recorder, items: int, workdir: str, latency: float, error_rate: float):
+    state = stub_server.StubState(latency=latency, error_rate=error_rate, retry_after=0.2)
+    server = stub_server.start(state)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        for workers in (1, 4, 8):
+            db_path = os.path.join(workdir, f"crawl_{workers}.db")
+            limiter = TokenBucket(rate=50.0, capacity=20.0, max_rate=200.0) if workers > 1 else None
+            parser = HHAPIParser(base_url=base_url, rate_limiter=limiter, max_workers=workers)
+            parser._pause = lambda low, high: None
+            before = state.requests
+            started = time.perf_counter()
+            with DBWriter(db_path) as writer:
+                saved = crawl_role(parser, writer, f"bench{workers}", 'vacancies', max_items=items)[0]
+                saved += crawl_role(parser, writer, f"bench{workers}", 'resumes', max_items=items // 5,
+                                    known_ids=set())[0]
+            elapsed = time.perf_counter() - started
+            recorder.add(f'crawler workers={workers}', items, elapsed, unit_count=saved,
+                         requests=state.requests - before, latency=latency, error_rate=error_rate)
+    finally:
+        server.shutdown()
+
+
+def load_history(path: str = HISTORY_FILE) -> List[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def compare_with_history(results: List[Dict], history: List[Dict]):
+    # Сравнение с последним прогоном того же бенчмарка и размера
+    previous = {}
+    for run in history:
+        for result in run['results']:
+            previous[(result['name'], result['size'])] = (run, result)
+    regressions = []
+    for result in results:
+        key = (result['name'], result['size'])
+        if key not in previous:
+            continue
+        run, old = previous[key]
+        ratio = result['seconds'] / old['seconds'] if old['seconds'] else 1.0
+        if ratio > REGRESSION_THRESHOLD:
+            regressions.append(f"  {result['name']} ({result['size']}): {old['seconds'] * 1000:.1f} -> "
+                               f"{result['seconds'] * 1000:.1f} мс (x{ratio:.2f}, было на {run.get('commit')})")
+    if regressions:
+        print("\nЗамедления относительно прошлого прогона:")
+        print('\n'.join(regressions))
+    elif previous:
+        print("\nЗамедлений относительно прошлого прогона нет")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки разбора зарплат, метрик, записи в базу и сборщика")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="Объёмы синтетических данных, строк (до 10 000 000)")
+    parser.add_argument('--suite', nargs='+', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--crawl-items', type=int, default=500, help="Сколько вакансий собирать со заглушки")
+    parser.add_argument('--latency', type=float, default=0.05, help="Задержка заглушки, секунды")
+    parser.add_argument('--error-rate', type=float, default=0.02, help="Доля ответов 403 от заглушки")
+    parser.add_argument('--history', default=HISTORY_FILE, help="Файл истории результатов")
+    parser.add_argument('--no-save', action='store_true', help="Не дописывать результаты в историю")
+    args = parser.parse_args()
+
+    recorder = Recorder(git_commit())
+    with tempfile.TemporaryDirectory(prefix='salary_bench_') as workdir:
+        for size in args.sizes:
+            print(f"\nРазмер: {size}")
+            if 'parse' in args.suite:
+                bench_parse(recorder, size, workdir, args.repeat)
+            if 'metrics' in args.suite:
+                bench_metrics(recorder, size, args.repeat)
+            if 'db' in args.suite:
+                bench_db(recorder, min(size, 1_000_000), workdir, args.repeat)
+        if 'crawler' in args.suite:
+            print("\nСборщик против заглушки")
+            bench_crawler(recorder, args.crawl_items, workdir, args.latency, args.error_rate)
+
+    history = load_history(args.history)
+    compare_with_history(recorder.results, history)
+    if not args.no_save:
+        run = {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'commit': recorder.commit,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'results': recorder.results,
+        }
+        with open(args.history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(run, ensure_ascii=False) + '\n')
+        print(f"Результаты дописаны в {args.history}")
+
+if __name__ == "__main__":
+    main()
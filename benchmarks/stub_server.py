@@ -0,0 +1,133 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.synthetic import api_resumes, api_vacancies
+
+# Заглушка API hh.ru: /vacancies, /resumes и /resumes/{id} с задержкой
+# и случайными 403/429, чтобы мерить пропускную способность сборщика
+FOUND = 2000
+
+
+class StubState:
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02, error_rate: float = 0.0,
+                 error_status: int = 403, retry_after: float = 0.5, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def roll(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            return failed
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+
+def _page(path: str, query, per_page_default: int = 20):
+    role = query.get('professional_role', ['0'])[0]
+    page = int(query.get('page', ['0'])[0])
+    per_page = int(query.get('per_page', [str(per_page_default)])[0])
+    offset = page * per_page
+    seed = zlib.crc32(f"{path}/{role}/{page}".encode('utf-8'))
+    if path == '/vacancies':
+        items = api_vacancies(per_page, seed=seed)
+    else:
+        items = [{'id': resume['id']} for resume in api_resumes(per_page, seed=seed)]
+    # id уникальны в пределах роли и страницы
+    for i, item in enumerate(items):
+        item['id'] = f"{role}-{offset + i}" if path == '/vacancies' else f"{role}r{offset + i:030d}"
+    pages = (FOUND + per_page - 1) // per_page
+    return {'items': items if page < pages else [], 'found': FOUND, 'pages': pages, 'page': page,
+            'per_page': per_page}
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            time.sleep(state.delay())
+            if state.roll():
+                self.send_response(state.error_status)
+                self.send_header('Retry-After', str(state.retry_after))
+                self.end_headers()
+                return
+
+            if url.path in ('/vacancies', '/resumes'):
+                body = _page(url.path, query)
+            elif url.path.startswith('/resumes/'):
+                resume = api_resumes(1, seed=len(url.path))[0]
+                resume['id'] = url.path.rsplit('/', 1)[-1]
+                body = resume
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            etag = '"' + hashlib.md5(data).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                with state._lock:
+                    state.not_modified += 1
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def start(state: StubState, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    # Сервер в фоновом потоке; адрес — server.server_address
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка API hh.ru")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help="Задержка ответа, секунды")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Доля ответов с ошибкой")
+    parser.add_argument('--error-status', type=int, default=403)
+    args = parser.parse_args()
+    state = StubState(latency=args.latency, error_rate=args.error_rate, error_status=args.error_status)
+    server = start(state, port=args.port)
+    print(f"Заглушка слушает http://127.0.0.1:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
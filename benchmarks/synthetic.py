@@ -0,0 +1,113 @@
+import csv
+from typing import Dict, List
+
+import numpy as np
+
+# Форматы строк как в выгрузках vacancies.csv / resumes.csv:
+# разряды через обычный или узкий неразрывный пробел, вилки через «–»
+NARROW_NBSP = '\u202f'
+VACANCY_HEADER = ['vacancy_link', 'vacancy_title', 'vacancy_salary', 'experience', 'company', 'location', 'unique']
+RESUME_HEADER = ['resume_link', 'resume_title', 'resume_salary', 'experience', 'last_company', 'unique']
+
+TITLES = ['IOS разработчик', 'Python-разработчик', 'Аналитик данных', 'Менеджер по продажам',
+          'Frontend Developer (React)', 'QA инженер', 'Бухгалтер, 1С', 'Водитель']
+COMPANIES = ['ООО Люди ПРО Групп', 'Айрон Вотер Студио', 'АО Мидлэнд Ритейл Груп', 'LATOKEN', "Macy's"]
+LOCATIONS = ['Москва', 'Санкт-Петербург', 'Ростов-на-Дону', 'Ташкент', 'Алматы']
+EXPERIENCE = ['Без опыта', 'Опыт 1-3 года', 'Опыт 3-6 лет', 'Опыт более 6 лет']
+
+
+def _amount(value: float, rng: np.random.Generator) -> str:
+    # Суммы встречаются и слитно, и с разделителями разрядов
+    text = f"{int(value):,}"
+    separator = rng.choice(['', ' ', NARROW_NBSP])
+    return text.replace(',', separator)
+
+
+def salary_strings(count: int, kind: str = 'vacancies', seed: int = 0, unique: int = 5000) -> np.ndarray:
+    # Как и в реальных выгрузках, строки сильно повторяются: генерируется
+    # unique вариантов, из которых затем выбираются count значений
+    rng = np.random.default_rng(seed)
+    variants = []
+    for _ in range(unique):
+        currency = rng.choice(['₽', '$', '₸'], p=[0.9, 0.07, 0.03])
+        scale = {'₽': 1, '$': 1 / 90, '₸': 5}[currency]
+        low = round(rng.lognormal(11.6, 0.5) * scale, -3 if currency != '$' else -2)
+        if kind == 'resumes':
+            variants.append(f"{_amount(low, rng)} {currency}")
+            continue
+        high = round(low * rng.uniform(1.1, 1.8), -3 if currency != '$' else -2)
+        tax = rng.choice(['на руки', 'до вычета налогов'], p=[0.7, 0.3])
+        shape = rng.choice(['range', 'from', 'to'], p=[0.5, 0.35, 0.15])
+        if shape == 'range':
+            variants.append(f"{_amount(low, rng)} – {_amount(high, rng)} {currency} {tax}")
+        elif shape == 'from':
+            variants.append(f"от {_amount(low, rng)} {currency} {tax}")
+        else:
+            variants.append(f"до {_amount(high, rng)} {currency} {tax}")
+    return np.array(variants, dtype=object)[rng.integers(0, unique, size=count)]
+
+
+def write_csv(path: str, count: int, kind: str = 'vacancies', seed: int = 0, chunk: int = 100000):
+    # Строки пишутся вперемешку в '...' и "..." кавычках, как в исходных файлах
+    rng = np.random.default_rng(seed + 1)
+    header = VACANCY_HEADER if kind == 'vacancies' else RESUME_HEADER
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(','.join(header) + '\n')
+        double_quoted = csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator='\n')
+        for start in range(0, count, chunk):
+            size = min(chunk, count - start)
+            salaries = salary_strings(size, kind, seed=seed + start)
+            for i in range(size):
+                title = TITLES[rng.integers(len(TITLES))]
+                company = COMPANIES[rng.integers(len(COMPANIES))]
+                experience = EXPERIENCE[rng.integers(len(EXPERIENCE))]
+                if kind == 'vacancies':
+                    row = [f"https://spb.hh.ru/vacancy/{start + i}", title, salaries[i], experience, company,
+                           LOCATIONS[rng.integers(len(LOCATIONS))], '1']
+                else:
+                    row = [f"https://spb.hh.ru/resume/{start + i:032x}", title, salaries[i], experience,
+                           company, '1']
+                if rng.random() < 0.5 and not any("'" in field for field in row):
+                    f.write(','.join(f"'{field}'" for field in row) + '\n')
+                else:
+                    double_quoted.writerow(row)
+
+
+def api_vacancies(count: int, seed: int = 0) -> List[Dict]:
+    # Элементы в формате ответа /vacancies hh.ru
+    rng = np.random.default_rng(seed)
+    items = []
+    for i in range(count):
+        low = int(round(rng.lognormal(11.6, 0.5), -3))
+        items.append({
+            'id': str(10_000_000 + i),
+            'name': TITLES[i % len(TITLES)],
+            'salary': {'from': low, 'to': int(low * 1.4) if i % 2 else None, 'currency': 'RUR'},
+            'area': {'name': LOCATIONS[i % len(LOCATIONS)]},
+            'employer': {'name': COMPANIES[i % len(COMPANIES)]},
+            'experience': {'name': EXPERIENCE[i % len(EXPERIENCE)]},
+            'key_skills': [{'name': 'Python'}, {'name': 'SQL'}],
+            'alternate_url': f"https://hh.ru/vacancy/{10_000_000 + i}",
+        })
+    return items
+
+
+def api_resumes(count: int, seed: int = 0) -> List[Dict]:
+    # Элементы в формате ответа /resumes/{id} hh.ru
+    rng = np.random.default_rng(seed)
+    items = []
+    for i in range(count):
+        items.append({
+            'id': f"{i:032x}",
+            'title': TITLES[i % len(TITLES)],
+            'salary': {'amount': int(round(rng.lognormal(11.6, 0.5), -3)), 'currency': 'RUR'},
+            'age': 20 + i % 40,
+            'gender': {'name': 'Мужчина' if i % 2 else 'Женщина'},
+            'area': {'name': LOCATIONS[i % len(LOCATIONS)]},
+            'total_experience': {'months': (i * 7) % 240},
+            'skills': [{'name': 'Python'}, {'name': 'Git'}],
+            'education': {'primary': [{'name': 'МГУ'}]},
+            'language': [{'name': 'Русский'}, {'name': 'Английский'}],
+            'alternate_url': f"https://hh.ru/resume/{i:032x}",
+        })
+    return items
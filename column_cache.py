@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Optional
+
+import numpy as np
+
+from csv_stream import DEFAULT_CHUNKSIZE, iter_chunks
+from salary_parser import INCOME_TAX, _CURRENCY_RATES, convert_salary_column
+
+# Меняется при изменении формата кэша; курсы и налог тоже входят
+# в подпись, чтобы правка salary_parser сбрасывала кэш
+CACHE_VERSION = 1
+CONVERTER_SIGNATURE = json.dumps({'rates': _CURRENCY_RATES, 'tax': INCOME_TAX}, sort_keys=True)
+
+# Колонки convert_salary_column и их типы на диске; currency хранится кодами
+COLUMN_DTYPES = {
+    'salary_min': np.float64,
+    'salary_max': np.float64,
+    'salary_rub': np.float64,
+    'currency': np.int8,
+    'is_before_tax': np.bool_,
+}
+
+
+def file_sha1(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SalaryColumnCache:
+    # Колоночный кэш сконвертированных зарплат: по .npy на колонку плюс
+    # отсортированные непустые salary_rub для SalaryHistogram. Повторные
+    # запуски открывают файлы через mmap и не читают CSV вовсе.
+    # Актуальность проверяется по размеру и mtime исходника; если mtime
+    # сменился, а размер нет, сравнивается sha1 содержимого.
+
+    def __init__(self, cache_dir: str = '.salary_cache'):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_dir(self, path: str, column: str, apply_tax: bool) -> str:
+        key = json.dumps([os.path.abspath(path), column, apply_tax])
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest()[:20])
+
+    @staticmethod
+    def _read_meta(entry_dir: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(entry_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_meta(entry_dir: str, meta: Dict):
+        tmp_path = os.path.join(entry_dir, 'meta.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(entry_dir, 'meta.json'))
+
+    @staticmethod
+    def _open(entry_dir: str, meta: Dict) -> Dict:
+        columns = {
+            name: np.load(os.path.join(entry_dir, f"{name}.npy"), mmap_mode='r')
+            for name in list(COLUMN_DTYPES) + ['sorted_rub']
+        }
+        columns['currency_categories'] = meta['currency_categories']
+        return columns
+
+    def load(self, path: str, column: str, apply_tax: bool = True) -> Optional[Dict]:
+        entry_dir = self._entry_dir(path, column, apply_tax)
+        meta = self._read_meta(entry_dir)
+        if meta is None or meta.get('version') != CACHE_VERSION or meta.get('converter') != CONVERTER_SIGNATURE:
+            return None
+
+        stat = os.stat(path)
+        if stat.st_size != meta['size']:
+            return None
+        if stat.st_mtime_ns != meta['mtime_ns']:
+            # Файл трогали, но мог не изменить: проверяем содержимое
+            if file_sha1(path) != meta['sha1']:
+                return None
+            meta['mtime_ns'] = stat.st_mtime_ns
+            self._write_meta(entry_dir, meta)
+        try:
+            return self._open(entry_dir, meta)
+        except (OSError, ValueError):
+            return None
+
+    def build(self, path: str, column: str, apply_tax: bool = True, chunksize: int = DEFAULT_CHUNKSIZE) -> Dict:
+        entry_dir = self._entry_dir(path, column, apply_tax)
+        tmp_dir = f"{entry_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        stat = os.stat(path)
+
+        # Куски дописываются в сырые файлы, так что в памяти один кусок
+        raw_files = {name: open(os.path.join(tmp_dir, f"{name}.raw"), 'wb') for name in COLUMN_DTYPES}
+        rows = 0
+        categories = []
+        try:
+            for chunk in iter_chunks(path, chunksize, columns=[column]):
+                converted = convert_salary_column(chunk[column], apply_tax=apply_tax)
+                categories = list(converted['currency'].cat.categories)
+                for name, dtype in COLUMN_DTYPES.items():
+                    values = converted[name].cat.codes if name == 'currency' else converted[name]
+                    np.asarray(values, dtype=dtype).tofile(raw_files[name])
+                rows += len(converted)
+        finally:
+            for f in raw_files.values():
+                f.close()
+
+        for name, dtype in COLUMN_DTYPES.items():
+            raw_path = os.path.join(tmp_dir, f"{name}.raw")
+            target = np.lib.format.open_memmap(os.path.join(tmp_dir, f"{name}.npy"), mode='w+',
+                                               dtype=dtype, shape=(rows,))
+            if rows:
+                target[:] = np.memmap(raw_path, dtype=dtype, mode='r', shape=(rows,))
+            target.flush()
+            del target
+            os.remove(raw_path)
+
+        salary_rub = np.load(os.path.join(tmp_dir, 'salary_rub.npy'), mmap_mode='r')
+        sorted_rub = np.sort(salary_rub[~np.isnan(salary_rub)])
+        np.save(os.path.join(tmp_dir, 'sorted_rub.npy'), sorted_rub)
+        del salary_rub
+
+        self._write_meta(tmp_dir, {
+            'version': CACHE_VERSION,
+            'converter': CONVERTER_SIGNATURE,
+            'source': os.path.abspath(path),
+            'column': column,
+            'apply_tax': apply_tax,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha1': file_sha1(path),
+            'rows': rows,
+            'currency_categories': categories or list(_CURRENCY_RATES),
+        })
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        return self._open(entry_dir, self._read_meta(entry_dir))
+
+    def get(self, path: str, column: str, apply_tax: bool = True, chunksize: int = DEFAULT_CHUNKSIZE) -> Dict:
+        columns = self.load(path, column, apply_tax)
+        if columns is None:
+            columns = self.build(path, column, apply_tax, chunksize)
+        return columns
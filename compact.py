@@ -0,0 +1,59 @@
+import argparse
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from csv_stream import read_csv
+
+# Колонка переводится в category, если уникальных значений не больше этой доли строк
+CATEGORY_MAX_RATIO = 0.5
+INT32_MAX = np.iinfo(np.int32).max
+
+
+def to_int32(values) -> pd.arrays.IntegerArray:
+    # Целые в int32 с маской пропусков; нечисловые и не влезающие в int32 значения — NA
+    numbers = np.round(pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+                       .to_numpy(dtype=np.float64, na_value=np.nan))
+    mask = np.isnan(numbers) | (np.abs(numbers) > INT32_MAX)
+    return pd.arrays.IntegerArray(np.where(mask, 0, numbers).astype(np.int32), mask)
+
+
+def compact_frame(frame: pd.DataFrame, integer_columns: Iterable[str] = (),
+                  max_unique_ratio: float = CATEGORY_MAX_RATIO) -> pd.DataFrame:
+    # Строковые колонки с повторами — в category (коды int8/int16 плюс
+    # один экземпляр каждой строки), целые — в Int32, float64 — в float32
+    integer_columns = set(integer_columns)
+    result = {}
+    for column in frame.columns:
+        values = frame[column]
+        if column in integer_columns:
+            result[column] = to_int32(values)
+        elif values.dtype == object and values.nunique(dropna=True) <= max_unique_ratio * max(len(values), 1):
+            result[column] = values.astype('category')
+        elif values.dtype == np.float64:
+            result[column] = values.astype(np.float32)
+        else:
+            result[column] = values
+    return pd.DataFrame(result, index=frame.index)
+
+
+def memory_usage(frame: pd.DataFrame) -> int:
+    return int(frame.memory_usage(deep=True).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение памяти обычного и компактного представления выгрузок")
+    parser.add_argument('paths', nargs='*', default=['resumes.csv', 'vacancies.csv'], help="CSV-файлы выгрузок")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        plain = read_csv(path)
+        compact = compact_frame(plain)
+        print(f"{path}: строк {len(compact)}, обычный вид {memory_usage(plain) / 1024 / 1024:.1f} МБ, "
+              f"компактный {memory_usage(compact) / 1024 / 1024:.1f} МБ "
+              f"(в {memory_usage(plain) / max(memory_usage(compact), 1):.1f} раза меньше)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import csv
+from typing import Iterator, List, Optional, Sequence
+
+import pandas as pd
+
+# Выгрузки смешивают кавычки: одни строки в '...', другие в "...",
+# поэтому кавычка определяется заново в начале каждого поля
+QUOTES = ('"', "'")
+DELIMITER = ','
+DEFAULT_CHUNKSIZE = 50000
+
+
+def split_record(line: str, more: Optional[Iterator[str]] = None) -> List[str]:
+    # Конечный автомат по полям: в начале поля смотрим, открывает ли его
+    # кавычка. В закавыченном поле закрывающей считается только кавычка
+    # перед разделителем или концом строки, поэтому апостроф внутри
+    # ('Macy's') и запятые внутри названий не ломают запись. Удвоенная
+    # кавычка — экранированная. Если поле не закрылось до конца строки,
+    # запись продолжается следующей строкой из more.
+    line = line.rstrip('\r\n')
+    fields = []
+    pos = 0
+    while True:
+        if pos < len(line) and line[pos] in QUOTES:
+            quote = line[pos]
+            start = search = pos + 1
+            while True:
+                end = line.find(quote, search)
+                if end == -1:
+                    next_line = next(more, None) if more is not None else None
+                    if next_line is None:
+                        # Незакрытая кавычка в конце файла: берём остаток как есть
+                        end = len(line)
+                        break
+                    line += '\n' + next_line.rstrip('\r\n')
+                    continue
+                if end + 1 == len(line) or line[end + 1] == DELIMITER:
+                    break
+                search = end + 2 if line[end + 1] == quote else end + 1
+            fields.append(line[start:end].replace(quote * 2, quote))
+            pos = end + 1
+            # Мусор между закрывающей кавычкой и разделителем пропускаем
+            if pos < len(line) and line[pos] != DELIMITER:
+                next_delimiter = line.find(DELIMITER, pos)
+                pos = len(line) if next_delimiter == -1 else next_delimiter
+        else:
+            end = line.find(DELIMITER, pos)
+            if end == -1:
+                fields.append(line[pos:])
+                return fields
+            fields.append(line[pos:end])
+            pos = end
+
+        if pos >= len(line):
+            return fields
+        # Пропускаем разделитель; запятая в конце строки — пустое последнее поле
+        pos += 1
+        if pos == len(line):
+            fields.append('')
+            return fields
+
+
+def fit_record(fields: List[str], width: int) -> List[str]:
+    # Лишние поля (незакавыченные запятые) склеиваются в последнее,
+    # недостающие дополняются пустыми строками
+    if len(fields) > width:
+        return fields[:width - 1] + [DELIMITER.join(fields[width - 1:])]
+    if len(fields) < width:
+        return fields + [''] * (width - len(fields))
+    return fields
+
+
+def iter_records(path: str, encoding: str = 'utf-8') -> Iterator[List[str]]:
+    # Первая запись — заголовок. Файл читается построчно, в памяти
+    # только текущая запись.
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        lines = iter(f)
+        for line in lines:
+            if not line.strip():
+                continue
+            yield split_record(line, lines)
+
+
+def iter_chunks(path: str, chunksize: int = DEFAULT_CHUNKSIZE, columns: Optional[Sequence[str]] = None,
+                encoding: str = 'utf-8') -> Iterator[pd.DataFrame]:
+    # Файл отдаётся кусками по chunksize строк; columns ограничивает,
+    # какие колонки попадут в DataFrame
+    records = iter_records(path, encoding)
+    header = next(records, None)
+    if header is None:
+        return
+    header = [name.strip() for name in header]
+    wanted = list(columns) if columns is not None else header
+    indexes = [header.index(name) for name in wanted]
+
+    chunk = []
+    for fields in records:
+        fields = fit_record(fields, len(header))
+        chunk.append([fields[i] for i in indexes])
+        if len(chunk) >= chunksize:
+            yield pd.DataFrame(chunk, columns=wanted)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk, columns=wanted)
+
+
+def read_csv(path: str, columns: Optional[Sequence[str]] = None, chunksize: int = DEFAULT_CHUNKSIZE,
+             encoding: str = 'utf-8') -> pd.DataFrame:
+    chunks = list(iter_chunks(path, chunksize, columns, encoding))
+    if not chunks:
+        return pd.DataFrame(columns=list(columns or []))
+    return infer_numeric(pd.concat(chunks, ignore_index=True))
+
+
+def infer_numeric(frame: pd.DataFrame) -> pd.DataFrame:
+    # iter_chunks отдаёт строки как есть. Колонка, в которой каждое
+    # непустое поле — число, становится числовой, пустые поля — NaN,
+    # как у pd.read_csv; остальные колонки остаются строками.
+    for column in frame.columns:
+        values = frame[column]
+        filled = values != ''
+        numbers = pd.to_numeric(values.where(filled), errors='coerce')
+        if numbers[filled].notna().all():
+            frame[column] = numbers
+    return frame
+
+
+def repair_csv(input_file: str, output_file: str, encoding: str = 'utf-8') -> int:
+    # Переписывает файл в единообразном виде: все поля в двойных кавычках
+    written = 0
+    records = iter_records(input_file, encoding)
+    with open(output_file, 'w', encoding=encoding, newline='') as outfile:
+        writer = csv.writer(outfile, quoting=csv.QUOTE_ALL, lineterminator='\n')
+        header = next(records, None)
+        if header is None:
+            return 0
+        writer.writerow(header)
+        for fields in records:
+            writer.writerow(fit_record(fields, len(header)))
+            written += 1
+    return written
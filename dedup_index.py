@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Записи индекса: ключ (kind, hh_id), хэш карточки из выдачи, хэш
+# сохранённой строки, время последней встречи и месяц сохранения
+ENTRY_DTYPE = np.dtype([
+    ('key', '<u8'),
+    ('listing', '<u8'),
+    ('content', '<u8'),
+    ('seen', '<i8'),
+    ('month', '<i4'),
+])
+# Сколько секунд резюме с неизменной карточкой не скачивается повторно
+DETAIL_MAX_AGE = 30 * 24 * 3600
+
+
+def dedup_path(db_path: str) -> str:
+    # Индекс лежит рядом с базой: database.db -> database.dedup.npy
+    return f"{os.path.splitext(db_path)[0]}.dedup.npy"
+
+
+def hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+def record_key(kind: str, hh_id) -> int:
+    return hash64(f"{kind}:{hh_id}".encode('utf-8'))
+
+
+def listing_hash(item: Dict) -> int:
+    # Хэш карточки из выдачи: меняется, когда резюме обновили
+    return hash64(json.dumps(item, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def content_hash(values: Iterable) -> int:
+    return hash64(json.dumps(list(values), ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def month_number(parsed_month: str) -> int:
+    year, month = parsed_month.split('-')
+    return int(year) * 12 + int(month)
+
+
+class DedupIndex:
+    # Индекс уже собранных записей между запусками. В памяти — словарь
+    # ключ -> (listing, content, seen, month), на диске — один .npy
+    # со структурированным массивом. По нему сборщик не запрашивает
+    # детали резюме, карточка которых не менялась, а DBWriter не
+    # переписывает строки, содержимое которых за месяц не изменилось.
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[int, Tuple[int, int, int, int]] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self):
+        try:
+            array = np.load(self.path)
+        except (OSError, ValueError):
+            return
+        if array.dtype != ENTRY_DTYPE:
+            return
+        with self._lock:
+            self._entries = dict(zip(
+                array['key'].tolist(),
+                zip(array['listing'].tolist(), array['content'].tolist(),
+                    array['seen'].tolist(), array['month'].tolist()),
+            ))
+
+    def save(self):
+        with self._lock:
+            array = np.empty(len(self._entries), dtype=ENTRY_DTYPE)
+            if self._entries:
+                array['key'] = list(self._entries)
+                for i, field in enumerate(('listing', 'content', 'seen', 'month')):
+                    array[field] = [entry[i] for entry in self._entries.values()]
+        tmp_path = f"{self.path}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key: int) -> Optional[Tuple[int, int, int, int]]:
+        return self._entries.get(key)
+
+    def is_fresh(self, key: int, listing: int, max_age: float = DETAIL_MAX_AGE) -> Optional[bool]:
+        # None — записи нет в индексе; иначе свежа ли она и не менялась ли карточка
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry[0] == listing and time.time() - entry[2] <= max_age
+
+    def is_unchanged(self, key: int, content: int, month: int) -> bool:
+        # Та же строка уже записана в этом месяце
+        entry = self._entries.get(key)
+        return entry is not None and entry[1] == content and entry[3] == month
+
+    def update(self, records: Iterable[Tuple[int, Optional[int], int, int]]):
+        # records: (key, listing, content, month). Вызывается после фиксации
+        # транзакции, чтобы индекс не опережал базу
+        now = int(time.time())
+        with self._lock:
+            for key, listing, content, month in records:
+                if listing is None:
+                    previous = self._entries.get(key)
+                    listing = previous[0] if previous else 0
+                self._entries[key] = (listing, content, now, month)
@@ -0,0 +1,311 @@
+import argparse
+import glob
+import html
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from salary_parser import BEFORE_TAX_MARKER
+from quantile_sketch import DEFAULT_K
+from salary_stats import refresh_salary_stats
+from storage import CURRENCY_SYMBOLS, DB_PATH, DBWriter
+
+PAGE_PATTERN = 'debug_page_role_*.html'
+PAGE_NAME_RE = re.compile(r'debug_page_role_(?P<role>\d+)_(?P<page>\d+)\.html$')
+BLOCK_SIZE = 1 << 16
+
+# Начальное состояние страницы: JSON внутри <template id="HH-Lux-InitialState">
+STATE_MARKER = 'id="HH-Lux-InitialState"'
+STATE_END = '</template>'
+
+# Названия опыта из справочника API, чтобы записи не отличались от собранных сборщиком
+EXPERIENCE_NAMES = {
+    'noExperience': 'Нет опыта',
+    'between1And3': 'От 1 года до 3 лет',
+    'between3And6': 'От 3 до 6 лет',
+    'moreThan6': 'Более 6 лет',
+}
+# Обозначения валют в тексте выдачи и их коды в API
+CURRENCY_CODES = {symbol: code for code, symbol in CURRENCY_SYMBOLS.items()}
+CURRENCY_CODES.update({'₸': 'KZT', 'Br': 'BYR', "so'm": 'UZS', 'сом': 'KGS'})
+
+# Карточка вакансии в разметке выдачи и её поля по data-qa
+CARD_QA = 'vacancy-serp__vacancy vacancy-serp__vacancy_'
+FIELD_QA = {
+    'serp-item__title-text': 'name',
+    'vacancy-serp__vacancy-employer-text': 'employer',
+    'vacancy-serp__vacancy-address': 'area',
+}
+EXPERIENCE_QA = 'vacancy-serp__vacancy-work-experience-'
+RESPONSE_QA = 'vacancy-serp__vacancy_response'
+VACANCY_ID_RE = re.compile(r'vacancyId=(\d+)')
+SALARY_RE = re.compile(r'^(от|до)?\s*\d[\d\s–-]*(₽|\$|€|₸|Br|so\'m|сом)')
+NUMBER_RE = re.compile(r'\d[\d\s]*')
+# API отдаёт from/to за месяц; суммы за смену или час из разметки не пересчитать
+MONTHLY_MARKER = 'за месяц'
+# В разметке название работодателя идёт с организационно-правовой формой, в API — без неё
+LEGAL_FORM_RE = re.compile(r'^(ООО|ОАО|ЗАО|ПАО|АО|ИП|ТОО|НАО)\s+')
+
+
+def iter_blocks(path: str, block_size: int = BLOCK_SIZE) -> Iterator[str]:
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for block in iter(lambda: f.read(block_size), ''):
+            yield block
+
+
+def read_initial_state(path: str) -> Optional[Dict]:
+    # Потоковый поиск JSON состояния: файл читается блоками, в памяти
+    # держится короткий хвост (маркер может попасть на стык блоков) и сам JSON
+    buffer = ''
+    parts = None
+    keep = len(STATE_END) - 1
+    for block in iter_blocks(path):
+        buffer += block
+        if parts is None:
+            start = buffer.find(STATE_MARKER)
+            if start == -1:
+                buffer = buffer[-len(STATE_MARKER):]
+                continue
+            tag_end = buffer.find('>', start)
+            if tag_end == -1:
+                buffer = buffer[start:]
+                continue
+            parts = []
+            buffer = buffer[tag_end + 1:]
+        end = buffer.find(STATE_END)
+        if end != -1:
+            parts.append(buffer[:end])
+            try:
+                return json.loads(''.join(parts))
+            except ValueError:
+                return None
+        parts.append(buffer[:-keep])
+        buffer = buffer[-keep:]
+    return None
+
+
+def _text(value: Optional[str], default: str = 'Не указано') -> str:
+    # Строки в состоянии страницы экранированы для HTML
+    return html.unescape(value).strip() if value else default
+
+
+def vacancy_from_state(item: Dict) -> Dict:
+    # Запись из состояния страницы в форме ответа API /vacancies
+    vacancy_id = str(item.get('vacancyId'))
+    compensation = item.get('compensation') or {}
+    salary = None
+    if compensation.get('from') or compensation.get('to'):
+        salary = {
+            'from': compensation.get('from'),
+            'to': compensation.get('to'),
+            'currency': compensation.get('currencyCode', 'RUR'),
+            'gross': compensation.get('gross'),
+        }
+    company = item.get('company') or {}
+    experience = item.get('workExperience')
+    return {
+        'id': vacancy_id,
+        'name': _text(item.get('name')),
+        'salary': salary,
+        'area': {'name': _text((item.get('area') or {}).get('name'))},
+        'employer': {'name': _text(company.get('visibleName') or company.get('name'))},
+        'experience': {'name': EXPERIENCE_NAMES.get(experience, 'Не указан')},
+        'alternate_url': f"https://hh.ru/vacancy/{vacancy_id}",
+    }
+
+
+def vacancies_from_state(state: Dict) -> List[Dict]:
+    items = (state.get('vacancySearchResult') or {}).get('vacancies') or []
+    return [vacancy_from_state(item) for item in items if item.get('vacancyId')]
+
+
+def parse_salary_text(text: str) -> Optional[Dict]:
+    # "от 100 000 ₽ за месяц, на руки", "50 000 – 70 000 $ за месяц, до вычета налогов"
+    text = text.strip()
+    if not SALARY_RE.match(text) or (' за ' in text and MONTHLY_MARKER not in text):
+        return None
+    numbers = [int(re.sub(r'\D', '', number)) for number in NUMBER_RE.findall(text.split('за', 1)[0])]
+    if not numbers:
+        return None
+    if text.startswith('от'):
+        salary_from, salary_to = numbers[0], None
+    elif text.startswith('до'):
+        salary_from, salary_to = None, numbers[0]
+    else:
+        salary_from, salary_to = numbers[0], numbers[-1]
+    currency = next((code for symbol, code in CURRENCY_CODES.items() if symbol in text), 'RUR')
+    return {'from': salary_from, 'to': salary_to, 'currency': currency, 'gross': BEFORE_TAX_MARKER in text}
+
+
+class SerpItemParser(HTMLParser):
+    # Запасной разбор разметки выдачи, если на странице нет JSON состояния.
+    # Каждая карточка на странице свёрстана дважды (широкая и узкая
+    # колонки), поэтому берётся первое значение каждого поля.
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.vacancies: List[Dict] = []
+        self._stack: List[Tuple[str, Optional[str], Optional[list]]] = []
+        self._card: Optional[Dict] = None
+        self._card_depth = 0
+
+    def handle_starttag(self, tag: str, attrs):
+        attrs = dict(attrs)
+        qa = attrs.get('data-qa') or ''
+        field = None
+        if self._card is None:
+            if qa.startswith(CARD_QA):
+                self._card = {}
+                self._card_depth = len(self._stack) + 1
+        elif qa in FIELD_QA:
+            field = FIELD_QA[qa]
+        elif qa.startswith(EXPERIENCE_QA):
+            self._card.setdefault('experience', qa[len(EXPERIENCE_QA):])
+        elif qa == RESPONSE_QA:
+            match = VACANCY_ID_RE.search(attrs.get('href') or '')
+            if match:
+                self._card.setdefault('id', match.group(1))
+        elif tag == 'span' and not qa and 'salary' not in self._card:
+            field = 'salary'
+        self._stack.append((tag, field, [] if field else None))
+
+    def handle_endtag(self, tag: str):
+        # Незакрытые элементы (img, input, br) снимаются вместе с родителем
+        while self._stack:
+            open_tag, field, parts = self._stack.pop()
+            if field and self._card is not None:
+                self._finish_field(field, ''.join(parts))
+            if self._card is not None and len(self._stack) < self._card_depth:
+                self._finish_card()
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data: str):
+        for _, field, parts in self._stack:
+            if parts is not None:
+                parts.append(data)
+
+    def _finish_field(self, field: str, text: str):
+        text = ' '.join(text.split())
+        if field == 'salary':
+            salary = parse_salary_text(text)
+            if salary:
+                self._card['salary'] = salary
+        elif field == 'employer':
+            self._card.setdefault(field, LEGAL_FORM_RE.sub('', text))
+        elif text:
+            self._card.setdefault(field, text)
+
+    def _finish_card(self):
+        card, self._card = self._card, None
+        if not card.get('id'):
+            return
+        self.vacancies.append({
+            'id': card['id'],
+            'name': card.get('name', 'Не указано'),
+            'salary': card.get('salary'),
+            'area': {'name': card.get('area', 'Не указано')},
+            'employer': {'name': card.get('employer', 'Не указано')},
+            'experience': {'name': EXPERIENCE_NAMES.get(card.get('experience'), 'Не указан')},
+            'alternate_url': f"https://hh.ru/vacancy/{card['id']}",
+        })
+
+
+def vacancies_from_markup(path: str) -> List[Dict]:
+    parser = SerpItemParser()
+    for block in iter_blocks(path):
+        parser.feed(block)
+    parser.close()
+    return parser.vacancies
+
+
+def extract_page(path: str) -> Dict:
+    # Выполняется в процессе пула: наружу уходят только записи вакансий
+    match = PAGE_NAME_RE.search(os.path.basename(path))
+    result = {
+        'path': path,
+        'role_id': match.group('role') if match else None,
+        'page': int(match.group('page')) if match else None,
+        'mtime': os.path.getmtime(path),
+        'source': 'state',
+        'found': None,
+        'vacancies': [],
+    }
+    try:
+        state = read_initial_state(path)
+        vacancies = vacancies_from_state(state) if state else []
+        if state:
+            result['found'] = (state.get('vacancySearchResult') or {}).get('totalResults')
+        if not vacancies:
+            result['source'] = 'markup'
+            vacancies = vacancies_from_markup(path)
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+    # В выдаче встречаются повторы (рекламные карточки дублируют обычные)
+    result['vacancies'] = list({vacancy['id']: vacancy for vacancy in vacancies}.values())
+    return result
+
+
+def extract_pages(paths: List[str], db_path: str = DB_PATH, workers: Optional[int] = None,
+                  dry_run: bool = False, sketch_k: int = DEFAULT_K) -> List[Dict]:
+    workers = workers or os.cpu_count() or 1
+    summary = []
+    writer = None if dry_run else DBWriter(db_path)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(extract_page, paths, chunksize=max(1, len(paths) // (workers * 4)))
+            for result in results:
+                vacancies = result.pop('vacancies')
+                if result.get('error'):
+                    print(f"Ошибка разбора {result['path']}: {result['error']}")
+                elif not result['role_id']:
+                    print(f"Не удалось определить роль по имени файла {result['path']}, пропускаем")
+                elif writer is not None:
+                    # Дата сбора — время сохранения страницы, а не загрузки.
+                    # vacancy_row не принимает записи без зарплаты, как и у сборщика
+                    # они в базу не попадают
+                    writer.add_vacancies([vacancy for vacancy in vacancies if vacancy['salary']],
+                                         result['role_id'], datetime.fromtimestamp(result['mtime']))
+                result['count'] = len(vacancies)
+                result['with_salary'] = sum(1 for vacancy in vacancies if vacancy['salary'])
+                summary.append(result)
+        if writer is not None:
+            writer.flush()
+            refresh_salary_stats(writer.conn, writer.touched, sketch_k)
+    finally:
+        if writer is not None:
+            writer.close()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка вакансий из сохранённых страниц поиска hh.ru")
+    parser.add_argument('paths', nargs='*', default=[PAGE_PATTERN], help="Файлы или шаблоны файлов страниц")
+    parser.add_argument('--workers', type=int, default=None, help="Число процессов (по умолчанию — все ядра)")
+    parser.add_argument('--db', default=DB_PATH, help="Путь к базе")
+    parser.add_argument('--dry-run', action='store_true', help="Только разобрать страницы, без записи в базу")
+    parser.add_argument('--sketch-k', type=int, default=DEFAULT_K, help="Параметр k скетчей перцентилей")
+    args = parser.parse_args()
+
+    paths = sorted({path for pattern in args.paths for path in (glob.glob(pattern) or [pattern])
+                    if os.path.isfile(path)})
+    if not paths:
+        print("Страницы не найдены")
+        return
+
+    started = time.perf_counter()
+    summary = extract_pages(paths, args.db, args.workers, args.dry_run, args.sketch_k)
+    total = sum(result['count'] for result in summary)
+    with_salary = sum(result.get('with_salary', 0) for result in summary)
+    from_markup = sum(1 for result in summary if result['source'] == 'markup')
+    print(f"Страниц: {len(summary)} (из разметки: {from_markup}), вакансий: {total}, с зарплатой: {with_salary}, "
+          f"за {time.perf_counter() - started:.1f} с")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,13 @@
+from csv_stream import repair_csv
+
+
 def fix_csv(input_file, output_file):
-    with open(input_file, 'r', encoding='utf-8') as infile, open(output_file, 'w', encoding='utf-8') as outfile:
-        # Читаем заголовок
-        header = infile.readline().strip()
-        outfile.write(header + '\n')
-        
-        # Обрабатываем строки
-        for line in infile:
-            # Разделяем по запятым
-            parts = line.strip().split(',')
-            fixed_parts = [f'"{part.strip()}"' for part in parts]
-            # Собираем строку обратно
-            outfile.write(','.join(fixed_parts) + '\n')
+    # Разбор с учётом кавычек ('...' и "..."), запись потоковая
+    count = repair_csv(input_file, output_file)
+    print(f"Исправлено строк: {count}")
 
-# Укажи свои файлы
-input_file = 'vacancies.csv'  # Исходный файл
-output_file = 'vacancies_fixed.csv'  # Новый файл с кавычками
-fix_csv(input_file, output_file)
\ No newline at end of file
+if __name__ == "__main__":
+    # Укажи свои файлы
+    input_file = 'vacancies.csv'  # Исходный файл
+    output_file = 'vacancies_fixed.csv'  # Новый файл с кавычками
+    fix_csv(input_file, output_file)
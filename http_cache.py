@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+
+class ResponseCache:
+    # Дисковый кэш JSON-ответов API, ключ — URL + параметры запроса.
+    # Свежие записи (моложе ttl) отдаются без запроса, устаревшие
+    # перепроверяются через If-None-Match / If-Modified-Since.
+
+    def __init__(self, cache_dir: str = '.hh_cache', ttl: float = 6 * 3600):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url: str, params: Optional[Dict]) -> str:
+        key = json.dumps([url, sorted((params or {}).items())], ensure_ascii=False, default=str)
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.json")
+
+    def get(self, url: str, params: Optional[Dict] = None) -> Optional[Dict]:
+        try:
+            with open(self._path(url, params), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry: Dict) -> bool:
+        return time.time() - entry.get('stored_at', 0) < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: Dict) -> Dict:
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url: str, params: Optional[Dict], body, headers=None) -> Dict:
+        headers = headers or {}
+        entry = {
+            'url': url,
+            'stored_at': time.time(),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'body': body,
+        }
+        path = self._path(url, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Пишем во временный файл и подменяем, чтобы параллельные потоки
+        # не прочитали недописанную запись
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return entry
+
+    def refresh(self, url: str, params: Optional[Dict], entry: Dict, headers=None) -> Dict:
+        # Сервер ответил 304: тело прежнее, обновляем время и валидаторы
+        headers = headers or {}
+        return self.store(url, params, entry['body'], {
+            'ETag': headers.get('ETag') or entry.get('etag'),
+            'Last-Modified': headers.get('Last-Modified') or entry.get('last_modified'),
+        })
+
+    def record(self, outcome: str):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses + self.revalidated
+        return {
+            'hits': self.hits,
+            'revalidated': self.revalidated,
+            'misses': self.misses,
+            # Запросы, не потратившие тело ответа из квоты: прямые попадания и 304
+            'saved_ratio': (self.hits + self.revalidated) / total if total else 0.0,
+        }
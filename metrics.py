@@ -0,0 +1,228 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Границы корзин гистограмм времени, секунды
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TRANSACTION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+ROLE_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+HELP = {
+    'hh_requests_total': 'HTTP-запросы к API по статусу ответа',
+    'hh_request_seconds': 'Время HTTP-запроса к API',
+    'hh_response_bytes_total': 'Байт получено в телах ответов',
+    'hh_retries_total': 'Повторные попытки запросов',
+    'hh_cache_total': 'Обращения к кэшу ответов по исходу',
+    'hh_rate_limit_wait_seconds_total': 'Время ожидания в ограничителе запросов',
+    'crawl_pages_total': 'Обработано страниц поиска',
+    'crawl_records_total': 'Сохранено записей при сборе',
+    'crawl_role_seconds': 'Время сбора одного типа данных по роли',
+    'db_rows_written_total': 'Строк записано в базу',
+    'db_transaction_seconds': 'Время транзакции записи в базу',
+    'dedup_total': 'Проверки индекса дублей по исходу',
+    'pipeline_blocked_seconds_total': 'Время, которое стадия конвейера ждала места в очереди',
+}
+
+
+def _label_key(labels: Optional[Dict]) -> Tuple:
+    return tuple(sorted((labels or {}).items()))
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # Оценка по корзинам с линейной интерполяцией внутри корзины
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, bound in enumerate(self.buckets):
+            if seen + self.counts[i] >= target:
+                return lower + (bound - lower) * (target - seen) / self.counts[i] if self.counts[i] else lower
+            seen += self.counts[i]
+            lower = bound
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    # Счётчики и гистограммы в памяти процесса. Запись дешёвая (словарь под
+    # блокировкой), выгрузка — в текстовый формат Prometheus или JSON.
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, labels: Optional[Dict] = None):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict] = None,
+                buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, labels: Optional[Dict] = None, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, labels, buckets)
+
+    def counter(self, name: str, labels: Optional[Dict] = None) -> float:
+        # Сумма по всем сериям, совпадающим с labels
+        wanted = set(_label_key(labels))
+        with self._lock:
+            return sum(value for key, value in self._counters.get(name, {}).items() if wanted <= set(key))
+
+    def histogram(self, name: str) -> Histogram:
+        # Все серии метрики, слитые в одну гистограмму
+        with self._lock:
+            series = list(self._histograms.get(name, {}).values())
+        merged = Histogram(series[0].buckets if series else LATENCY_BUCKETS)
+        for histogram in series:
+            merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+            merged.sum += histogram.sum
+            merged.count += histogram.count
+        return merged
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started_at = time.time()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'taken_at': time.time(),
+                'counters': {
+                    name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+                'histograms': {
+                    name: [{
+                        'labels': dict(key),
+                        'buckets': list(histogram.buckets),
+                        'counts': list(histogram.counts),
+                        'sum': histogram.sum,
+                        'count': histogram.count,
+                    } for key, histogram in series.items()]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        def format_labels(pairs: List[Tuple[str, str]]) -> str:
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{format_labels(list(key))} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                        cumulative += count
+                        bucket_labels = list(key) + [('le', f"{bound:g}" if bound != '+Inf' else bound)]
+                        lines.append(f"{name}_bucket{format_labels(bucket_labels)} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(list(key))} {histogram.sum:g}")
+                    lines.append(f"{name}_count{format_labels(list(key))} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        # .json — снимок в JSON, иначе текстовый формат Prometheus
+        # (подходит для textfile collector node_exporter)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+            else:
+                f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def summary(self) -> str:
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        latency = self.histogram('hh_request_seconds')
+        transactions = self.histogram('db_transaction_seconds')
+        rows = self.counter('db_rows_written_total')
+        statuses = {}
+        with self._lock:
+            for key, value in self._counters.get('hh_requests_total', {}).items():
+                status = dict(key).get('status')
+                statuses[status] = statuses.get(status, 0) + value
+        lines = [
+            f"Время прогона: {elapsed:.1f} с",
+            f"HTTP-запросов: {latency.count}, в среднем {latency.sum / latency.count if latency.count else 0:.3f} с, "
+            f"p95 {latency.quantile(0.95):.3f} с, всего в ожидании ответа {latency.sum:.1f} с",
+            f"Статусы: {', '.join(f'{status}: {count:g}' for status, count in sorted(statuses.items())) or 'нет'}",
+            f"Ожидание в ограничителе: {self.counter('hh_rate_limit_wait_seconds_total'):.1f} с, "
+            f"повторов: {self.counter('hh_retries_total'):g}, "
+            f"получено {self.counter('hh_response_bytes_total') / 1024 / 1024:.1f} МБ",
+            f"Кэш: попаданий {self.counter('hh_cache_total', {'outcome': 'hits'}):g}, "
+            f"304 {self.counter('hh_cache_total', {'outcome': 'revalidated'}):g}",
+            f"Страниц: {self.counter('crawl_pages_total'):g}, записей: {self.counter('crawl_records_total'):g} "
+            f"({self.counter('crawl_records_total') / elapsed:.1f} в секунду)",
+            f"Конвейер: сбор ждал записи {self.counter('pipeline_blocked_seconds_total', {'stage': 'fetch'}):.1f} с",
+            f"Дубли: не запрошено деталей по индексу {self.counter('dedup_total', {'outcome': 'detail_skipped'}):g}, "
+            f"уже скачанных в этом запуске {self.counter('dedup_total', {'outcome': 'detail_seen'}):g}, "
+            f"не переписано строк {self.counter('dedup_total', {'outcome': 'row_unchanged'}):g}, "
+            f"повторов между шардами {self.counter('dedup_total', {'outcome': 'shard_duplicate'}):g}",
+            f"База: {rows:g} строк за {transactions.count} транзакций, {transactions.sum:.2f} с "
+            f"({rows / transactions.sum if transactions.sum else 0:.0f} строк/с, "
+            f"p95 транзакции {transactions.quantile(0.95) * 1000:.1f} мс)",
+        ]
+        return '\n'.join(lines)
+
+
+# Общий реестр процесса, как logging: инструментированный код пишет сюда
+registry = MetricsRegistry()
+
+
+def endpoint_label(url: str) -> str:
+    # Низкая кардинальность: id резюме в метку не попадает
+    path = url.split('?', 1)[0].rstrip('/')
+    parts = path.split('/')
+    if len(parts) >= 2 and parts[-2] == 'resumes':
+        return 'resume_detail'
+    if len(parts) >= 2 and parts[-2] == 'areas':
+        return 'areas'
+    return parts[-1] or 'root'
@@ -1,12 +1,17 @@
-import requests
+from http_cache import ResponseCache
+from parse_vacancies_resumes import HHAPIParser
 import json
 
-response = requests.get('https://api.hh.ru/professional_roles')
-roles_data = response.json()
+# Справочник ролей меняется редко: повторный запуск отдаёт его из кэша
+# или подтверждает через 304
+parser = HHAPIParser(cache=ResponseCache(ttl=24 * 3600))
+roles_data = parser._make_request(f"{parser.base_url}/professional_roles")
+if roles_data is None:
+    raise SystemExit("Не удалось получить справочник ролей")
 
 with open('roles.json', 'w', encoding='utf-8') as f:
     json.dump(roles_data, f, ensure_ascii=False, indent=2)
 
 print("Первые 10 ролей:")
 for role in roles_data['categories'][0]['roles'][:10]:
-    print(f"ID: {role['id']}, Name: {role['name']}")
\ No newline at end of file
+    print(f"ID: {role['id']}, Name: {role['name']}")
@@ -2,13 +2,86 @@ import requests
 import sqlite3
 import time
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import random
-from typing import Dict, List, Optional
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from requests.adapters import HTTPAdapter
+from rate_limiter import TokenBucket, parse_retry_after
+from http_cache import ResponseCache
+from pipeline import run_pipeline
+from metrics import ROLE_BUCKETS, endpoint_label, registry as metrics
+from dedup_index import DedupIndex, dedup_path, listing_hash, record_key
+from storage import (DB_PATH, LISTING_HASH_FIELD, DBWriter, ResumeRecord, VacancyRecord, process_salary, to_records,
+                     init_db as storage_init_db)
+from quantile_sketch import DEFAULT_K
+from salary_stats import refresh_salary_stats
+
+# Страница поиска: (номер страницы, записи для сохранения, размер страницы в выдаче)
+Page = Tuple[int, List[Dict], int]
+# Обработчик страницы поиска, получает поля Page
+PageCallback = Callable[[int, List[Dict], int], None]
+PER_PAGE = 20
+
+# Прерванный сбор продолжается с сохранённой страницы, только если
+# контрольная точка не старше суток: дальше выдача успевает сдвинуться
+CHECKPOINT_MAX_AGE = timedelta(hours=24)
+
+# Поиск hh.ru отдаёт по одному запросу не больше 2000 записей
+# (page * per_page < 2000): глубже выдачу можно получить, только разбив запрос
+SEARCH_DEPTH_LIMIT = 2000
+# Непересекающиеся значения фильтра experience — первый уровень разбиения
+EXPERIENCE_SHARDS = ('noExperience', 'between1And3', 'between3And6', 'moreThan6')
+# Поиск вакансий охватывает последние 30 дней; слишком большой шард
+# делится по дате публикации пополам, но не мельче часа
+SEARCH_PERIOD = timedelta(days=30)
+MIN_DATE_WINDOW = timedelta(hours=1)
+# Регионы по умолчанию: 113 — вся Россия. Регион, в котором найдено
+# больше SEARCH_DEPTH_LIMIT, делится на вложенные регионы из /areas
+DEFAULT_AREAS = ('113',)
+
+# Шард поиска: параметры, которые добавляются к запросу роли
+Shard = Dict[str, str]
 
 class HHAPIParser:
-    def __init__(self):
-        self.base_url = "https://api.hh.ru"
+    def __init__(self, base_url: str = "https://api.hh.ru", rate_limiter: Optional[TokenBucket] = None,
+                 max_workers: int = 1, cache: Optional[ResponseCache] = None, dedup: Optional[DedupIndex] = None):
+        self.base_url = base_url
+        # С ограничителем паузы между запросами задаёт он, а не случайные sleep
+        self.rate_limiter = rate_limiter
+        # Сколько страниц поиска запрашивать одновременно
+        self.max_workers = max_workers
+        # Необязательный дисковый кэш ответов
+        self.cache = cache
+        # Индекс уже собранных записей: детали резюме с неизменной карточкой не запрашиваются
+        self.dedup = dedup
+        # Реально отправленные HTTP-запросы (попадания в кэш не считаются)
+        # и необязательный лимит на них
+        self.request_count = 0
+        self.request_budget: Optional[int] = None
+        self._count_lock = threading.Lock()
+        # hh_id резюме, детали которых уже запрошены в этом запуске: общие
+        # для всех ролей и потоков, чтобы резюме из выдачи нескольких ролей
+        # скачивалось один раз
+        self.seen_resume_ids: set = set()
+        self._seen_lock = threading.Lock()
+        # Справочник регионов для разбиения поиска: id -> id вложенных
+        self._area_children: Dict[str, List[str]] = {}
+        # found из первой страницы поиска: (kind, role_id) -> число найденных
+        self.found_counts: Dict[tuple, int] = {}
+        # Общий пул потоков для страниц поиска и деталей резюме: роли,
+        # которые собираются параллельно, делят его, и число потоков
+        # запросов не умножается на число ролей
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        # Одна сессия с пулом соединений: TCP/TLS не поднимается на каждый запрос
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(10, max_workers * 2))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'application/json',
@@ -20,17 +93,81 @@ class HHAPIParser:
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0'
         ]
 
-    def _rotate_user_agent(self):
-        self.headers['User-Agent'] = random.choice(self.user_agents)
+    def _request_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def _request_headers(self) -> Dict:
+        # Отдельная копия заголовков на запрос, чтобы потоки не мешали друг другу
+        return {**self.headers, 'User-Agent': random.choice(self.user_agents)}
+
+    def _take_request(self) -> bool:
+        # Учитывает запрос в счётчике, если лимит ещё не исчерпан
+        with self._count_lock:
+            if self.request_budget is not None and self.request_count >= self.request_budget:
+                return False
+            self.request_count += 1
+            return True
+
+    def _pause(self, low: float, high: float):
+        if self.rate_limiter is None:
+            time.sleep(random.uniform(low, high))
+
+    def _record_cache(self, outcome: str):
+        self.cache.record(outcome)
+        metrics.inc('hh_cache_total', labels={'outcome': outcome})
 
     def _make_request(self, url: str, params: Optional[Dict] = None, max_retries: int = 3) -> Optional[Dict]:
+        cached = self.cache.get(url, params) if self.cache is not None else None
+        if cached is not None and self.cache.is_fresh(cached):
+            self._record_cache('hits')
+            return cached['body']
+
+        endpoint = endpoint_label(url)
         for attempt in range(max_retries):
+            if not self._take_request():
+                print(f"Лимит запросов ({self.request_budget}) исчерпан, запрос пропущен")
+                return None
+            if attempt:
+                metrics.inc('hh_retries_total', labels={'endpoint': endpoint})
             try:
-                self._rotate_user_agent()
-                response = requests.get(url, headers=self.headers, params=params, timeout=10)
+                if self.rate_limiter is not None:
+                    waited = time.perf_counter()
+                    self.rate_limiter.acquire()
+                    metrics.inc('hh_rate_limit_wait_seconds_total', time.perf_counter() - waited)
+                headers = self._request_headers()
+                if cached is not None:
+                    headers.update(ResponseCache.conditional_headers(cached))
+                started = time.perf_counter()
+                try:
+                    response = self.session.get(url, headers=headers, params=params, timeout=10)
+                except Exception:
+                    metrics.inc('hh_requests_total', labels={'endpoint': endpoint, 'status': 'error'})
+                    raise
+                finally:
+                    metrics.observe('hh_request_seconds', time.perf_counter() - started, {'endpoint': endpoint})
+                metrics.inc('hh_requests_total', labels={'endpoint': endpoint, 'status': str(response.status_code)})
+                metrics.inc('hh_response_bytes_total', len(response.content), {'endpoint': endpoint})
                 
-                if response.status_code == 200:
-                    return response.json()
+                if response.status_code == 304 and cached is not None:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.on_success()
+                    self.cache.refresh(url, params, cached, response.headers)
+                    self._record_cache('revalidated')
+                    return cached['body']
+                elif response.status_code == 200:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.on_success()
+                    data = response.json()
+                    if self.cache is not None:
+                        self.cache.store(url, params, data, response.headers)
+                        self._record_cache('misses')
+                    return data
+                elif response.status_code in (403, 429) and self.rate_limiter is not None:
+                    print(f"Сервер ограничил запросы ({response.status_code}). Попытка {attempt + 1} из {max_retries}")
+                    self.rate_limiter.on_throttle(parse_retry_after(response.headers.get('Retry-After')))
                 elif response.status_code == 403:
                     print(f"Доступ запрещен. Попытка {attempt + 1} из {max_retries}")
                     time.sleep(5 * (attempt + 1))
@@ -42,327 +179,560 @@ class HHAPIParser:
                 time.sleep(2 * (attempt + 1))
         return None
 
-    def parse_vacancies_by_role(self, role_id: str, max_items: int = 100) -> List[Dict]:
-        all_vacancies = []
-        page = 0
-        per_page = 20
-
-        while len(all_vacancies) < max_items:
-            params = {
-                'professional_role': role_id,
-                'per_page': per_page,
-                'page': page,
-                'area': 1,  # Москва
-                'only_with_salary': True
-            }
-
-            url = f"{self.base_url}/vacancies"
-            data = self._make_request(url, params)
-
-            if not data or 'items' not in data:
-                break
-
-            vacancies = data['items']
-            if not vacancies:
-                break
-
-            all_vacancies.extend(vacancies)
-            print(f"Собрано: {len(all_vacancies)} из {max_items} вакансий для роли {role_id}")
-
-            if len(vacancies) < per_page or len(all_vacancies) >= max_items:
-                break
-
-            page += 1
-            time.sleep(random.uniform(0.25, 0.5))
-
-        return all_vacancies[:max_items]
-
-    def parse_resumes_by_role(self, role_id: str, max_items: int = 100) -> List[Dict]:
-        all_resumes = []
-        page = 0
-        per_page = 20
-
-        while len(all_resumes) < max_items:
-            params = {
-                'professional_role': role_id,
-                'per_page': per_page,
-                'page': page,
-                'area': 1,  # Москва
-                'order_by': 'publication_time'
-            }
-
-            url = f"{self.base_url}/resumes"
-            data = self._make_request(url, params)
-
+    def _iter_pages_concurrently(self, url: str, params: Dict, max_items: int, per_page: int,
+                                 found_key: Optional[tuple] = None, start_page: int = 0):
+        # Первая страница запрашивается сразу: из неё известно число страниц,
+        # остальные уходят в пул потоков. Страницы отдаются по порядку номеров,
+        # чтобы вызывающий мог отмечать их в контрольной точке. В полёте не
+        # больше 2 * max_workers страниц: медленный потребитель притормаживает
+        # запросы, а не копит ответы в памяти. Пустая страница из успешного
+        # ответа отдаётся как есть — по ней вызывающий видит конец выдачи,
+        # а после неудачного запроса страницы просто заканчиваются.
+        first = self._make_request(url, {**params, 'per_page': per_page, 'page': start_page})
+        if first and found_key is not None and first.get('found') is not None:
+            self.found_counts[found_key] = first['found']
+        if not first or 'items' not in first:
+            return
+        yield start_page, first['items']
+        if not first['items']:
+            return
+
+        pages_needed = (max_items + per_page - 1) // per_page
+        total_pages = min(first.get('pages', 1), pages_needed)
+        if total_pages <= start_page + 1:
+            return
+        page_numbers = iter(range(start_page + 1, total_pages))
+        in_flight = deque()
+        executor = self._request_pool()
+
+        def submit_next():
+            page = next(page_numbers, None)
+            if page is not None:
+                in_flight.append((page, executor.submit(
+                    self._make_request, url, {**params, 'per_page': per_page, 'page': page})))
+
+        for _ in range(self.max_workers * 2):
+            submit_next()
+        try:
+            while in_flight:
+                page, future = in_flight.popleft()
+                data = future.result()
+                if not data or 'items' not in data:
+                    break
+                if not data['items']:
+                    yield page, []
+                    break
+                submit_next()
+                yield page, data['items']
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+    def _iter_pages_sequentially(self, url: str, params: Dict, max_items: int, per_page: int,
+                                 found_key: Optional[tuple] = None, start_page: int = 0):
+        page = start_page
+        while page * per_page < max_items:
+            data = self._make_request(url, {**params, 'per_page': per_page, 'page': page})
             if not data or 'items' not in data:
                 break
-
-            resumes = data['items']
-            if not resumes:
-                break
-
-            # Получаем детальную информацию о каждом резюме
-            for resume in resumes:
-                try:
-                    resume_id = resume.get('id')
-                    if resume_id:
-                        detail_url = f"{self.base_url}/resumes/{resume_id}"
-                        detail_data = self._make_request(detail_url)
-                        if detail_data:
-                            all_resumes.append(detail_data)
-                            time.sleep(random.uniform(0.25, 0.5))
-                except Exception as e:
-                    print(f"Ошибка при получении деталей резюме {resume_id}: {e}")
-                    continue
-
-            print(f"Собрано: {len(all_resumes)} из {max_items} резюме для роли {role_id}")
-
-            if len(resumes) < per_page or len(all_resumes) >= max_items:
+            if found_key is not None and data.get('found') is not None:
+                self.found_counts[found_key] = data['found']
+            yield page, data['items']
+            # Последняя страница по pages из выдачи: лишний запрос за пустой не нужен
+            if len(data['items']) < per_page or page + 1 >= data.get('pages', page + 2):
                 break
-
             page += 1
-            time.sleep(random.uniform(0.25, 0.5))
-
-        return all_resumes[:max_items]
-
-    def process_salary(self, salary: Optional[Dict]) -> tuple:
-        if not salary:
-            return None, None, None
-
-        currency = salary.get('currency', 'RUR')
-        if currency == 'RUR':
-            currency = '₽'
-        elif currency == 'USD':
-            currency = '$'
-        elif currency == 'EUR':
-            currency = '€'
-
-        salary_from = salary.get('from')
-        salary_to = salary.get('to')
-
-        if salary_from and salary_to:
-            salary_str = f"{salary_from} - {salary_to}"
-        elif salary_from:
-            salary_str = f"от {salary_from}"
-        elif salary_to:
-            salary_str = f"до {salary_to}"
+            self._pause(0.25, 0.5)
+
+    def _iter_pages(self, url: str, params: Dict, max_items: int, per_page: int,
+                    found_key: Optional[tuple] = None, start_page: int = 0):
+        if self.max_workers > 1:
+            return self._iter_pages_concurrently(url, params, max_items, per_page, found_key, start_page)
+        return self._iter_pages_sequentially(url, params, max_items, per_page, found_key, start_page)
+
+    def _search_params(self, kind: str, role_id: str, shard: Optional[Shard] = None) -> Dict:
+        # Параметры поиска роли; шард дополняет их или заменяет регион
+        params = {
+            'professional_role': role_id,
+            'area': 1,  # Москва
+        }
+        if kind == 'vacancies':
+            params['only_with_salary'] = True
         else:
-            salary_str = "Не указана"
-
-        return salary_str, currency, (salary_from, salary_to)
-
-def init_db():
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
-    
-    # Создаем таблицу для вакансий
-    cursor.execute('DROP TABLE IF EXISTS vacancies')
-    cursor.execute('''
-        CREATE TABLE vacancies (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            hh_id TEXT,
-            salary_from INTEGER,
-            salary_to INTEGER,
-            salary_text TEXT,
-            currency TEXT,
-            source TEXT,
-            location TEXT,
-            company TEXT,
-            position TEXT,
-            experience TEXT,
-            skills TEXT,
-            url TEXT,
-            parsed_date TEXT,
-            parsed_month TEXT,
-            query TEXT,
-            role_id TEXT
-        )
-    ''')
-
-    # Создаем таблицу для резюме
-    cursor.execute('DROP TABLE IF EXISTS resumes')
-    cursor.execute('''
-        CREATE TABLE resumes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            hh_id TEXT,
-            title TEXT,
-            salary_from INTEGER,
-            salary_to INTEGER,
-            salary_currency TEXT,
-            age INTEGER,
-            gender TEXT,
-            location TEXT,
-            experience_years INTEGER,
-            skills TEXT,
-            education TEXT,
-            languages TEXT,
-            url TEXT,
-            parsed_date TEXT,
-            parsed_month TEXT,
-            role_id TEXT
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-def save_vacancies_to_db(vacancies: List[Dict], role_id: str):
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
-    
-    parser = HHAPIParser()
-    parsed_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    parsed_month = datetime.now().strftime('%Y-%m')
-    saved_count = 0
-
-    for vacancy in vacancies:
+            params['order_by'] = 'publication_time'
+        return {**params, **(shard or {})}
+
+    def count_found(self, kind: str, role_id: str, shard: Optional[Shard] = None) -> Optional[int]:
+        # Число найденных по запросу. Запрашивается та же первая страница,
+        # что и при сборе, поэтому с кэшем ответов она не скачивается дважды
+        data = self._make_request(f"{self.base_url}/{kind}",
+                                  {**self._search_params(kind, role_id, shard), 'per_page': PER_PAGE, 'page': 0})
+        return data.get('found') if data else None
+
+    def plan_shards(self, kind: str, role_id: str, areas: Iterable[str] = DEFAULT_AREAS,
+                    limit: int = SEARCH_DEPTH_LIMIT) -> List[Tuple[Shard, int]]:
+        # Разбиение поиска роли на непересекающиеся запросы, каждый из
+        # которых целиком помещается в limit: регион и вложенные в него
+        # регионы, затем опыт, затем (только для вакансий) окно даты
+        # публикации. Записи, привязанные к самому родительскому региону,
+        # а не к вложенному, при делении не попадают. Возвращаются шарды
+        # с числом найденных. Фильтра по непересекающимся диапазонам
+        # зарплаты в API нет: salary отбирает вакансии, вилка которых
+        # содержит значение, и соседние диапазоны пересекались бы
+        shards = []
+
+        def split_dates(shard: Shard, found: int, date_from: datetime, date_to: datetime):
+            if found <= limit or kind != 'vacancies' or date_to - date_from <= MIN_DATE_WINDOW:
+                if found > limit:
+                    print(f"Шард {shard} роли {role_id}: найдено {found}, будет собрано только {limit}")
+                shards.append((shard, found))
+                return
+            middle = date_from + (date_to - date_from) / 2
+            for start, stop in ((date_from, middle), (middle, date_to)):
+                window = {**shard, 'date_from': start.isoformat(timespec='seconds'),
+                          'date_to': stop.isoformat(timespec='seconds')}
+                window_found = self.count_found(kind, role_id, window)
+                if window_found:
+                    split_dates(window, window_found, start, stop)
+
+        now = datetime.now().replace(microsecond=0)
+
+        def split_area(area: str):
+            shard = {'area': area}
+            found = self.count_found(kind, role_id, shard)
+            if not found:
+                return
+            if found <= limit:
+                shards.append((shard, found))
+                return
+            children = self.child_areas(area)
+            if children:
+                for child in children:
+                    split_area(child)
+                return
+            for experience in EXPERIENCE_SHARDS:
+                experience_shard = {**shard, 'experience': experience}
+                experience_found = self.count_found(kind, role_id, experience_shard)
+                if experience_found:
+                    split_dates(experience_shard, experience_found, now - SEARCH_PERIOD, now)
+
+        for area in areas:
+            split_area(str(area))
+        return shards
+
+    def child_areas(self, area: str) -> List[str]:
+        # id вложенных регионов из справочника /areas; запоминаются на весь запуск
+        if area not in self._area_children:
+            data = self._make_request(f"{self.base_url}/areas/{area}")
+            self._area_children[area] = [str(child['id']) for child in (data or {}).get('areas', [])]
+        return self._area_children[area]
+
+    def iter_vacancy_pages(self, role_id: str, max_items: int = 100, start_page: int = 0,
+                           shard: Optional[Shard] = None) -> Iterator[Page]:
+        # Страницы вакансий по одной: (номер страницы, записи, размер страницы в выдаче).
+        # Генератор ничего не накапливает, память не растёт с max_items
+        params = self._search_params('vacancies', role_id, shard)
+        found_key = ('vacancies', role_id) if shard is None else None
+        for page, items in self._iter_pages(f"{self.base_url}/vacancies", params, max_items, PER_PAGE,
+                                            found_key, start_page):
+            yield page, items[:max_items - page * PER_PAGE], len(items)
+
+    def parse_vacancies_by_role(self, role_id: str, max_items: int = 100, start_page: int = 0,
+                                on_page: Optional[PageCallback] = None) -> List[VacancyRecord]:
+        # start_page — с какой страницы продолжать прерванный сбор;
+        # on_page(page, records, page_size) вызывается на каждой полученной странице.
+        # С on_page записи не накапливаются и возвращается пустой список,
+        # иначе — компактные VacancyRecord вместо ответов API
+        all_vacancies = []
+        for page, vacancies, page_size in self.iter_vacancy_pages(role_id, max_items, start_page):
+            if on_page is not None:
+                on_page(page, vacancies, page_size)
+            else:
+                all_vacancies.extend(to_records('vacancies', vacancies))
+            print(f"Собрано: {page * PER_PAGE + len(vacancies)} из {max_items} вакансий для роли {role_id}")
+        return all_vacancies
+
+    def _fetch_resume_detail(self, resume_id: str) -> Optional[Dict]:
         try:
-            salary_text, currency, (salary_from, salary_to) = parser.process_salary(vacancy.get('salary'))
-            
-            experience = vacancy.get('experience', {}).get('name', 'Не указан')
-            skills = ', '.join([skill.get('name', '') for skill in vacancy.get('key_skills', [])])
-            
-            cursor.execute('''
-                INSERT INTO vacancies (
-                    hh_id, salary_from, salary_to, salary_text, currency, 
-                    source, location, company, position, experience, 
-                    skills, url, parsed_date, parsed_month, query, role_id
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                vacancy.get('id'),
-                salary_from,
-                salary_to,
-                salary_text,
-                currency,
-                'hh.ru',
-                vacancy.get('area', {}).get('name', 'Не указано'),
-                vacancy.get('employer', {}).get('name', 'Не указано'),
-                vacancy.get('name', 'Не указано'),
-                experience,
-                skills,
-                vacancy.get('alternate_url'),
-                parsed_date,
-                parsed_month,
-                f"professional_role={role_id}",
-                role_id
-            ))
-            saved_count += 1
+            detail_url = f"{self.base_url}/resumes/{resume_id}"
+            return self._make_request(detail_url)
         except Exception as e:
-            print(f"Ошибка при сохранении вакансии {vacancy.get('id')}: {e}")
-            continue
+            print(f"Ошибка при получении деталей резюме {resume_id}: {e}")
+            return None
+
+    def _is_known_resume(self, resume: Dict, seen_ids: set) -> bool:
+        # Детали, уже запрошенные в этом запуске (seen_ids), не запрашиваются
+        # повторно. Остальные резюме из индекса дублей пропускаются, пока
+        # свежи и их карточка в выдаче не менялась
+        if resume['id'] in seen_ids:
+            metrics.inc('dedup_total', labels={'kind': 'resumes', 'outcome': 'detail_seen'})
+            return True
+        if self.dedup is not None:
+            fresh = self.dedup.is_fresh(record_key('resumes', resume['id']), listing_hash(resume))
+            if fresh is not None:
+                metrics.inc('dedup_total', labels={'kind': 'resumes',
+                                                   'outcome': 'detail_skipped' if fresh else 'detail_changed'})
+                return fresh
+        return False
+
+    def _fetch_resume_details(self, resumes: List[Dict], seen_ids: Optional[set] = None) -> List[Dict]:
+        # Детали запрашиваются только для резюме, которых ещё нет в seen_ids
+        # (уже скачанные в этом запуске или свежие записи из базы) и
+        # которые не отмечены в индексе дублей как неизменные
+        if seen_ids is None:
+            seen_ids = self.seen_resume_ids
+        resume_ids = []
+        listings = {}
+        # Проверка и отметка под блокировкой: два потока не запросят одно резюме
+        with self._seen_lock:
+            for resume in resumes:
+                resume_id = resume.get('id')
+                if resume_id and not self._is_known_resume(resume, seen_ids):
+                    seen_ids.add(resume_id)
+                    resume_ids.append(resume_id)
+                    listings[resume_id] = listing_hash(resume)
+
+        if self.max_workers > 1:
+            details = [detail for detail in self._request_pool().map(self._fetch_resume_detail, resume_ids) if detail]
+        else:
+            details = []
+            for resume_id in resume_ids:
+                detail_data = self._fetch_resume_detail(resume_id)
+                if detail_data:
+                    details.append(detail_data)
+                    self._pause(0.25, 0.5)
+        if self.dedup is None:
+            return details
+        # Хэш карточки уходит в DBWriter вместе с записью и попадает
+        # в индекс только после её сохранения
+        return [{**detail, LISTING_HASH_FIELD: listings.get(detail.get('id'))} for detail in details]
+
+    def iter_resume_pages(self, role_id: str, max_items: int = 100, known_ids: Optional[set] = None,
+                          start_page: int = 0, shard: Optional[Shard] = None) -> Iterator[Page]:
+        # Страницы резюме с деталями: (номер страницы, детали, размер страницы в выдаче).
+        # known_ids — hh_id резюме, детали которых скачивать повторно не нужно;
+        # они добавляются в общий для запуска self.seen_resume_ids. С индексом
+        # дублей known_ids не нужны: индекс знает эти резюме и вдобавок
+        # замечает, что карточка изменилась
+        seen_ids = self.seen_resume_ids
+        if known_ids and self.dedup is None:
+            with self._seen_lock:
+                seen_ids.update(known_ids)
+        params = self._search_params('resumes', role_id, shard)
+        found_key = ('resumes', role_id) if shard is None else None
+        for page, items in self._iter_pages(f"{self.base_url}/resumes", params, max_items, PER_PAGE,
+                                            found_key, start_page):
+            yield page, self._fetch_resume_details(items[:max_items - page * PER_PAGE], seen_ids), len(items)
+
+    def parse_resumes_by_role(self, role_id: str, max_items: int = 100, known_ids: Optional[set] = None,
+                              start_page: int = 0, on_page: Optional[PageCallback] = None) -> List[ResumeRecord]:
+        # С on_page детали не накапливаются и возвращается пустой список,
+        # иначе — компактные ResumeRecord вместо ответов API
+        all_resumes = []
+        collected = 0
+        for page, details, page_size in self.iter_resume_pages(role_id, max_items, known_ids, start_page):
+            collected += len(details)
+            if on_page is not None:
+                on_page(page, details, page_size)
+            else:
+                all_resumes.extend(to_records('resumes', details))
+            print(f"Собрано: {collected} из {max_items} резюме для роли {role_id}")
+        return all_resumes
 
-    conn.commit()
-    conn.close()
+    def process_salary(self, salary: Optional[Dict]) -> tuple:
+        return process_salary(salary)
+
+def init_db(reset: bool = False):
+    # По умолчанию данные прошлых запусков сохраняются, схема лишь доводится
+    # до актуальной версии. reset=True пересоздает таблицы с нуля.
+    storage_init_db(reset=reset)
+
+def load_known_resume_ids(max_age_days: int = 30, dedup: Optional[DedupIndex] = None,
+                          db_path: str = DB_PATH) -> set:
+    # hh_id резюме, сохранённых не раньше max_age_days дней назад.
+    # Более старые считаются устаревшими и скачиваются заново. С индексом
+    # дублей набор не нужен (iter_resume_pages его не читает), и запрос
+    # к базе не выполняется
+    if dedup is not None:
+        return set()
+    since = (datetime.now() - timedelta(days=max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute('SELECT DISTINCT hh_id FROM resumes WHERE parsed_date >= ?', (since,)).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+    return {row[0] for row in rows if row[0]}
+
+def save_vacancies_to_db(vacancies: List[Dict], role_id: str, writer: Optional[DBWriter] = None):
+    # Без переданного writer открывается своё соединение на один вызов
+    if writer is None:
+        with DBWriter() as own_writer:
+            return save_vacancies_to_db(vacancies, role_id, own_writer)
+
+    saved_count = writer.add_vacancies(vacancies, role_id)
+    writer.flush()
     print(f"Сохранено {saved_count} вакансий для роли {role_id}")
 
-def save_resumes_to_db(resumes: List[Dict], role_id: str):
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
-    
-    parsed_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    parsed_month = datetime.now().strftime('%Y-%m')
-    saved_count = 0
+def save_resumes_to_db(resumes: List[Dict], role_id: str, writer: Optional[DBWriter] = None):
+    if writer is None:
+        with DBWriter() as own_writer:
+            return save_resumes_to_db(resumes, role_id, own_writer)
 
-    for resume in resumes:
-        try:
-            # Обработка зарплаты
-            salary = resume.get('salary', {})
-            salary_from = salary.get('amount')
-            salary_to = salary.get('amount')  # В резюме обычно указывается одна сумма
-            salary_currency = salary.get('currency', 'RUR')
-            if salary_currency == 'RUR':
-                salary_currency = '₽'
-            elif salary_currency == 'USD':
-                salary_currency = '$'
-            elif salary_currency == 'EUR':
-                salary_currency = '€'
-
-            # Обработка навыков
-            skills = ', '.join([skill.get('name', '') for skill in resume.get('skills', [])])
-
-            # Обработка образования
-            education = []
-            for edu in resume.get('education', {}).get('primary', []):
-                if edu.get('name'):
-                    education.append(edu['name'])
-            education_str = '; '.join(education)
-
-            # Обработка языков
-            languages = []
-            for lang in resume.get('language', []):
-                if lang.get('name'):
-                    languages.append(lang['name'])
-            languages_str = '; '.join(languages)
-
-            cursor.execute('''
-                INSERT INTO resumes (
-                    hh_id, title, salary_from, salary_to, salary_currency,
-                    age, gender, location, experience_years, skills,
-                    education, languages, url, parsed_date, parsed_month, role_id
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                resume.get('id'),
-                resume.get('title', 'Не указано'),
-                salary_from,
-                salary_to,
-                salary_currency,
-                resume.get('age'),
-                resume.get('gender', {}).get('name', 'Не указано'),
-                resume.get('area', {}).get('name', 'Не указано'),
-                resume.get('total_experience', {}).get('months', 0) // 12,
-                skills,
-                education_str,
-                languages_str,
-                resume.get('alternate_url'),
-                parsed_date,
-                parsed_month,
-                role_id
-            ))
-            saved_count += 1
-        except Exception as e:
-            print(f"Ошибка при сохранении резюме {resume.get('id')}: {e}")
-            continue
-
-    conn.commit()
-    conn.close()
+    saved_count = writer.add_resumes(resumes, role_id)
+    writer.flush()
     print(f"Сохранено {saved_count} резюме для роли {role_id}")
 
-def main():
-    # Инициализируем базу данных
-    init_db()
-    
-    # Создаем парсер
-    parser = HHAPIParser()
-    
+def crawl_role(parser: HHAPIParser, writer: DBWriter, role_id: str, kind: str, max_items: int = 100,
+               known_ids: Optional[set] = None) -> Tuple[int, bool]:
+    # Сбор одного типа данных по роли с контрольными точками: каждая
+    # страница сохраняется вместе с курсором, и прерванный сбор (сбой,
+    # блокировка 403, исчерпанная квота) продолжается со следующей страницы.
+    # Возвращает число сохранённых записей и признак, что сбор завершён
+    checkpoint = writer.load_checkpoint(role_id, kind)
+    start_page, saved = 0, 0
+    if checkpoint and checkpoint['completed_at'] is None:
+        updated_at = datetime.strptime(checkpoint['updated_at'], '%Y-%m-%d %H:%M:%S')
+        if datetime.now() - updated_at <= CHECKPOINT_MAX_AGE:
+            start_page, saved = checkpoint['next_page'], checkpoint['saved']
+            print(f"Продолжаем сбор ({kind}) для роли {role_id} со страницы {start_page}")
+    if start_page == 0:
+        writer.reset_checkpoint(role_id, kind)
+
+    progress = {'saved': saved, 'done': False}
+
+    def prepare(page_data: Page):
+        page, records, page_size = page_data
+        return page, writer.prepare(kind, records, role_id), len(records), page_size
+
+    def write(prepared):
+        page, rows, fetched, page_size = prepared
+        metrics.inc('crawl_pages_total', labels={'kind': kind})
+        metrics.inc('crawl_records_total', fetched, {'kind': kind})
+        progress['saved'] += writer.add_prepared(kind, rows)
+        # Сбор завершён на неполной странице или когда прочитано всё, что
+        # отдаёт поиск: max_items, found из выдачи и предел глубины поиска.
+        # found учитывается, когда выдача кратна PER_PAGE и последняя
+        # страница полная
+        found = parser.found_counts.get((kind, role_id))
+        limit = min(max_items, SEARCH_DEPTH_LIMIT, max_items if found is None else found)
+        progress['done'] = page_size < PER_PAGE or (page + 1) * PER_PAGE >= limit
+        writer.checkpoint(role_id, kind, page + 1, progress['saved'], completed=progress['done'])
+
+    if start_page * PER_PAGE >= max_items:
+        # Курсор уже за max_items: закрываем оставшуюся открытой точку
+        progress['done'] = True
+        writer.checkpoint(role_id, kind, start_page, saved, completed=True)
+    else:
+        # Конвейер: запросы страниц, подготовка строк и запись идут в разных
+        # потоках через ограниченные очереди, так что сеть и диск работают
+        # одновременно, а в памяти держится лишь несколько страниц
+        if kind == 'vacancies':
+            pages = parser.iter_vacancy_pages(role_id, max_items, start_page)
+        else:
+            pages = parser.iter_resume_pages(role_id, max_items, known_ids, start_page)
+        with metrics.timer('crawl_role_seconds', {'kind': kind}, ROLE_BUCKETS):
+            run_pipeline(pages, [('prepare', prepare)], write, name='fetch')
+    added = progress['saved'] - saved
+    label = 'вакансий' if kind == 'vacancies' else 'резюме'
+    state = '' if progress['done'] else ' (сбор не завершён, продолжится со следующего запуска)'
+    print(f"Сохранено {added} {label} для роли {role_id}{state}")
+    return added, progress['done']
+
+def crawl_role_sharded(parser: HHAPIParser, writer: DBWriter, role_id: str, kind: str,
+                       areas: Iterable[str] = DEFAULT_AREAS, workers: int = 4,
+                       known_ids: Optional[set] = None) -> int:
+    # Полный сбор роли: поиск разбивается на шарды не больше
+    # SEARCH_DEPTH_LIMIT записей, шарды собираются параллельно. Запись,
+    # попавшая в несколько шардов (граница окна дат), сохраняется один
+    # раз: вакансии отсеиваются по общему набору hh_id, резюме — до
+    # запроса деталей через parser.seen_resume_ids. Контрольных точек
+    # нет: окна дат сдвигаются от запуска к запуску
+    shards = parser.plan_shards(kind, role_id, areas)
+    label = 'вакансий' if kind == 'vacancies' else 'резюме'
+    print(f"Роль {role_id}: {len(shards)} шардов, найдено {sum(found for _, found in shards)} {label}")
+    seen_ids = set()
+    seen_lock = threading.Lock()
+
+    def crawl_shard(shard: Shard) -> int:
+        if kind == 'vacancies':
+            pages = parser.iter_vacancy_pages(role_id, SEARCH_DEPTH_LIMIT, shard=shard)
+        else:
+            pages = parser.iter_resume_pages(role_id, SEARCH_DEPTH_LIMIT, known_ids, shard=shard)
+        saved = 0
+        for _, items, _ in pages:
+            if kind == 'vacancies':
+                with seen_lock:
+                    fresh = [item for item in items if item.get('id') not in seen_ids]
+                    seen_ids.update(item.get('id') for item in fresh)
+                if len(fresh) < len(items):
+                    metrics.inc('dedup_total', len(items) - len(fresh), {'kind': kind, 'outcome': 'shard_duplicate'})
+                items = fresh
+            metrics.inc('crawl_pages_total', labels={'kind': kind})
+            metrics.inc('crawl_records_total', len(items), {'kind': kind})
+            saved += writer.add_prepared(kind, writer.prepare(kind, items, role_id))
+        return saved
+
+    added = 0
+    with metrics.timer('crawl_role_seconds', {'kind': kind}, ROLE_BUCKETS), \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(crawl_shard, shard): shard for shard, _ in shards}
+        for future in as_completed(futures):
+            try:
+                added += future.result()
+            except Exception as e:
+                print(f"Ошибка при сборе шарда {futures[future]} роли {role_id}: {e}")
+    writer.flush()
+    print(f"Сохранено {added} {label} для роли {role_id}")
+    return added
+
+def finish_ingest(writer: DBWriter, sketch_k: int = DEFAULT_K):
+    # Дописываем остаток и пересчитываем salary_stats для затронутых ролей и месяцев
+    writer.flush()
+    refresh_salary_stats(writer.conn, writer.touched, sketch_k)
+    writer.close()
+
+def load_role_ids(path: str = 'roles.json') -> List[str]:
     # Загружаем роли из файла
-    with open('roles.json', 'r', encoding='utf-8') as f:
+    with open(path, 'r', encoding='utf-8') as f:
         roles_data = json.load(f)
-    
+
     # Собираем все ID ролей
     role_ids = []
     for category in roles_data.get('categories', []):
         for role in category.get('roles', []):
             role_ids.append(role['id'])
+    return role_ids
+
+def parse_role(parser: HHAPIParser, role_id: str, max_items: int = 100,
+               known_resume_ids: Optional[set] = None, writer: Optional[DBWriter] = None) -> tuple:
+    # С writer страницы сохраняются по мере получения (с контрольными точками),
+    # и возвращается число сохранённых записей
+    if writer is not None:
+        return (crawl_role(parser, writer, role_id, 'vacancies', max_items)[0],
+                crawl_role(parser, writer, role_id, 'resumes', max_items, known_resume_ids)[0])
+    vacancies = parser.parse_vacancies_by_role(role_id, max_items=max_items)
+    resumes = parser.parse_resumes_by_role(role_id, max_items=max_items, known_ids=known_resume_ids)
+    return vacancies, resumes
+
+def parse_roles_concurrently(parser: HHAPIParser, role_ids: List[str], max_items: int = 100,
+                             max_workers: int = 4, sketch_k: int = DEFAULT_K):
+    # Несколько ролей обрабатываются одновременно, темп запросов задаёт общий
+    # ограничитель парсера. Страницы пишутся в общий writer по мере получения.
+    known_resume_ids = load_known_resume_ids(dedup=parser.dedup)
+    writer = DBWriter(dedup=parser.dedup)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(parse_role, parser, role_id, max_items, known_resume_ids, writer): role_id
+            for role_id in role_ids
+        }
+        for future in as_completed(futures):
+            role_id = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Ошибка при парсинге роли {role_id}: {e}")
+    finish_ingest(writer, sketch_k)
+
+def print_cache_stats(cache: Optional[ResponseCache]):
+    if cache is None:
+        return
+    stats = cache.stats()
+    print(f"Кэш ответов: попаданий {stats['hits']}, подтверждено 304 {stats['revalidated']}, "
+          f"промахов {stats['misses']} (сэкономлено {stats['saved_ratio']:.0%} запросов)")
+
+def report_metrics(path: Optional[str] = None):
+    print("\nИтоги прогона:")
+    print(metrics.summary())
+    if path:
+        metrics.write(path)
+        print(f"Метрики сохранены в {path}")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Сбор вакансий и резюме с hh.ru')
+    arg_parser.add_argument('--workers', type=int, default=1,
+                            help='Сколько ролей и страниц обрабатывать одновременно (1 — последовательно)')
+    arg_parser.add_argument('--rate', type=float, default=2.0,
+                            help='Начальный лимит запросов в секунду для параллельного режима')
+    arg_parser.add_argument('--base-url', default='https://api.hh.ru',
+                            help='Адрес API (например, локальной заглушки)')
+    arg_parser.add_argument('--reset-db', action='store_true',
+                            help='Удалить собранные ранее данные и создать таблицы заново')
+    arg_parser.add_argument('--cache-dir', default=None,
+                            help='Каталог дискового кэша ответов API (по умолчанию кэш выключен)')
+    arg_parser.add_argument('--cache-ttl', type=float, default=6 * 3600,
+                            help='Сколько секунд ответ из кэша считается свежим')
+    arg_parser.add_argument('--no-dedup', action='store_true',
+                            help='Не использовать индекс уже собранных записей')
+    arg_parser.add_argument('--shard', action='store_true',
+                            help='Собирать роли целиком, разбивая поиск на шарды (регион, опыт, окно дат); '
+                                 '--workers задаёт число шардов, собираемых одновременно')
+    arg_parser.add_argument('--areas', default=','.join(DEFAULT_AREAS),
+                            help='Регионы hh.ru через запятую для --shard (113 — Россия целиком, 1 — Москва, '
+                                 '2 — Санкт-Петербург, 76 — Ростов-на-Дону)')
+    arg_parser.add_argument('--metrics-file', default=None,
+                            help='Куда выгрузить метрики прогона: *.json — снимок JSON, иначе формат Prometheus')
+    arg_parser.add_argument('--sketch-k', type=int, default=DEFAULT_K,
+                            help='Параметр k скетчей перцентилей в salary_sketches (больше — точнее и крупнее)')
+    args = arg_parser.parse_args()
+    cache = ResponseCache(args.cache_dir, ttl=args.cache_ttl) if args.cache_dir else None
+
+    # Инициализируем базу данных (история прошлых запусков сохраняется)
+    init_db(reset=args.reset_db)
+    dedup = None if args.no_dedup else DedupIndex(dedup_path(DB_PATH))
     
+    role_ids = load_role_ids()
+
+    if args.shard:
+        parser = HHAPIParser(base_url=args.base_url, rate_limiter=TokenBucket(rate=args.rate), cache=cache,
+                             dedup=dedup)
+        known_resume_ids = load_known_resume_ids(dedup=dedup)
+        writer = DBWriter(dedup=dedup)
+        areas = [area.strip() for area in args.areas.split(',') if area.strip()]
+        for role_id in role_ids:
+            print(f"\nПарсинг данных для роли {role_id} по шардам")
+            crawl_role_sharded(parser, writer, role_id, 'vacancies', areas, args.workers)
+            crawl_role_sharded(parser, writer, role_id, 'resumes', areas, args.workers, known_resume_ids)
+        finish_ingest(writer, args.sketch_k)
+        print_cache_stats(cache)
+        report_metrics(args.metrics_file)
+        return
+
+    if args.workers > 1:
+        parser = HHAPIParser(base_url=args.base_url, rate_limiter=TokenBucket(rate=args.rate),
+                             max_workers=args.workers, cache=cache, dedup=dedup)
+        parse_roles_concurrently(parser, role_ids, max_items=100, max_workers=args.workers,
+                                 sketch_k=args.sketch_k)
+        print_cache_stats(cache)
+        report_metrics(args.metrics_file)
+        return
+
+    # Создаем парсер
+    parser = HHAPIParser(base_url=args.base_url, cache=cache, dedup=dedup)
+    known_resume_ids = load_known_resume_ids(dedup=dedup)
+    
+    writer = DBWriter(dedup=dedup)
+
     # Парсим вакансии и резюме для каждой роли
     for role_id in role_ids:
         print(f"\nПарсинг данных для роли {role_id}")
         
         # Парсим вакансии
         print("Сбор вакансий...")
-        vacancies = parser.parse_vacancies_by_role(role_id, max_items=100)
-        if vacancies:
-            save_vacancies_to_db(vacancies, role_id)
+        crawl_role(parser, writer, role_id, 'vacancies', max_items=100)
         
         time.sleep(random.uniform(1, 2))
         
         # Парсим резюме
         print("Сбор резюме...")
-        resumes = parser.parse_resumes_by_role(role_id, max_items=100)
-        if resumes:
-            save_resumes_to_db(resumes, role_id)
+        crawl_role(parser, writer, role_id, 'resumes', max_items=100, known_ids=known_resume_ids)
         
         time.sleep(random.uniform(1, 2))
 
+    finish_ingest(writer, args.sketch_k)
+    print_cache_stats(cache)
+    report_metrics(args.metrics_file)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
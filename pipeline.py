@@ -0,0 +1,108 @@
+import queue
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+from metrics import registry as metrics
+
+# Сколько элементов может ждать между соседними стадиями
+DEFAULT_QUEUE_SIZE = 4
+# Как часто заблокированная стадия проверяет, не остановлен ли конвейер
+_POLL_SECONDS = 0.1
+
+_DONE = object()
+
+# Стадия конвейера: имя (для метрик) и функция элемент -> элемент
+Stage = Tuple[str, Callable]
+
+
+class _Pipeline:
+    def __init__(self, maxsize: int, size: int):
+        self.queues = [queue.Queue(maxsize) for _ in range(size)]
+        self.stop = threading.Event()
+        self.errors: List[BaseException] = []
+
+    def fail(self, error: BaseException):
+        self.errors.append(error)
+        self.stop.set()
+
+    def put(self, index: int, item, stage: str) -> bool:
+        # Полная очередь блокирует стадию — это и есть обратное давление:
+        # сеть не убегает вперёд медленной записи в базу
+        started = None
+        while not self.stop.is_set():
+            try:
+                self.queues[index].put(item, timeout=_POLL_SECONDS)
+                if started is not None:
+                    metrics.inc('pipeline_blocked_seconds_total', time.perf_counter() - started, {'stage': stage})
+                return True
+            except queue.Full:
+                started = started or time.perf_counter()
+        return False
+
+    def get(self, index: int):
+        while not self.stop.is_set():
+            try:
+                return self.queues[index].get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+
+def run_pipeline(source: Iterable, stages: Sequence[Stage] = (), sink: Optional[Callable] = None,
+                 maxsize: int = DEFAULT_QUEUE_SIZE, name: str = 'source'):
+    # Источник и каждая стадия работают в своих потоках и связаны
+    # ограниченными очередями, sink выполняется в вызывающем потоке.
+    # Элементы проходят по порядку; в памяти одновременно не больше
+    # maxsize элементов на каждую очередь. Ошибка любой стадии
+    # останавливает конвейер и пробрасывается вызывающему.
+    pipeline = _Pipeline(maxsize, len(stages) + 1)
+
+    def produce():
+        try:
+            for item in source:
+                if not pipeline.put(0, item, name):
+                    break
+        except BaseException as e:
+            pipeline.fail(e)
+        finally:
+            close = getattr(source, 'close', None)
+            if close is not None:
+                close()
+            pipeline.put(0, _DONE, name)
+
+    def transform(index: int, stage_name: str, func: Callable):
+        try:
+            while True:
+                item = pipeline.get(index)
+                if item is _DONE:
+                    break
+                if not pipeline.put(index + 1, func(item), stage_name):
+                    return
+        except BaseException as e:
+            pipeline.fail(e)
+        finally:
+            pipeline.put(index + 1, _DONE, stage_name)
+
+    threads = [threading.Thread(target=produce, name=f"pipeline-{name}", daemon=True)]
+    for index, (stage_name, func) in enumerate(stages):
+        threads.append(threading.Thread(target=transform, args=(index, stage_name, func),
+                                        name=f"pipeline-{stage_name}", daemon=True))
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = pipeline.get(len(stages))
+            if item is _DONE:
+                break
+            if sink is not None:
+                sink(item)
+    except BaseException:
+        pipeline.stop.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+    if pipeline.errors:
+        raise pipeline.errors[0]
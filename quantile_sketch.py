@@ -0,0 +1,203 @@
+import math
+import struct
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+# Размер верхнего компактора: ошибка ранга примерно обратно
+# пропорциональна k (см. KLLSketch.rank_error_bound)
+DEFAULT_K = 200
+# Во сколько раз уменьшается вместимость каждого следующего уровня вниз
+CAPACITY_DECAY = 2 / 3
+MIN_CAPACITY = 2
+
+_MAGIC = b'KLL1'
+_HEADER = struct.Struct('<4sIqddI')
+
+
+class KLLSketch:
+    # Квантильный скетч KLL (Karnin, Lang, Liberty). Значения лежат по
+    # уровням, элемент уровня h весит 2^h. Переполненный уровень
+    # сортируется, и каждый второй элемент (со случайным сдвигом) уходит
+    # на уровень выше. Скетчи одного k сливаются поуровневой склейкой,
+    # поэтому перцентили за год или по группе ролей собираются из
+    # помесячных скетчей без чтения исходных строк.
+
+    def __init__(self, k: int = DEFAULT_K, seed: Optional[int] = None):
+        if k < MIN_CAPACITY:
+            raise ValueError(f"k должен быть не меньше {MIN_CAPACITY}")
+        self.k = k
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def rank_error_bound(self) -> float:
+        # Ожидаемая нормированная ошибка ранга для одного квантиля
+        # (эмпирическая формула из реализации Apache DataSketches)
+        return 2.296 / self.k ** 0.9723
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(MIN_CAPACITY, int(math.ceil(self.k * CAPACITY_DECAY ** depth)))
+
+    def _retained(self) -> int:
+        return sum(len(level) for level in self.levels)
+
+    def _max_retained(self) -> int:
+        return sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def _compress(self):
+        while self._retained() > self._max_retained():
+            for level in range(len(self.levels)):
+                items = self.levels[level]
+                if len(items) < self._capacity(level):
+                    continue
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # При нечётной длине один элемент остаётся на уровне
+                keep = items[:1] if len(items) % 2 else items[:0]
+                items = items[len(keep):]
+                promoted = items[int(self._rng.integers(2))::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                break
+
+    def update(self, values: Iterable[float]):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.n += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        # Большой массив добавляется порциями, чтобы уровень 0 не разрастался
+        chunk = max(self._capacity(0), self.k)
+        for start in range(0, len(values), chunk):
+            self.levels[0] = np.concatenate([self.levels[0], values[start:start + chunk]])
+            self._compress()
+
+    @classmethod
+    def from_values(cls, values: Iterable[float], k: int = DEFAULT_K, seed: Optional[int] = None) -> 'KLLSketch':
+        sketch = cls(k, seed)
+        sketch.update(values)
+        return sketch
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        # Скетчи с разными k (таблица пересчитывалась с другим --sketch-k)
+        # сливаются в меньший k: уровни сжимаются до его ёмкостей, и
+        # точность результата — как у менее точного из двух
+        self.k = min(self.k, other.k)
+        if not other.n:
+            self._compress()
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 1 << h, dtype=np.int64) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def rank(self, value: float) -> float:
+        # Доля значений строго меньше value
+        if not self.n:
+            return 0.0
+        items, cumulative = self._weighted()
+        position = np.searchsorted(items, value, side='left')
+        return float(cumulative[position - 1]) / cumulative[-1] if position else 0.0
+
+    def quantiles(self, fractions: Iterable[float]) -> np.ndarray:
+        fractions = np.asarray(list(fractions), dtype=np.float64)
+        if not self.n:
+            return np.zeros(len(fractions))
+        items, cumulative = self._weighted()
+        targets = fractions * cumulative[-1]
+        positions = np.minimum(np.searchsorted(cumulative, targets, side='left'), len(items) - 1)
+        result = items[positions]
+        # Крайние квантили известны точно
+        result[fractions <= 0] = self.min
+        result[fractions >= 1] = self.max
+        return result
+
+    def percentiles(self, q: Iterable[float]) -> np.ndarray:
+        return self.quantiles(np.asarray(list(q), dtype=np.float64) / 100)
+
+    def range_percentiles(self, low: float, high: float, q: Iterable[float]) -> Optional[np.ndarray]:
+        # Перцентили значений из [low, high): отрезок рангов между границами
+        if not self.n:
+            return None
+        low_rank, high_rank = self.rank(low), self.rank(high)
+        if high_rank <= low_rank:
+            return None
+        fractions = low_rank + np.asarray(list(q), dtype=np.float64) / 100 * (high_rank - low_rank)
+        return np.clip(self.quantiles(fractions), low, high)
+
+    def to_bytes(self) -> bytes:
+        sizes = np.array([len(level) for level in self.levels], dtype='<u4')
+        return (
+            _HEADER.pack(_MAGIC, self.k, self.n, self.min, self.max, len(self.levels))
+            + sizes.tobytes()
+            + np.concatenate(self.levels).astype('<f8').tobytes()
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'KLLSketch':
+        magic, k, n, minimum, maximum, level_count = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("Неизвестный формат скетча")
+        offset = _HEADER.size
+        sizes = np.frombuffer(data, dtype='<u4', count=level_count, offset=offset)
+        offset += sizes.nbytes
+        items = np.frombuffer(data, dtype='<f8', offset=offset)
+        sketch = cls(k)
+        sketch.n, sketch.min, sketch.max = n, minimum, maximum
+        sketch.levels = [level.copy() for level in np.split(items, np.cumsum(sizes)[:-1])]
+        return sketch
+
+
+def merge_sketches(sketches: Iterable[KLLSketch], k: int = DEFAULT_K) -> KLLSketch:
+    merged = KLLSketch(k)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+
+def self_check(k: int = DEFAULT_K, size: int = 200000, parts: int = 12, seed: int = 0) -> float:
+    # Сверка с точными перцентилями: данные режутся на части (как месяцы),
+    # по каждой строится скетч, скетчи сливаются, и ошибка ранга
+    # сравнивается с оценкой rank_error_bound
+    rng = np.random.default_rng(seed)
+    values = np.round(rng.lognormal(mean=11.7, sigma=0.5, size=size), -3)
+    merged = merge_sketches(
+        (KLLSketch.from_values(part, k, seed=i) for i, part in enumerate(np.array_split(values, parts))), k
+    )
+    exact = np.sort(values)
+    q = np.arange(1, 100)
+    estimates = merged.percentiles(q)
+    # Ошибка в рангах: где оценка реально стоит в отсортированных данных
+    low = np.searchsorted(exact, estimates, side='left') / size
+    high = np.searchsorted(exact, estimates, side='right') / size
+    target = q / 100
+    errors = np.where(target < low, low - target, np.where(target > high, target - high, 0.0))
+    worst = float(errors.max())
+    print(f"k={k}: n={merged.n}, хранится {merged._retained()} значений, "
+          f"макс. ошибка ранга {worst:.4f}, оценка {merged.rank_error_bound:.4f}")
+    if worst > merged.rank_error_bound:
+        raise AssertionError(f"k={k}: ошибка ранга {worst:.4f} больше оценки {merged.rank_error_bound:.4f}")
+    return worst
+
+if __name__ == "__main__":
+    for k in (50, 100, DEFAULT_K, 400):
+        self_check(k)
@@ -0,0 +1,69 @@
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    # Общий для всех потоков ограничитель запросов к API.
+    # Скорость подстраивается под ответы сервера: после успешных запросов
+    # она плавно растёт, после 403/429 — падает вдвое, и все потоки
+    # ждут паузу (Retry-After, если сервер его прислал).
+
+    def __init__(self, rate: float = 2.0, capacity: float = 4.0, min_rate: float = 0.2,
+                 max_rate: float = 8.0, increase_step: float = 0.05, throttle_pause: float = 5.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.throttle_pause = throttle_pause
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.throttled_count = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Ответы, пришедшие уже во время паузы, относятся к тому же
+            # всплеску и повторно скорость не снижают
+            if now >= self.blocked_until:
+                self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            pause = retry_after if retry_after is not None else self.throttle_pause
+            self.blocked_until = max(self.blocked_until, now + pause)
+            self.throttled_count += 1
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Retry-After в секундах; вариант с HTTP-датой hh.ru не присылает
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
@@ -0,0 +1,260 @@
+import math
+import numpy as np
+from typing import Dict, Iterable, Optional
+
+# Перцентили, которые считаются по каждому диапазону
+DEFAULT_PERCENTILES = (10, 20, 30, 40, 50, 60, 70, 80, 90)
+DEFAULT_MAX_SALARY = 600000
+# Перцентили грейдов: Грейд 1, 2 и 3
+GRADE_PERCENTILES = (15, 50, 85)
+# Корзины потоковой гистограммы: ширина делит все шаги диапазонов, всё,
+# что выше предела, попадает в последнюю корзину
+SALARY_BIN_WIDTH = 100
+SALARY_BIN_LIMIT = 10000000
+
+
+def sorted_percentiles(sorted_values: np.ndarray, starts: np.ndarray, stops: np.ndarray,
+                       q: Iterable[float]) -> np.ndarray:
+    # Перцентили для набора непрерывных срезов отсортированного массива.
+    # Интерполяция линейная, как у np.percentile по умолчанию.
+    # Для пустых срезов возвращаются нули.
+    starts = np.asarray(starts, dtype=np.int64)
+    stops = np.asarray(stops, dtype=np.int64)
+    q = np.asarray(list(q), dtype=np.float64) / 100.0
+    sizes = stops - starts
+    result = np.zeros((len(starts), len(q)), dtype=np.float64)
+
+    non_empty = sizes > 0
+    if not non_empty.any():
+        return result
+
+    base = starts[non_empty][:, None]
+    last = (sizes[non_empty] - 1)[:, None]
+    pos = q[None, :] * last
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, last)
+    frac = pos - lo
+    low_values = sorted_values[base + lo]
+    high_values = sorted_values[base + hi]
+    result[non_empty] = low_values + (high_values - low_values) * frac
+    return result
+
+
+class SalaryHistogram:
+    # Зарплаты сортируются один раз, после чего любой шаг диапазонов
+    # считается через searchsorted по границам, без повторных фильтраций.
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.values = np.sort(values)
+        self.total = len(self.values)
+        self._cumulative = {}
+
+    @classmethod
+    def from_sorted(cls, sorted_values):
+        # Уже отсортированные значения без NaN (например, mmap из кэша)
+        # используются как есть, без копирования и сортировки
+        histogram = cls.__new__(cls)
+        histogram.values = sorted_values
+        histogram.total = len(sorted_values)
+        histogram._cumulative = {}
+        return histogram
+
+    def edges(self, step: int, max_salary: int = DEFAULT_MAX_SALARY) -> np.ndarray:
+        # Те же границы, что и у generate_ranges: [start, start + step)
+        starts = np.arange(0, max_salary + step, step, dtype=np.int64)
+        return np.append(starts, starts[-1] + step)
+
+    def positions(self, edges: np.ndarray) -> np.ndarray:
+        # Позиция границы в отсортированном массиве = число зарплат меньше неё
+        return np.searchsorted(self.values, edges, side='left')
+
+    def ranked(self):
+        # Зарплаты по рангу: sorted_percentiles берёт из этого объекта
+        # значения по массивам позиций
+        return self.values
+
+    def cumulative_counts(self, step: int, max_salary: int = DEFAULT_MAX_SALARY) -> np.ndarray:
+        # Накопленные количества по границам диапазонов, кэшируются на шаг
+        key = (step, max_salary)
+        if key not in self._cumulative:
+            self._cumulative[key] = self.positions(self.edges(step, max_salary))
+        return self._cumulative[key]
+
+    def bins(self, step: int, max_salary: int = DEFAULT_MAX_SALARY,
+             percentiles: Optional[Iterable[float]] = DEFAULT_PERCENTILES) -> Dict:
+        edges = self.edges(step, max_salary)
+        positions = self.cumulative_counts(step, max_salary)
+        counts = np.diff(positions)
+        fractions = counts / self.total if self.total > 0 else np.zeros(len(counts))
+
+        result = {
+            'starts': edges[:-1].astype(np.int64),
+            'counts': counts,
+            'fractions': fractions,
+        }
+        if percentiles is not None:
+            result['percentiles'] = sorted_percentiles(self.ranked(), positions[:-1], positions[1:], percentiles)
+        return result
+
+    def bins_for_steps(self, steps: Iterable[int], max_salary: int = DEFAULT_MAX_SALARY,
+                       percentiles: Optional[Iterable[float]] = DEFAULT_PERCENTILES) -> Dict[int, Dict]:
+        # Сортировка уже сделана, поэтому каждый дополнительный шаг стоит
+        # только O(число диапазонов * log n)
+        return {step: self.bins(step, max_salary, percentiles) for step in steps}
+
+    def range_values(self, min_salary: float, max_salary: float) -> np.ndarray:
+        # Зарплаты из [min_salary, max_salary) без копирования
+        start, stop = self.positions([min_salary, max_salary])
+        return self.values[start:stop]
+
+    def range_percentiles(self, min_salary: float, max_salary: float,
+                          percentiles: Iterable[float]) -> Optional[np.ndarray]:
+        # Перцентили зарплат из [min_salary, max_salary) — это срез
+        # отсортированного массива, поэтому хватает двух бинарных поисков
+        start, stop = self.positions([min_salary, max_salary])
+        if stop <= start:
+            return None
+        return sorted_percentiles(self.ranked(), [start], [stop], percentiles)[0]
+
+    def grade_percentiles(self, step: int, grade_ranges: Dict[str, tuple],
+                          max_salary: int = DEFAULT_MAX_SALARY,
+                          percentiles: Iterable[float] = GRADE_PERCENTILES) -> Dict[str, Optional[np.ndarray]]:
+        # В грейд попадают диапазоны шага, целиком лежащие внутри [grade_min, grade_max].
+        # Их объединение — один непрерывный интервал, его и режем.
+        last_edge = int(self.edges(step, max_salary)[-1])
+        result = {}
+        for level, (grade_min, grade_max) in grade_ranges.items():
+            low = max(math.ceil(grade_min / step), 0) * step
+            high = min(math.floor(grade_max / step) * step, last_edge)
+            result[level] = self.range_percentiles(low, high, percentiles) if high > low else None
+        return result
+
+    def label_percentiles(self, labels: Iterable[str],
+                          percentiles: Iterable[float] = GRADE_PERCENTILES) -> Optional[np.ndarray]:
+        # Перцентили по набору выбранных диапазонов вида "150000-160000"
+        intervals = merge_intervals(parse_range_label(label) for label in labels)
+        if not intervals:
+            return None
+        if len(intervals) == 1:
+            return self.range_percentiles(intervals[0][0], intervals[0][1], percentiles)
+
+        bounds = self.positions(np.array(intervals, dtype=np.float64).ravel()).reshape(-1, 2)
+        selected = _SelectedRanks(self.ranked(), bounds)
+        if selected.total == 0:
+            return None
+        return sorted_percentiles(selected, [0], [selected.total], percentiles)[0]
+
+
+class _SelectedRanks:
+    # Объединение нескольких срезов по рангам без копирования значений:
+    # ранг в объединении переводится в ранг исходного массива
+
+    def __init__(self, ranked, bounds: np.ndarray):
+        self.ranked = ranked
+        self.starts = bounds[:, 0]
+        sizes = np.maximum(bounds[:, 1] - bounds[:, 0], 0)
+        self.offsets = np.cumsum(sizes) - sizes
+        self.total = int(sizes.sum())
+
+    def __getitem__(self, ranks):
+        ranks = np.asarray(ranks, dtype=np.int64)
+        part = np.searchsorted(self.offsets, ranks, side='right') - 1
+        return self.ranked[self.starts[part] + ranks - self.offsets[part]]
+
+
+class _RankedBins:
+    # Значение по рангу для гистограммы из корзин: ранги внутри корзины
+    # раскладываются по ней равномерно
+
+    def __init__(self, counts: np.ndarray, offsets: np.ndarray, bin_width: int):
+        self.counts = counts
+        self.offsets = offsets
+        self.bin_width = bin_width
+
+    def __getitem__(self, ranks):
+        ranks = np.asarray(ranks, dtype=np.int64)
+        last = len(self.counts) - 1
+        index = np.minimum(np.searchsorted(self.offsets, ranks, side='right') - 1, last)
+        inside = (ranks - self.offsets[index] + 0.5) / np.maximum(self.counts[index], 1)
+        values = (index + inside) * self.bin_width
+        # Всё, что выше предела, считается равным пределу
+        return np.where(index == last, last * self.bin_width, values)
+
+
+class BinnedSalaryHistogram(SalaryHistogram):
+    # Потоковый вариант: вместо массива зарплат — счётчики по корзинам
+    # фиксированной ширины, память не зависит от размера выгрузки.
+    # Доли по границам, кратным ширине корзины, точные; перцентили
+    # интерполируются внутри корзины и ошибаются не больше её ширины.
+
+    def __init__(self, counts: np.ndarray, bin_width: int = SALARY_BIN_WIDTH):
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.bin_width = bin_width
+        self._offsets = np.concatenate(([0], np.cumsum(self.counts)))
+        self.total = int(self._offsets[-1])
+        self._cumulative = {}
+
+    @classmethod
+    def from_chunks(cls, chunks, bin_width: int = SALARY_BIN_WIDTH, limit: int = SALARY_BIN_LIMIT):
+        # От каждого куска остаются только приращения счётчиков
+        bin_count = math.ceil(limit / bin_width)
+        counts = np.zeros(bin_count + 1, dtype=np.int64)
+        for chunk in chunks:
+            chunk = np.asarray(chunk, dtype=np.float64)
+            chunk = chunk[~np.isnan(chunk)]
+            index = np.clip(chunk // bin_width, 0, bin_count).astype(np.int64)
+            counts += np.bincount(index, minlength=bin_count + 1)
+        return cls(counts, bin_width)
+
+    def positions(self, edges: np.ndarray) -> np.ndarray:
+        # Граница, кратная ширине, совпадает с началом корзины; иначе
+        # доля корзины берётся пропорционально
+        scaled = np.clip(np.asarray(edges, dtype=np.float64) / self.bin_width, 0, len(self.counts) - 1)
+        index = np.floor(scaled).astype(np.int64)
+        inside = np.rint((scaled - index) * self.counts[index]).astype(np.int64)
+        return self._offsets[index] + inside
+
+    def ranked(self):
+        return _RankedBins(self.counts, self._offsets, self.bin_width)
+
+    def range_values(self, min_salary: float, max_salary: float) -> np.ndarray:
+        # Значений нет, восстанавливаются приближённые — по рангам
+        start, stop = self.positions([min_salary, max_salary])
+        return self.ranked()[np.arange(start, stop)]
+
+
+def json_default(value):
+    # Для json.dumps(default=...): массивы и скаляры numpy из результатов
+    # гистограмм превращаются в обычные списки и числа
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Не сериализуется в JSON: {type(value)}")
+
+
+def parse_range_label(label: str) -> tuple:
+    min_salary, max_salary = str(label).split('-')
+    return float(min_salary), float(max_salary)
+
+
+def merge_intervals(intervals) -> list:
+    merged = []
+    for low, high in sorted(intervals):
+        if merged and low <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], high)
+        else:
+            merged.append([low, high])
+    return merged
+
+
+def grades_from_percentiles(percentiles: Dict[str, Optional[np.ndarray]]) -> Dict:
+    result = {}
+    for level, values in percentiles.items():
+        if values is None:
+            result[level] = {'grade1': 0, 'grade2': 0, 'grade3': 0}
+        else:
+            result[level] = {'grade1': float(values[0]), 'grade2': float(values[1]), 'grade3': float(values[2])}
+    return result
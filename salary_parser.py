@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+# Курсы валют (примерные на март 2025, уточни актуальные)
+USD_TO_RUB = 90  # 1 USD = 90 RUB
+KZT_TO_RUB = 0.2  # 1 KZT = 0.2 RUB
+EUR_TO_RUB = 98  # 1 EUR = 98 RUB
+
+# НДФЛ для пересчёта "до вычета налогов" в "на руки"
+INCOME_TAX = 0.13
+BEFORE_TAX_MARKER = 'до вычета налогов'
+
+# Пробелы, которыми hh.ru разделяет разряды
+_SPACES_PATTERN = r'[ \u00a0\u202f]'
+_CURRENCY_RATES = {'RUB': 1.0, 'USD': USD_TO_RUB, 'KZT': KZT_TO_RUB, 'EUR': EUR_TO_RUB}
+
+
+# Функция для конвертации ЗП
+def convert_salary(salary_str, is_before_tax=False):
+    salary_str = str(salary_str).replace(' ', '').replace(' ', '')  # Убираем пробелы
+    value = salary_str.lower()
+    
+    # Извлекаем числа
+    if '–' in value:
+        min_val, max_val = value.split('–')
+        min_val = float(''.join(filter(str.isdigit, min_val)))
+        max_val = float(''.join(filter(str.isdigit, max_val)))
+        avg = (min_val + max_val) / 2
+    elif 'от' in value:
+        avg = float(''.join(filter(str.isdigit, value.replace('от', ''))))
+    elif 'до' in value:
+        avg = float(''.join(filter(str.isdigit, value.replace('до', ''))))
+    else:
+        avg = float(''.join(filter(str.isdigit, value)))
+    
+    # Конвертация валют
+    if '$' in value:
+        avg *= USD_TO_RUB
+    elif '₸' in value:
+        avg *= KZT_TO_RUB
+    elif '€' in value:
+        avg *= EUR_TO_RUB
+    
+    # Пересчёт "до налогов" в "на руки" (13% НДФЛ)
+    if is_before_tax:
+        avg *= (1 - 0.13)
+    
+    return avg
+
+
+def _digits(values: pd.Series) -> pd.Series:
+    values = values.fillna('').astype(object)
+    return pd.to_numeric(values.str.replace(r'\D', '', regex=True), errors='coerce')
+
+
+# Векторная конвертация целой колонки строк с ЗП.
+# Возвращает min/max/среднее в рублях, валюту и признак "до вычета налогов".
+# Строки с ЗП сильно повторяются, поэтому разбираются только уникальные
+# значения, а результат раскладывается обратно по кодам factorize.
+# Строки без чисел дают NaN вместо исключения.
+def convert_salary_column(salaries: pd.Series, apply_tax: bool = True) -> pd.DataFrame:
+    codes, uniques = pd.factorize(salaries.astype(str))
+    raw = pd.Series(uniques, dtype=object)
+    value = raw.str.replace(_SPACES_PATTERN, '', regex=True).str.lower()
+
+    is_range = value.str.contains('–', regex=False).to_numpy()
+    is_from = ~is_range & value.str.startswith('от').to_numpy()
+    is_to = ~is_range & ~is_from & value.str.startswith('до').to_numpy()
+
+    parts = value.str.split('–', n=1, expand=True).reindex(columns=[0, 1])
+    left = _digits(parts[0]).to_numpy(dtype=np.float64)
+    right = _digits(parts[1]).to_numpy(dtype=np.float64)
+    single = _digits(value).to_numpy(dtype=np.float64)
+
+    salary_min = np.where(is_range, left, np.where(is_to, np.nan, single))
+    salary_max = np.where(is_range, right, np.where(is_from, np.nan, single))
+    salary_avg = np.where(is_range, (left + right) / 2, single)
+
+    # Коды валют соответствуют порядку _CURRENCY_RATES: RUB, USD, KZT, EUR
+    currency_codes = np.select(
+        [value.str.contains(symbol, regex=False).to_numpy() for symbol in ('$', '₸', '€')],
+        [1, 2, 3],
+        default=0
+    )
+    multiplier = np.array(list(_CURRENCY_RATES.values()))[currency_codes]
+
+    is_before_tax = raw.str.contains(BEFORE_TAX_MARKER, case=False, regex=False).to_numpy(dtype=bool)
+    if apply_tax:
+        multiplier = np.where(is_before_tax, multiplier * (1 - INCOME_TAX), multiplier)
+
+    return pd.DataFrame({
+        'salary_min': (salary_min * multiplier)[codes],
+        'salary_max': (salary_max * multiplier)[codes],
+        'salary_rub': (salary_avg * multiplier)[codes],
+        'currency': pd.Categorical.from_codes(currency_codes[codes], categories=list(_CURRENCY_RATES)),
+        'is_before_tax': is_before_tax[codes],
+    }, index=salaries.index)
@@ -0,0 +1,296 @@
+import argparse
+import json
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from quantile_sketch import DEFAULT_K, KLLSketch
+from salary_histogram import DEFAULT_MAX_SALARY, DEFAULT_PERCENTILES, sorted_percentiles
+from salary_parser import USD_TO_RUB, KZT_TO_RUB, EUR_TO_RUB
+from storage import connect, migrate
+
+# Базовый шаг гистограммы в salary_stats. Более крупные шаги (10000, 20000, 50000)
+# получаются суммированием соседних корзин, поэтому базовые корзины идут
+# с запасом на самый крупный шаг за пределами DEFAULT_MAX_SALARY.
+STATS_BIN_STEP = 5000
+STATS_MAX_SALARY = DEFAULT_MAX_SALARY + 50000
+
+# Курсы для валют в том виде, в каком их сохраняет storage.process_salary
+RUB_RATES = {
+    '₽': 1.0, 'RUR': 1.0,
+    '$': USD_TO_RUB, 'USD': USD_TO_RUB,
+    '€': EUR_TO_RUB, 'EUR': EUR_TO_RUB,
+    'KZT': KZT_TO_RUB,
+}
+
+# Таблицы с исходными данными и колонка валюты в каждой из них
+SOURCES = {
+    'vacancies': 'currency',
+    'resumes': 'salary_currency',
+}
+
+PERCENTILE_COLUMNS = tuple(f"p{q}" for q in DEFAULT_PERCENTILES)
+
+
+def normalized_salaries(salary_from, salary_to, currency) -> np.ndarray:
+    # Середина вилки (или единственная граница) в рублях.
+    # Для валют без известного курса получается NaN.
+    low = pd.to_numeric(pd.Series(salary_from, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+    high = pd.to_numeric(pd.Series(salary_to, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+    middle = np.where(np.isnan(low), high, np.where(np.isnan(high), low, (low + high) / 2))
+
+    codes, uniques = pd.factorize(pd.Series(currency, dtype=object))
+    rates = np.array([RUB_RATES.get(code, np.nan) for code in uniques] + [np.nan], dtype=np.float64)
+    # factorize даёт -1 для пустых значений, это последний элемент rates
+    return middle * rates[codes]
+
+
+def load_normalized(conn: sqlite3.Connection, kind: str, role_ids: Optional[Iterable[str]] = None,
+                    months: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    conditions, params = [], []
+    if role_ids is not None:
+        role_ids = list(role_ids)
+        conditions.append(f"role_id IN ({', '.join('?' for _ in role_ids)})")
+        params.extend(role_ids)
+    if months is not None:
+        months = list(months)
+        conditions.append(f"parsed_month IN ({', '.join('?' for _ in months)})")
+        params.extend(months)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    rows = conn.execute(
+        f"SELECT role_id, parsed_month, salary_from, salary_to, {SOURCES[kind]} FROM {kind}{where}",
+        params
+    ).fetchall()
+    columns = list(zip(*rows)) if rows else [[], [], [], [], []]
+    # role_id и parsed_month сильно повторяются: category хранит коды вместо строк
+    return pd.DataFrame({
+        'role_id': pd.Categorical(columns[0]),
+        'parsed_month': pd.Categorical(columns[1]),
+        'salary_rub': normalized_salaries(columns[2], columns[3], columns[4]),
+    })
+
+
+def compute_salary_stats(frame: pd.DataFrame, sketch_k: int = DEFAULT_K) -> List[Dict]:
+    # Статистика по всем группам (role_id, parsed_month) за один проход:
+    # сортировка по группе и зарплате, затем перцентили по срезам
+    frame = frame[frame['salary_rub'].notna() & frame['role_id'].notna() & frame['parsed_month'].notna()]
+    if frame.empty:
+        return []
+
+    codes, groups = pd.factorize(pd.MultiIndex.from_arrays([frame['role_id'], frame['parsed_month']]))
+    salaries = frame['salary_rub'].to_numpy(dtype=np.float64)
+    order = np.lexsort((salaries, codes))
+    sorted_codes = codes[order]
+    sorted_salaries = salaries[order]
+
+    group_ids = np.arange(len(groups))
+    starts = np.searchsorted(sorted_codes, group_ids, side='left')
+    stops = np.searchsorted(sorted_codes, group_ids, side='right')
+    counts = stops - starts
+    means = np.bincount(codes, weights=salaries, minlength=len(groups)) / counts
+    percentiles = sorted_percentiles(sorted_salaries, starts, stops, DEFAULT_PERCENTILES)
+
+    bin_count = len(range(0, STATS_MAX_SALARY + STATS_BIN_STEP, STATS_BIN_STEP))
+    bin_index = np.floor(salaries / STATS_BIN_STEP).astype(np.int64)
+    in_range = (bin_index >= 0) & (bin_index < bin_count)
+    bins = np.bincount(
+        codes[in_range] * bin_count + bin_index[in_range],
+        minlength=len(groups) * bin_count
+    ).reshape(len(groups), bin_count)
+
+    result = []
+    for i, (role_id, parsed_month) in enumerate(groups):
+        row = {
+            'role_id': role_id,
+            'parsed_month': parsed_month,
+            'count': int(counts[i]),
+            'mean': float(means[i]),
+            'bin_step': STATS_BIN_STEP,
+            'bins': bins[i].tolist(),
+            'sketch': KLLSketch.from_values(sorted_salaries[starts[i]:stops[i]], sketch_k),
+        }
+        row.update(zip(PERCENTILE_COLUMNS, percentiles[i].tolist()))
+        result.append(row)
+    return result
+
+
+def refresh_salary_stats(conn: sqlite3.Connection, pairs: Optional[Iterable[tuple]] = None,
+                         sketch_k: int = DEFAULT_K):
+    # pairs — набор (role_id, parsed_month), которые нужно пересчитать.
+    # Без pairs таблица пересчитывается целиком. sketch_k — точность
+    # скетчей: ошибка ранга обратно пропорциональна k.
+    pairs = None if pairs is None else set(pairs)
+    if pairs is not None and not pairs:
+        return
+    refreshed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    columns = ('kind', 'role_id', 'parsed_month', 'count', 'mean') + PERCENTILE_COLUMNS + (
+        'bin_step', 'bins', 'refreshed_at')
+    insert_sql = (
+        f"INSERT OR REPLACE INTO salary_stats ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)})"
+    )
+    sketch_sql = (
+        'INSERT OR REPLACE INTO salary_sketches (kind, role_id, parsed_month, k, count, sketch, refreshed_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)'
+    )
+
+    with conn:
+        for kind in SOURCES:
+            if pairs is None:
+                conn.execute('DELETE FROM salary_stats WHERE kind = ?', (kind,))
+                conn.execute('DELETE FROM salary_sketches WHERE kind = ?', (kind,))
+                frame = load_normalized(conn, kind)
+            else:
+                frame = load_normalized(
+                    conn, kind,
+                    role_ids={role_id for role_id, _ in pairs},
+                    months={month for _, month in pairs}
+                )
+                keys = pd.MultiIndex.from_arrays([frame['role_id'], frame['parsed_month']])
+                frame = frame[keys.isin(list(pairs))]
+                for table in ('salary_stats', 'salary_sketches'):
+                    conn.executemany(
+                        f'DELETE FROM {table} WHERE kind = ? AND role_id = ? AND parsed_month = ?',
+                        [(kind, role_id, month) for role_id, month in pairs]
+                    )
+
+            stats = compute_salary_stats(frame, sketch_k)
+            conn.executemany(insert_sql, [
+                (kind, row['role_id'], row['parsed_month'], row['count'], row['mean'])
+                + tuple(row[column] for column in PERCENTILE_COLUMNS)
+                + (row['bin_step'], json.dumps(row['bins']), refreshed_at)
+                for row in stats
+            ])
+            conn.executemany(sketch_sql, [
+                (kind, row['role_id'], row['parsed_month'], row['sketch'].k, row['count'],
+                 row['sketch'].to_bytes(), refreshed_at)
+                for row in stats
+            ])
+
+
+def load_salary_stats(conn: sqlite3.Connection, kind: str, role_id: str,
+                      months: Optional[Iterable[str]] = None) -> List[Dict]:
+    sql = 'SELECT * FROM salary_stats WHERE kind = ? AND role_id = ?'
+    params = [kind, str(role_id)]
+    if months is not None:
+        months = list(months)
+        sql += f" AND parsed_month IN ({', '.join('?' for _ in months)})"
+        params.extend(months)
+    cursor = conn.execute(sql + ' ORDER BY parsed_month', params)
+    names = [description[0] for description in cursor.description]
+    result = []
+    for values in cursor.fetchall():
+        row = dict(zip(names, values))
+        row['bins'] = json.loads(row['bins'])
+        result.append(row)
+    return result
+
+
+def load_sketch(conn: sqlite3.Connection, kind: str, role_ids: Iterable[str],
+                start_month: Optional[str] = None, end_month: Optional[str] = None) -> KLLSketch:
+    # Сливает помесячные скетчи ролей за период [start_month, end_month]
+    role_ids = [str(role_id) for role_id in role_ids]
+    sql = (
+        f"SELECT sketch FROM salary_sketches WHERE kind = ? "
+        f"AND role_id IN ({', '.join('?' for _ in role_ids)})"
+    )
+    params = [kind] + role_ids
+    if start_month:
+        sql += ' AND parsed_month >= ?'
+        params.append(start_month)
+    if end_month:
+        sql += ' AND parsed_month <= ?'
+        params.append(end_month)
+
+    merged = None
+    for (blob,) in conn.execute(sql, params):
+        sketch = KLLSketch.from_bytes(blob)
+        merged = sketch if merged is None else merged.merge(sketch)
+    return merged if merged is not None else KLLSketch()
+
+
+def category_role_ids(roles_data: Dict, category_id: str) -> List[str]:
+    # Роли группы из roles.json (categories[].roles[])
+    for category in roles_data.get('categories', []):
+        if str(category.get('id')) == str(category_id):
+            return [role['id'] for role in category.get('roles', [])]
+    return []
+
+
+def rebin(bins: List[int], step: int, bin_step: int = STATS_BIN_STEP,
+          max_salary: int = DEFAULT_MAX_SALARY) -> np.ndarray:
+    # Сводит базовые корзины к диапазонам generate_ranges(step, max_salary).
+    # Шаг должен быть кратен базовому.
+    if step % bin_step:
+        raise ValueError(f"Шаг {step} не кратен базовому шагу {bin_step}")
+    ratio = step // bin_step
+    range_count = len(range(0, max_salary + step, step))
+    padded = np.zeros(range_count * ratio, dtype=np.int64)
+    bins = np.asarray(bins, dtype=np.int64)[:len(padded)]
+    padded[:len(bins)] = bins
+    return padded.reshape(range_count, ratio).sum(axis=1)
+
+
+def stats_metrics(conn: sqlite3.Connection, role_id: str, step: int, start_month: Optional[str] = None,
+                  end_month: Optional[str] = None,
+                  percentiles: Optional[Iterable[float]] = DEFAULT_PERCENTILES) -> Optional[Dict]:
+    # То же, что main.calculate_metrics, но по предрасчитанным строкам, без
+    # чтения записей: доли диапазонов — сумма помесячных корзин, сведённых
+    # к шагу (точно), перцентили внутри диапазона — из слитого скетча
+    # вакансий (с ошибкой ранга rank_error_bound). Для шага, не кратного
+    # STATS_BIN_STEP, и без строк статистики возвращается None.
+    if step <= 0 or step % STATS_BIN_STEP:
+        return None
+    percentiles = None if percentiles is None else list(percentiles)
+    starts = range(0, DEFAULT_MAX_SALARY + step, step)
+    counts, fractions, stats_rows = {}, {}, 0
+    for kind in ('resumes', 'vacancies'):
+        rows = [
+            row for row in load_salary_stats(conn, kind, role_id)
+            if (not start_month or row['parsed_month'] >= start_month)
+            and (not end_month or row['parsed_month'] <= end_month)
+        ]
+        counts[kind] = np.zeros(len(starts), dtype=np.int64)
+        for row in rows:
+            counts[kind] += rebin(row['bins'], step, row['bin_step'])
+        total = sum(row['count'] for row in rows)
+        stats_rows += len(rows)
+        fractions[kind] = counts[kind] / total if total else np.zeros(len(starts))
+    if not stats_rows:
+        # Статистика ещё не пересчитана (база обновлена миграцией) или
+        # данных за период нет — решает вызывающий, читая строки
+        return None
+
+    sketch = None if percentiles is None else load_sketch(conn, 'vacancies', [role_id], start_month, end_month)
+    result = {}
+    for i, start in enumerate(starts):
+        value = {
+            'resume_fraction': float(fractions['resumes'][i]),
+            'vacancy_fraction': float(fractions['vacancies'][i]),
+        }
+        if sketch is not None:
+            found = sketch.range_percentiles(start, start + step, percentiles) if counts['vacancies'][i] else None
+            value['percentiles'] = found if found is not None else np.zeros(len(percentiles))
+        result[f"{start}-{start + step}"] = value
+    return result
+
+
+def main():
+    # Полный пересчёт salary_stats по всей базе
+    parser = argparse.ArgumentParser(description="Пересчёт salary_stats и скетчей по всей базе")
+    parser.add_argument('--sketch-k', type=int, default=DEFAULT_K, help="Параметр k скетчей перцентилей")
+    args = parser.parse_args()
+
+    conn = connect()
+    migrate(conn)
+    refresh_salary_stats(conn, sketch_k=args.sketch_k)
+    total = conn.execute('SELECT COUNT(*) FROM salary_stats').fetchone()[0]
+    conn.close()
+    print(f"Пересчитано строк статистики: {total}")
+
+if __name__ == "__main__":
+    main()
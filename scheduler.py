@@ -3,8 +3,15 @@ import time
 import logging
 from datetime import datetime, timedelta
 import json
-from parse_vacancies_resumes import HHAPIParser, init_db, save_vacancies_to_db, save_resumes_to_db
+import math
+import os
+import sqlite3
+from parse_vacancies_resumes import HHAPIParser, init_db, crawl_role, load_known_resume_ids, finish_ingest
 import random
+from dedup_index import DedupIndex, dedup_path
+from metrics import registry as metrics
+from quantile_sketch import DEFAULT_K
+from storage import DB_PATH, DBWriter, connect
 
 # Настройка логирования
 logging.basicConfig(
@@ -16,16 +23,20 @@ logging.basicConfig(
     ]
 )
 
+STATE_FILE = 'scheduler_state.json'
+METRICS_FILE = 'metrics.prom'
+
+
 class ParserScheduler:
-    def __init__(self):
+    def __init__(self, state_path: str = STATE_FILE):
         self.parser = HHAPIParser()
         self.last_run = None
         self.roles_data = self._load_roles()
-        self.daily_requests = 0
         self.max_daily_requests = 2000  # Максимальное количество запросов в сутки
-        self.requests_reset_time = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        self.roles_per_day = 4  # Количество ролей для парсинга в день
-        self.current_role_index = self._load_last_role_index()
+        self.max_items = 100  # Сколько вакансий и резюме собирать на роль
+        self.sketch_k = DEFAULT_K  # Точность скетчей перцентилей в salary_sketches
+        self.state_path = state_path
+        self.state = self._load_state()
 
     def _load_roles(self):
         try:
@@ -35,54 +46,125 @@ class ParserScheduler:
             logging.error(f"Ошибка при загрузке файла ролей: {e}")
             return {"categories": []}
 
-    def _load_last_role_index(self):
+    def _load_state(self):
+        # Состояние между запусками: расход запросов за текущие сутки и по
+        # каждой роли — когда собиралась, сколько стоила и сколько найдено
         try:
-            with open('last_role_index.txt', 'r') as f:
-                return int(f.read().strip())
-        except:
-            return 0
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault('day', datetime.now().strftime('%Y-%m-%d'))
+        state.setdefault('daily_requests', 0)
+        state.setdefault('roles', {})
+        return state
 
-    def _save_last_role_index(self, index):
+    def _save_state(self):
         try:
-            with open('last_role_index.txt', 'w') as f:
-                f.write(str(index))
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.state_path)
         except Exception as e:
-            logging.error(f"Ошибка при сохранении индекса роли: {e}")
+            logging.error(f"Ошибка при сохранении состояния планировщика: {e}")
+
+    @property
+    def daily_requests(self):
+        return self.state['daily_requests']
 
     def _should_reset_daily_requests(self):
-        now = datetime.now()
-        if now >= self.requests_reset_time + timedelta(days=1):
-            self.daily_requests = 0
-            self.requests_reset_time = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        today = datetime.now().strftime('%Y-%m-%d')
+        if self.state['day'] != today:
+            self.state['day'] = today
+            self.state['daily_requests'] = 0
+            self._save_state()
             logging.info("Счетчик ежедневных запросов сброшен")
 
-    def _can_make_request(self):
+    def remaining_requests(self):
         self._should_reset_daily_requests()
-        return self.daily_requests < self.max_daily_requests
+        return max(0, self.max_daily_requests - self.state['daily_requests'])
 
-    def _get_roles_for_today(self):
-        # Собираем все ID ролей
-        all_role_ids = []
-        for category in self.roles_data.get('categories', []):
-            for role in category.get('roles', []):
-                all_role_ids.append(role['id'])
+    def _can_make_request(self):
+        return self.remaining_requests() > 0
 
-        # Если достигли конца списка, начинаем сначала
-        if self.current_role_index >= len(all_role_ids):
-            self.current_role_index = 0
+    def _all_role_ids(self):
+        return [
+            role['id']
+            for category in self.roles_data.get('categories', [])
+            for role in category.get('roles', [])
+        ]
 
-        # Получаем роли для сегодняшнего парсинга
-        today_roles = []
-        for i in range(self.roles_per_day):
-            if self.current_role_index + i < len(all_role_ids):
-                today_roles.append(all_role_ids[self.current_role_index + i])
+    def _last_parsed_from_db(self):
+        # Когда роль последний раз попадала в базу (по обеим таблицам)
+        conn = connect()
+        try:
+            rows = conn.execute(
+                'SELECT role_id, MAX(parsed_date) FROM ('
+                'SELECT role_id, parsed_date FROM vacancies UNION ALL SELECT role_id, parsed_date FROM resumes'
+                ') GROUP BY role_id'
+            ).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        finally:
+            conn.close()
+        return {role_id: last for role_id, last in rows if role_id and last}
 
-        # Обновляем индекс для следующего дня
-        self.current_role_index = (self.current_role_index + self.roles_per_day) % len(all_role_ids)
-        self._save_last_role_index(self.current_role_index)
+    def _role_priority(self, role_id, last_parsed, now):
+        # Чем дольше роль не обновлялась и чем больше по ней публикаций,
+        # тем раньше её нужно собрать. Никогда не собранные — первыми.
+        info = self.state['roles'].get(role_id, {})
+        last = info.get('last_parsed') or last_parsed.get(role_id)
+        # Недособранная роль тоже идёт первой: её контрольная точка живёт сутки
+        if last is None or info.get('unfinished'):
+            return float('inf')
+        staleness_days = (now - datetime.strptime(last[:19], '%Y-%m-%d %H:%M:%S')).total_seconds() / 86400
+        found = info.get('found', 0)
+        # Роль, сбор которой подряд падает, откладывается всё дальше и не
+        # съедает квоту каждого запуска
+        return staleness_days * (1 + math.log10(1 + found)) / 2 ** min(info.get('failures', 0), 10)
 
+    def _role_cost(self, role_id):
+        # Пока роль ни разу не собиралась, оцениваем по худшему случаю:
+        # страницы вакансий и резюме плюс детали каждого резюме
+        default_cost = 2 * math.ceil(self.max_items / 20) + self.max_items
+        return self.state['roles'].get(role_id, {}).get('cost', default_cost)
+
+    def _get_roles_for_today(self):
+        # Роли по убыванию приоритета, жадно укладываем в остаток квоты
+        now = datetime.now()
+        last_parsed = self._last_parsed_from_db()
+        ranked = sorted(self._all_role_ids(), key=lambda role_id: -self._role_priority(role_id, last_parsed, now))
+
+        remaining = self.remaining_requests()
+        today_roles = []
+        for role_id in ranked:
+            cost = self._role_cost(role_id)
+            if cost <= remaining:
+                today_roles.append(role_id)
+                remaining -= cost
+            if remaining <= 0:
+                break
         return today_roles
 
+    def _record_role(self, role_id, requests_used, failed=False, finished=True):
+        # last_parsed — время последней попытки, в том числе неудачной.
+        # Сбор, остановленный квотой, не сдвигает last_parsed: роль остаётся
+        # наверху очереди и продолжается с контрольной точки, пока та свежая
+        info = self.state['roles'].setdefault(role_id, {})
+        info['unfinished'] = not failed and not finished
+        if failed or finished:
+            info['last_parsed'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        info['failures'] = info.get('failures', 0) + 1 if failed else 0
+        if failed or not finished:
+            # Оборванный сбор ничего не говорит о стоимости роли
+            return
+        # Стоимость сглаживается: число новых резюме меняется от запуска к запуску
+        previous = info.get('cost')
+        info['cost'] = requests_used if previous is None else round(0.5 * previous + 0.5 * requests_used, 1)
+        found = sum(self.parser.found_counts.get((kind, role_id), 0) for kind in ('vacancies', 'resumes'))
+        if found:
+            info['found'] = found
+
     def parse_data(self):
         if not self._can_make_request():
             logging.warning("Достигнут лимит ежедневных запросов. Парсинг отложен до следующего дня.")
@@ -90,44 +172,73 @@ class ParserScheduler:
 
         logging.info("Начало парсинга данных")
         self.last_run = datetime.now()
+        metrics.reset()
 
-        # Инициализируем базу данных
+        # Доводим схему базы до актуальной версии, собранные ранее данные сохраняются
         init_db()
 
-        # Получаем роли для сегодняшнего парсинга
+        # Роли, которые помещаются в оставшуюся квоту
         today_roles = self._get_roles_for_today()
         logging.info(f"Сегодня будут обработаны роли: {today_roles}")
 
+        # Одно соединение с базой на весь прогон; индекс дублей общий
+        # у парсера (детали резюме) и writer (строки без изменений)
+        dedup = DedupIndex(dedup_path(DB_PATH))
+        self.parser.dedup = dedup
+        writer = DBWriter(dedup=dedup)
+
+        # Свежие резюме из базы повторно не скачиваем; с индексом дублей
+        # это решает он, и набор остаётся пустым
+        known_resume_ids = load_known_resume_ids(dedup=dedup)
+
+        # Парсер сам не даст выйти за квоту: считается каждый HTTP-запрос
+        self.parser.request_count = 0
+        self.parser.request_budget = self.remaining_requests()
+        # Парсер живёт между запусками, а набор скачанных резюме — только на запуск
+        self.parser.seen_resume_ids = set()
+        start_requests = self.state['daily_requests']
+
         # Парсим данные для каждой роли
         for role_id in today_roles:
-            if not self._can_make_request():
+            if self.parser.request_count >= self.parser.request_budget:
                 logging.warning(f"Достигнут лимит запросов. Остановка парсинга на роли {role_id}")
                 break
 
             logging.info(f"Парсинг данных для роли {role_id}")
+            before = self.parser.request_count
             try:
                 # Парсим вакансии
                 logging.info("Сбор вакансий...")
-                vacancies = self.parser.parse_vacancies_by_role(role_id, max_items=100)
-                if vacancies:
-                    save_vacancies_to_db(vacancies, role_id)
-                    self.daily_requests += 1
+                _, vacancies_done = crawl_role(self.parser, writer, role_id, 'vacancies', max_items=self.max_items)
                 
                 time.sleep(random.uniform(2, 4))
                 
                 # Парсим резюме
                 logging.info("Сбор резюме...")
-                resumes = self.parser.parse_resumes_by_role(role_id, max_items=100)
-                if resumes:
-                    save_resumes_to_db(resumes, role_id)
-                    self.daily_requests += 1
+                _, resumes_done = crawl_role(self.parser, writer, role_id, 'resumes', max_items=self.max_items,
+                                             known_ids=known_resume_ids)
                 
                 time.sleep(random.uniform(2, 4))
             except Exception as e:
                 logging.error(f"Ошибка при парсинге роли {role_id}: {e}")
+                self._record_role(role_id, self.parser.request_count - before, failed=True)
                 continue
+            finally:
+                # Состояние сохраняется после каждой роли, чтобы сбой не терял учёт квоты
+                self.state['daily_requests'] = start_requests + self.parser.request_count
+                self._save_state()
+
+            self._record_role(role_id, self.parser.request_count - before,
+                              finished=vacancies_done and resumes_done)
+            self._save_state()
 
+        finish_ingest(writer, self.sketch_k)
         logging.info(f"Парсинг завершен. Всего запросов сегодня: {self.daily_requests}")
+        logging.info(f"Итоги прогона:\n{metrics.summary()}")
+        try:
+            metrics.write(METRICS_FILE)
+        except Exception as e:
+            logging.error(f"Ошибка при сохранении метрик: {e}")
 
 def main():
     scheduler = ParserScheduler()
@@ -0,0 +1,180 @@
+import re
+import sqlite3
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+_NON_WORD_PATTERN = re.compile(r'[^\w]+')
+
+# Названия ролей из roles.json всегда выше свободных заголовков из базы
+ROLE_WEIGHT = 1_000_000
+# Минимальная доля общих триграмм, при которой вариант считается опечаткой
+FUZZY_THRESHOLD = 0.3
+
+
+def normalize(text: str) -> str:
+    # casefold одинаково работает для кириллицы и латиницы; ё сводим к е,
+    # пунктуацию к пробелам: "C++/Java-разработчик" -> "c java разработчик"
+    text = text.casefold().replace('ё', 'е')
+    return ' '.join(_NON_WORD_PATTERN.sub(' ', text).replace('_', ' ').split())
+
+
+def trigrams(normalized: str) -> set:
+    # Триграммы по словам с отбивкой пробелами, чтобы начало слова весило больше
+    result = set()
+    for token in normalized.split():
+        padded = f"  {token} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class SearchIndex:
+    # Индекс для автодополнения должностей. Строится один раз и дальше
+    # только читается, поэтому вместо узлового префиксного дерева слова
+    # лежат в отсортированном массиве: префикс — это непрерывный отрезок,
+    # который находится двумя bisect. Для опечаток есть инвертированный
+    # индекс по триграммам. Номера записей упорядочены по весу, так что
+    # меньший номер — более популярное название. roles сопоставляет
+    # нормализованному названию id роли: по нему API принимает любую
+    # подсказку, в том числе заголовок из базы.
+
+    def __init__(self, weighted_names: Dict[str, int], roles: Optional[Dict[str, str]] = None):
+        self.roles = roles or {}
+        entries = {}
+        for name, weight in weighted_names.items():
+            key = normalize(name)
+            if not key:
+                continue
+            # Одинаковые после нормализации названия схлопываются,
+            # показывается самый весомый вариант написания
+            if key in entries:
+                display, total, best = entries[key]
+                if weight > best:
+                    display, best = name.strip(), weight
+                entries[key] = (display, total + weight, best)
+            else:
+                entries[key] = (name.strip(), weight, weight)
+
+        ordered = sorted(entries.items(), key=lambda item: (-item[1][1], item[0]))
+        self.names = [display for _, (display, _, _) in ordered]
+        self.keys = [key for key, _ in ordered]
+        # Записи с весом роли идут первыми, их число задаёт границу группы
+        self._pinned = sum(1 for _, (_, total, _) in ordered if total >= ROLE_WEIGHT)
+
+        postings = sorted(
+            (token, entry_id, position)
+            for entry_id, key in enumerate(self.keys)
+            for position, token in enumerate(key.split())
+        )
+        self._tokens = [token for token, _, _ in postings]
+        self._token_entries = np.fromiter((entry_id for _, entry_id, _ in postings), dtype=np.int32,
+                                          count=len(postings))
+        self._token_first = np.fromiter((position == 0 for _, _, position in postings), dtype=bool,
+                                        count=len(postings))
+
+        trigram_postings = defaultdict(list)
+        trigram_counts = np.zeros(len(self.keys), dtype=np.int32)
+        for entry_id, key in enumerate(self.keys):
+            grams = trigrams(key)
+            trigram_counts[entry_id] = len(grams)
+            for gram in grams:
+                trigram_postings[gram].append(entry_id)
+        self._trigrams = {gram: np.array(ids, dtype=np.int32) for gram, ids in trigram_postings.items()}
+        self._trigram_counts = trigram_counts
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def role_id(self, name: str) -> Optional[str]:
+        return self.roles.get(normalize(name))
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        low = bisect_left(self._tokens, prefix)
+        high = bisect_left(self._tokens, prefix + '\uffff', lo=low)
+        return low, high
+
+    def prefix_matches(self, query: str) -> np.ndarray:
+        # Все слова запроса должны быть префиксами слов названия.
+        # Маски вместо np.unique: короткий префикс вроде "р" покрывает
+        # большую часть индекса, и сортировать такие отрезки дорого.
+        tokens = normalize(query).split()
+        if not tokens:
+            return np.empty(0, dtype=np.int32)
+
+        matched = leading = None
+        for i, token in enumerate(tokens):
+            low, high = self._prefix_range(token)
+            ids = self._token_entries[low:high]
+            mask = np.zeros(len(self.keys), dtype=bool)
+            mask[ids] = True
+            if i == 0:
+                leading = np.zeros(len(self.keys), dtype=bool)
+                leading[ids[self._token_first[low:high]]] = True
+            matched = mask if matched is None else matched & mask
+
+        # Порядок: роли, начинающиеся с запроса, остальные роли, затем так же
+        # для заголовков из базы; внутри группы — по популярности
+        leading &= matched
+        pinned = np.arange(len(self.keys)) < self._pinned
+        return np.concatenate([
+            np.flatnonzero(leading & pinned),
+            np.flatnonzero(matched & ~leading & pinned),
+            np.flatnonzero(leading & ~pinned),
+            np.flatnonzero(matched & ~leading & ~pinned),
+        ])
+
+    def fuzzy_matches(self, query: str, limit: int, exclude: Iterable[int] = ()) -> np.ndarray:
+        query_grams = trigrams(normalize(query))
+        grams = [self._trigrams[gram] for gram in query_grams if gram in self._trigrams]
+        if not grams:
+            return np.empty(0, dtype=np.int32)
+        query_count = len(query_grams)
+        shared = np.bincount(np.concatenate(grams), minlength=len(self.keys))
+        # Коэффициент Жаккара по множествам триграмм
+        scores = shared / (query_count + self._trigram_counts - shared)
+        scores[np.fromiter(exclude, dtype=np.int64)] = 0
+        candidates = np.flatnonzero(scores >= FUZZY_THRESHOLD)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        # Сортировка по убыванию сходства, при равенстве — по популярности
+        return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+    def search(self, query: str, limit: int = 10) -> List[str]:
+        if limit <= 0:
+            return []
+        found = self.prefix_matches(query)[:limit]
+        if len(found) < limit:
+            found = np.concatenate([found, self.fuzzy_matches(query, limit - len(found), exclude=found)])
+        return [self.names[entry_id] for entry_id in found]
+
+
+def load_search_names(roles_data: Dict, conn: sqlite3.Connection = None) -> Tuple[Dict[str, int], Dict[str, str]]:
+    # Вес названия — число вакансий и резюме с таким заголовком. Заголовок
+    # из базы ведёт на роль, под которой он встречается чаще всего;
+    # заголовки без роли в подсказки не попадают: их не принял бы API
+    weighted = defaultdict(int)
+    role_counts = defaultdict(lambda: defaultdict(int))
+    for category in roles_data.get('categories', []):
+        for role in category.get('roles', []):
+            weighted[role['name']] += ROLE_WEIGHT
+            role_counts[normalize(role['name'])][role['id']] += ROLE_WEIGHT
+    if conn is not None:
+        for sql in ('SELECT position, role_id, COUNT(*) FROM vacancies GROUP BY position, role_id',
+                    'SELECT title, role_id, COUNT(*) FROM resumes GROUP BY title, role_id'):
+            try:
+                rows = conn.execute(sql).fetchall()
+            except sqlite3.OperationalError:
+                continue
+            for name, role_id, count in rows:
+                if name and name != 'Не указано' and role_id:
+                    weighted[name] += count
+                    role_counts[normalize(name)][role_id] += count
+    roles = {key: max(counts, key=counts.get) for key, counts in role_counts.items()}
+    return weighted, roles
+
+
+def build_search_index(roles_data: Dict, conn: sqlite3.Connection = None) -> SearchIndex:
+    weighted, roles = load_search_names(roles_data, conn)
+    return SearchIndex(weighted, roles)
@@ -0,0 +1,195 @@
+import argparse
+import sqlite3
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from salary_histogram import sorted_percentiles
+from salary_stats import SOURCES, normalized_salaries
+from storage import DB_PATH, SKILL_LINKS, connect, migrate
+
+# Навыки, которые встречаются реже, в статистику не попадают: медиана по
+# трём вакансиям — шум
+DEFAULT_MIN_COUNT = 20
+
+
+class SkillMatrix:
+    # Разреженная матрица записи x навыки в формате CSR: навыки строки i —
+    # indices[indptr[i]:indptr[i + 1]]. Строки — записи с известной
+    # зарплатой в рублях, колонки — навыки из справочника skills.
+    # Вся статистика считается по массивам, без разбора текста skills.
+
+    def __init__(self, salaries: np.ndarray, roles: pd.Categorical, indptr: np.ndarray, indices: np.ndarray,
+                 skill_ids: np.ndarray, skill_names: np.ndarray):
+        self.salaries = salaries
+        self.roles = roles
+        self.indptr = indptr
+        self.indices = indices
+        self.skill_ids = skill_ids
+        self.skill_names = skill_names
+
+    @property
+    def shape(self) -> tuple:
+        return len(self.salaries), len(self.skill_ids)
+
+    def link_rows(self) -> np.ndarray:
+        # Номер строки для каждого ненулевого элемента
+        return np.repeat(np.arange(len(self.salaries)), np.diff(self.indptr))
+
+    def skill_counts(self) -> np.ndarray:
+        return np.bincount(self.indices, minlength=len(self.skill_ids))
+
+    def row_skills(self, row: int) -> list:
+        return self.skill_names[self.indices[self.indptr[row]:self.indptr[row + 1]]].tolist()
+
+
+def load_skill_matrix(conn: sqlite3.Connection, kind: str, role_ids: Optional[Iterable[str]] = None,
+                      start_month: Optional[str] = None, end_month: Optional[str] = None) -> SkillMatrix:
+    conditions, params = [], []
+    if role_ids is not None:
+        role_ids = list(role_ids)
+        conditions.append(f"role_id IN ({', '.join('?' for _ in role_ids)})")
+        params.extend(role_ids)
+    if start_month:
+        conditions.append('parsed_month >= ?')
+        params.append(start_month)
+    if end_month:
+        conditions.append('parsed_month <= ?')
+        params.append(end_month)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    rows = conn.execute(
+        f"SELECT id, role_id, salary_from, salary_to, {SOURCES[kind]} FROM {kind}{where} ORDER BY id", params
+    ).fetchall()
+    columns = list(zip(*rows)) if rows else [[], [], [], [], []]
+    salaries = normalized_salaries(columns[2], columns[3], columns[4])
+    valid = ~np.isnan(salaries)
+    record_ids = np.asarray(columns[0], dtype=np.int64)[valid]
+    roles = pd.Categorical(np.asarray(columns[1], dtype=object)[valid])
+    salaries = salaries[valid]
+
+    # Связи тех же записей, упорядоченные по записи: это сразу порядок CSR
+    link_table, owner_column = SKILL_LINKS[kind]
+    links = np.array(conn.execute(
+        f"SELECT l.{owner_column}, l.skill_id FROM {link_table} l JOIN {kind} ON {kind}.id = l.{owner_column}"
+        f"{where} ORDER BY l.{owner_column}", params
+    ).fetchall(), dtype=np.int64).reshape(-1, 2)
+    positions = np.searchsorted(record_ids, links[:, 0])
+    found = positions < len(record_ids)
+    found[found] = record_ids[positions[found]] == links[found, 0]
+    link_rows = positions[found]
+    skill_ids, indices = np.unique(links[found, 1], return_inverse=True)
+
+    names = dict(conn.execute('SELECT id, name FROM skills').fetchall())
+    skill_names = np.array([names.get(skill_id, '') for skill_id in skill_ids.tolist()], dtype=object)
+    indptr = np.zeros(len(salaries) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(link_rows, minlength=len(salaries)), out=indptr[1:])
+    return SkillMatrix(salaries, roles, indptr, indices.astype(np.int32), skill_ids, skill_names)
+
+
+def skill_medians(matrix: SkillMatrix, min_count: int = DEFAULT_MIN_COUNT) -> pd.DataFrame:
+    # Квартили и медиана зарплаты по каждому навыку: связи сортируются
+    # по (навык, зарплата), и у каждого навыка получается непрерывный
+    # отсортированный срез
+    link_salaries = matrix.salaries[matrix.link_rows()]
+    order = np.lexsort((link_salaries, matrix.indices))
+    counts = matrix.skill_counts()
+    stops = np.cumsum(counts)
+    percentiles = sorted_percentiles(link_salaries[order], stops - counts, stops, (25, 50, 75))
+    frame = pd.DataFrame({
+        'skill_id': matrix.skill_ids,
+        'skill': matrix.skill_names,
+        'count': counts,
+        'p25': percentiles[:, 0],
+        'median': percentiles[:, 1],
+        'p75': percentiles[:, 2],
+    })
+    frame = frame[frame['count'] >= min_count]
+    return frame.sort_values(['count', 'skill'], ascending=[False, True], ignore_index=True)
+
+
+def skill_premiums(matrix: SkillMatrix, min_count: int = DEFAULT_MIN_COUNT) -> pd.DataFrame:
+    # Надбавка за навык внутри роли: медиана зарплат записей с навыком
+    # к медиане записей роли без него, минус один. Обе медианы точные.
+    # Зарплаты роли сортируются один раз; для группы (роль, навык) из m
+    # записей на позициях p_0 < ... < p_{m-1} j-й элемент дополнения
+    # стоит на позиции j + #{i: p_i - i <= j}, поэтому медиана без
+    # навыка находится бинарным поиском по всем группам сразу.
+    role_codes = matrix.roles.codes.astype(np.int64)
+    role_count = len(matrix.roles.categories)
+    order = np.lexsort((matrix.salaries, role_codes))
+    sorted_salaries = matrix.salaries[order]
+    role_sizes = np.bincount(role_codes, minlength=role_count)
+    role_starts = np.cumsum(role_sizes) - role_sizes
+    # Позиция каждой записи среди отсортированных зарплат её роли
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - np.repeat(role_starts, role_sizes)
+
+    link_roles = role_codes[matrix.link_rows()]
+    link_ranks = rank[matrix.link_rows()]
+    groups = link_roles * len(matrix.skill_ids) + matrix.indices
+    link_order = np.lexsort((link_ranks, groups))
+    groups = groups[link_order]
+    link_ranks = link_ranks[link_order]
+
+    group_keys, group_starts, group_counts = np.unique(groups, return_index=True, return_counts=True)
+    group_roles = group_keys // max(len(matrix.skill_ids), 1)
+    group_skills = group_keys % max(len(matrix.skill_ids), 1)
+    complement = role_sizes[group_roles] - group_counts
+    keep = (group_counts >= min_count) & (complement >= min_count)
+
+    # Медиана с навыком: ранги группы упорядочены, значит и зарплаты
+    with_values = sorted_salaries[role_starts[link_roles[link_order]] + link_ranks]
+    with_median = sorted_percentiles(with_values, group_starts, group_starts + group_counts, (50,))[:, 0]
+
+    # p_i - i не убывает внутри группы; сдвиг на номер группы делает
+    # массив отсортированным целиком
+    group_index = np.repeat(np.arange(len(group_keys)), group_counts)
+    span = len(order) + 1
+    shifted = link_ranks - (np.arange(len(groups)) - group_starts[group_index]) + group_index * span
+
+    def complement_position(j: np.ndarray) -> np.ndarray:
+        below = np.searchsorted(shifted, np.arange(len(group_keys)) * span + j, side='right') - group_starts
+        return role_starts[group_roles] + j + below
+
+    middle = (np.maximum(complement, 1) - 1) / 2
+    low = sorted_salaries[complement_position(np.floor(middle).astype(np.int64))[keep]]
+    high = sorted_salaries[complement_position(np.ceil(middle).astype(np.int64))[keep]]
+    without_median = (low + high) / 2
+
+    frame = pd.DataFrame({
+        'role_id': np.asarray(matrix.roles.categories, dtype=object)[group_roles[keep]],
+        'skill_id': matrix.skill_ids[group_skills[keep]],
+        'skill': matrix.skill_names[group_skills[keep]],
+        'count': group_counts[keep],
+        'median': with_median[keep],
+        'median_without': without_median,
+    })
+    frame['premium'] = frame['median'] / frame['median_without'] - 1
+    return frame.sort_values(['role_id', 'premium'], ascending=[True, False], ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Зарплаты по навыкам: медианы и надбавки внутри роли")
+    parser.add_argument('--db', default=DB_PATH, help="Путь к базе")
+    parser.add_argument('--kind', choices=sorted(SOURCES), default='vacancies', help="Вакансии или резюме")
+    parser.add_argument('--role', action='append', help="id роли (можно несколько), по умолчанию все")
+    parser.add_argument('--min-count', type=int, default=DEFAULT_MIN_COUNT, help="Минимум записей на навык")
+    parser.add_argument('--top', type=int, default=20, help="Сколько строк вывести")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    migrate(conn)
+    matrix = load_skill_matrix(conn, args.kind, args.role)
+    conn.close()
+    rows, skills = matrix.shape
+    print(f"Записей с зарплатой: {rows}, навыков: {skills}, связей: {len(matrix.indices)}")
+    with pd.option_context('display.width', 160, 'display.max_columns', 10):
+        print("\nМедиана зарплаты по навыкам:")
+        print(skill_medians(matrix, args.min_count).head(args.top).to_string(index=False))
+        print("\nНадбавка за навык внутри роли:")
+        print(skill_premiums(matrix, args.min_count).head(args.top).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
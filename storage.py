@@ -0,0 +1,730 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import ChainMap
+from datetime import datetime
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from dedup_index import DedupIndex, content_hash, dedup_path, month_number, record_key
+from metrics import TRANSACTION_BUCKETS, registry as metrics
+
+DB_PATH = 'database.db'
+
+CURRENCY_SYMBOLS = {'RUR': '₽', 'USD': '$', 'EUR': '€'}
+
+VACANCY_COLUMNS = (
+    'hh_id', 'salary_from', 'salary_to', 'salary_text', 'currency',
+    'source', 'location', 'company', 'position', 'experience',
+    'skills', 'url', 'parsed_date', 'parsed_month', 'query', 'role_id'
+)
+
+RESUME_COLUMNS = (
+    'hh_id', 'title', 'salary_from', 'salary_to', 'salary_currency',
+    'age', 'gender', 'location', 'experience_years', 'skills',
+    'education', 'languages', 'url', 'parsed_date', 'parsed_month', 'role_id'
+)
+
+
+# Служебное поле записи с хэшем карточки из выдачи (см. DedupIndex)
+LISTING_HASH_FIELD = '_listing_hash'
+
+# Записи уникальны в пределах месяца: повторный сбор за тот же месяц
+# обновляет строку, а прошлые месяцы остаются как история
+UNIQUE_KEY = ('hh_id', 'parsed_month')
+
+
+# Таблицы связей записи с навыками и колонка id записи в них
+SKILL_LINKS = {
+    'vacancies': ('vacancy_skills', 'vacancy_id'),
+    'resumes': ('resume_skills', 'resume_id'),
+}
+# Сколько параметров подставляется в один IN (...): лимит SQLite — 999
+_IN_CHUNK = 500
+
+
+def skill_key(name: str) -> str:
+    # Один навык в разном написании ("PostgreSQL", "postgresql ",
+    # "Ёмкость"/"емкость") — одна строка справочника
+    return ' '.join(name.replace('ё', 'е').replace('Ё', 'Е').split()).casefold()
+
+
+def _chunks(values: list, size: int = _IN_CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def skill_ids(conn: sqlite3.Connection, names: Iterable[str], known: Mapping[str, int]) -> Dict[str, int]:
+    # id навыков по ключу; отсутствующие в справочнике добавляются.
+    # known — уже известные id, возвращаются только новые
+    missing = {}
+    for name in names:
+        key = skill_key(name)
+        if key and key not in known and key not in missing:
+            missing[key] = name.strip()
+    if not missing:
+        return {}
+    conn.executemany('INSERT INTO skills (key, name) VALUES (?, ?) ON CONFLICT (key) DO NOTHING',
+                     list(missing.items()))
+    found = {}
+    for keys in _chunks(list(missing)):
+        found.update(conn.execute(
+            f"SELECT key, id FROM skills WHERE key IN ({', '.join('?' for _ in keys)})", keys
+        ).fetchall())
+    return found
+
+
+def link_skills(conn: sqlite3.Connection, table: str, links: Sequence[Tuple[int, Sequence[str]]],
+                known: Mapping[str, int]) -> Dict[str, int]:
+    # links: (id записи, названия навыков). Старые связи записей
+    # заменяются новыми; возвращаются id навыков, добавленных в справочник
+    link_table, owner_column = SKILL_LINKS[table]
+    new_ids = skill_ids(conn, (name for _, names in links for name in names), known)
+    conn.executemany(f"DELETE FROM {link_table} WHERE {owner_column} = ?", [(owner,) for owner, _ in links])
+    pairs = set()
+    for owner, names in links:
+        for name in names:
+            key = skill_key(name)
+            if key:
+                pairs.add((owner, known[key] if key in known else new_ids[key]))
+    conn.executemany(f"INSERT INTO {link_table} ({owner_column}, skill_id) VALUES (?, ?)", sorted(pairs))
+    return new_ids
+
+
+def _backfill_skills(conn: sqlite3.Connection):
+    # Навыки строк, записанных до появления справочника, — из текстовой колонки skills
+    known = {}
+    for table in SKILL_LINKS:
+        cursor = conn.execute(f"SELECT id, skills FROM {table} WHERE skills IS NOT NULL AND skills != ''")
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            known.update(link_skills(conn, table, [(row_id, skills.split(', ')) for row_id, skills in rows], known))
+
+
+def _upsert_sql(table: str, columns: tuple) -> str:
+    placeholders = ', '.join('?' for _ in columns)
+    updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column not in UNIQUE_KEY)
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+        f"ON CONFLICT ({', '.join(UNIQUE_KEY)}) DO UPDATE SET {updates}"
+    )
+
+
+# Миграции схемы: номер версии хранится в PRAGMA user_version,
+# при открытии базы применяются все ещё не применённые шаги.
+# Шаг — SQL-выражение или функция от соединения (перенос данных)
+MIGRATIONS = [
+    # 1: исходные таблицы
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS vacancies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hh_id TEXT,
+            salary_from INTEGER,
+            salary_to INTEGER,
+            salary_text TEXT,
+            currency TEXT,
+            source TEXT,
+            location TEXT,
+            company TEXT,
+            position TEXT,
+            experience TEXT,
+            skills TEXT,
+            url TEXT,
+            parsed_date TEXT,
+            parsed_month TEXT,
+            query TEXT,
+            role_id TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS resumes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hh_id TEXT,
+            title TEXT,
+            salary_from INTEGER,
+            salary_to INTEGER,
+            salary_currency TEXT,
+            age INTEGER,
+            gender TEXT,
+            location TEXT,
+            experience_years INTEGER,
+            skills TEXT,
+            education TEXT,
+            languages TEXT,
+            url TEXT,
+            parsed_date TEXT,
+            parsed_month TEXT,
+            role_id TEXT
+        )
+        ''',
+    ],
+    # 2: уникальный ключ (hh_id, parsed_month); дубли от старых запусков схлопываются
+    [
+        '''
+        DELETE FROM vacancies WHERE hh_id IS NOT NULL AND id NOT IN (
+            SELECT MAX(id) FROM vacancies WHERE hh_id IS NOT NULL GROUP BY hh_id, parsed_month
+        )
+        ''',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_vacancies_hh_month ON vacancies (hh_id, parsed_month)',
+        '''
+        DELETE FROM resumes WHERE hh_id IS NOT NULL AND id NOT IN (
+            SELECT MAX(id) FROM resumes WHERE hh_id IS NOT NULL GROUP BY hh_id, parsed_month
+        )
+        ''',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_resumes_hh_month ON resumes (hh_id, parsed_month)',
+    ],
+    # 3: индексы для выборок по роли и месяцу и предрасчитанная статистика зарплат.
+    # Поиск по hh_id обслуживает уникальный индекс (hh_id, parsed_month).
+    [
+        'CREATE INDEX IF NOT EXISTS idx_vacancies_role_month ON vacancies (role_id, parsed_month)',
+        'CREATE INDEX IF NOT EXISTS idx_vacancies_month ON vacancies (parsed_month)',
+        'CREATE INDEX IF NOT EXISTS idx_resumes_role_month ON resumes (role_id, parsed_month)',
+        'CREATE INDEX IF NOT EXISTS idx_resumes_month ON resumes (parsed_month)',
+        '''
+        CREATE TABLE IF NOT EXISTS salary_stats (
+            kind TEXT NOT NULL,
+            role_id TEXT NOT NULL,
+            parsed_month TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            mean REAL,
+            p10 REAL,
+            p20 REAL,
+            p30 REAL,
+            p40 REAL,
+            p50 REAL,
+            p60 REAL,
+            p70 REAL,
+            p80 REAL,
+            p90 REAL,
+            bin_step INTEGER NOT NULL,
+            bins TEXT NOT NULL,
+            refreshed_at TEXT NOT NULL,
+            PRIMARY KEY (kind, role_id, parsed_month)
+        )
+        ''',
+    ],
+    # 4: квантильные скетчи KLL по (kind, role_id, parsed_month) для слияния по периодам и группам ролей
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS salary_sketches (
+            kind TEXT NOT NULL,
+            role_id TEXT NOT NULL,
+            parsed_month TEXT NOT NULL,
+            k INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            sketch BLOB NOT NULL,
+            refreshed_at TEXT NOT NULL,
+            PRIMARY KEY (kind, role_id, parsed_month)
+        )
+        ''',
+    ],
+    # 5: контрольные точки сбора: следующая страница поиска по роли и типу данных
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS crawl_checkpoints (
+            role_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            next_page INTEGER NOT NULL,
+            saved INTEGER NOT NULL,
+            started_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            completed_at TEXT,
+            PRIMARY KEY (role_id, kind)
+        )
+        ''',
+    ],
+    # 6: справочник навыков и связи с вакансиями и резюме. Текстовая
+    # колонка skills остаётся для выдачи записей, аналитика идёт по связям
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS skills (
+            id INTEGER PRIMARY KEY,
+            key TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS vacancy_skills (
+            vacancy_id INTEGER NOT NULL,
+            skill_id INTEGER NOT NULL,
+            PRIMARY KEY (vacancy_id, skill_id)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_vacancy_skills_skill ON vacancy_skills (skill_id)',
+        '''
+        CREATE TABLE IF NOT EXISTS resume_skills (
+            resume_id INTEGER NOT NULL,
+            skill_id INTEGER NOT NULL,
+            PRIMARY KEY (resume_id, skill_id)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_resume_skills_skill ON resume_skills (skill_id)',
+        _backfill_skills,
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection):
+    version = schema_version(conn)
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        with conn:
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {number}')
+
+
+def init_db(db_path: str = DB_PATH, reset: bool = False):
+    conn = connect(db_path)
+    if reset:
+        with conn:
+            conn.execute('DROP TABLE IF EXISTS vacancies')
+            conn.execute('DROP TABLE IF EXISTS resumes')
+            conn.execute('DROP TABLE IF EXISTS salary_stats')
+            conn.execute('DROP TABLE IF EXISTS salary_sketches')
+            conn.execute('DROP TABLE IF EXISTS crawl_checkpoints')
+            conn.execute('DROP TABLE IF EXISTS vacancy_skills')
+            conn.execute('DROP TABLE IF EXISTS resume_skills')
+            conn.execute('DROP TABLE IF EXISTS skills')
+            conn.execute('PRAGMA user_version = 0')
+        # Индекс дублей описывает удалённые строки и больше не нужен
+        if os.path.exists(dedup_path(db_path)):
+            os.remove(dedup_path(db_path))
+    migrate(conn)
+    conn.close()
+
+
+def process_salary(salary: Optional[Dict]) -> tuple:
+    if not salary:
+        return None, None, None
+
+    currency = salary.get('currency', 'RUR')
+    currency = CURRENCY_SYMBOLS.get(currency, currency)
+
+    salary_from = salary.get('from')
+    salary_to = salary.get('to')
+
+    if salary_from and salary_to:
+        salary_str = f"{salary_from} - {salary_to}"
+    elif salary_from:
+        salary_str = f"от {salary_from}"
+    elif salary_to:
+        salary_str = f"до {salary_to}"
+    else:
+        salary_str = "Не указана"
+
+    return salary_str, currency, (salary_from, salary_to)
+
+
+class _Record:
+    # Разобранная запись API: только поля, которые пишутся в базу.
+    # Со __slots__ у экземпляра нет __dict__, и запись занимает сотни
+    # байт вместо десятков килобайт исходного JSON
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def astuple(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self.astuple() == other.astuple()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+
+class VacancyRecord(_Record):
+    __slots__ = ('hh_id', 'salary_from', 'salary_to', 'salary_text', 'currency', 'location', 'company',
+                 'position', 'experience', 'skills', 'url', 'listing_hash')
+
+    @classmethod
+    def from_api(cls, vacancy: Dict) -> 'VacancyRecord':
+        salary_text, currency, (salary_from, salary_to) = process_salary(vacancy.get('salary'))
+
+        experience = vacancy.get('experience', {}).get('name', 'Не указан')
+        skills = tuple(skill.get('name', '') for skill in vacancy.get('key_skills', []))
+
+        return cls(
+            vacancy.get('id'),
+            salary_from,
+            salary_to,
+            salary_text,
+            currency,
+            vacancy.get('area', {}).get('name', 'Не указано'),
+            vacancy.get('employer', {}).get('name', 'Не указано'),
+            vacancy.get('name', 'Не указано'),
+            experience,
+            skills,
+            vacancy.get('alternate_url'),
+            vacancy.get(LISTING_HASH_FIELD),
+        )
+
+    def to_row(self, role_id: str, parsed_date: str, parsed_month: str) -> tuple:
+        return (
+            self.hh_id,
+            self.salary_from,
+            self.salary_to,
+            self.salary_text,
+            self.currency,
+            'hh.ru',
+            self.location,
+            self.company,
+            self.position,
+            self.experience,
+            ', '.join(self.skills),
+            self.url,
+            parsed_date,
+            parsed_month,
+            f"professional_role={role_id}",
+            role_id
+        )
+
+
+class ResumeRecord(_Record):
+    __slots__ = ('hh_id', 'title', 'salary_from', 'salary_to', 'salary_currency', 'age', 'gender', 'location',
+                 'experience_years', 'skills', 'education', 'languages', 'url', 'listing_hash')
+
+    @classmethod
+    def from_api(cls, resume: Dict) -> 'ResumeRecord':
+        # Обработка зарплаты
+        salary = resume.get('salary', {})
+        salary_from = salary.get('amount')
+        salary_to = salary.get('amount')  # В резюме обычно указывается одна сумма
+        salary_currency = salary.get('currency', 'RUR')
+        salary_currency = CURRENCY_SYMBOLS.get(salary_currency, salary_currency)
+
+        # Обработка навыков
+        skills = tuple(skill.get('name', '') for skill in resume.get('skills', []))
+
+        # Обработка образования
+        education = []
+        for edu in resume.get('education', {}).get('primary', []):
+            if edu.get('name'):
+                education.append(edu['name'])
+        education_str = '; '.join(education)
+
+        # Обработка языков
+        languages = []
+        for lang in resume.get('language', []):
+            if lang.get('name'):
+                languages.append(lang['name'])
+        languages_str = '; '.join(languages)
+
+        return cls(
+            resume.get('id'),
+            resume.get('title', 'Не указано'),
+            salary_from,
+            salary_to,
+            salary_currency,
+            resume.get('age'),
+            resume.get('gender', {}).get('name', 'Не указано'),
+            resume.get('area', {}).get('name', 'Не указано'),
+            resume.get('total_experience', {}).get('months', 0) // 12,
+            skills,
+            education_str,
+            languages_str,
+            resume.get('alternate_url'),
+            resume.get(LISTING_HASH_FIELD),
+        )
+
+    def to_row(self, role_id: str, parsed_date: str, parsed_month: str) -> tuple:
+        return (
+            self.hh_id,
+            self.title,
+            self.salary_from,
+            self.salary_to,
+            self.salary_currency,
+            self.age,
+            self.gender,
+            self.location,
+            self.experience_years,
+            ', '.join(self.skills),
+            self.education,
+            self.languages,
+            self.url,
+            parsed_date,
+            parsed_month,
+            role_id
+        )
+
+
+RECORD_TYPES = {'vacancies': VacancyRecord, 'resumes': ResumeRecord}
+
+
+def as_record(table: str, item) -> _Record:
+    # DBWriter принимает и ответы API, и уже разобранные записи
+    record_type = RECORD_TYPES[table]
+    return item if isinstance(item, record_type) else record_type.from_api(item)
+
+
+def to_records(table: str, items: List[Dict]) -> List[_Record]:
+    # Ответы API, которые не удалось разобрать, пропускаются, как и при записи в базу
+    records = []
+    for item in items:
+        try:
+            records.append(RECORD_TYPES[table].from_api(item))
+        except Exception as e:
+            print(f"Ошибка при подготовке записи {item.get('id')} для таблицы {table}: {e}")
+    return records
+
+
+def vacancy_row(vacancy: Dict, role_id: str, parsed_date: str, parsed_month: str) -> tuple:
+    return as_record('vacancies', vacancy).to_row(role_id, parsed_date, parsed_month)
+
+
+def resume_row(resume: Dict, role_id: str, parsed_date: str, parsed_month: str) -> tuple:
+    return as_record('resumes', resume).to_row(role_id, parsed_date, parsed_month)
+
+
+# Подготовленная порция записей: (role_id, parsed_month, строки для
+# записи, навыки этих строк, записи для индекса дублей, сколько строк
+# пропущено как неизменные)
+PreparedRows = Tuple[str, str, List[tuple], List[tuple], List[tuple], int]
+
+
+def connect(db_path: str = DB_PATH, check_same_thread: bool = True) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=check_same_thread)
+    # WAL позволяет читать базу во время записи, NORMAL не делает fsync на каждый коммит
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-65536')
+    return conn
+
+
+# Ошибки, которые вызывает содержимое строки, а не база: из-за них
+# отбрасывается только эта строка
+ROW_ERRORS = (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError)
+
+
+class DBWriter:
+    # Одно соединение на весь прогон. Записи превращаются в кортежи
+    # и пишутся пачками через executemany в одной транзакции на пачку.
+    # Запись идёт как upsert по (hh_id, parsed_month). Потоки сбора могут
+    # писать через общий writer: доступ к соединению идёт под блокировкой.
+    # С dedup строки, которые в этом месяце уже записаны с тем же
+    # содержимым, повторно не пишутся. Навыки записей раскладываются по
+    # справочнику skills и таблицам связей в той же транзакции.
+
+    def __init__(self, db_path: str = DB_PATH, batch_size: int = 1000, dedup: Optional[DedupIndex] = None):
+        self.conn = connect(db_path, check_same_thread=False)
+        migrate(self.conn)
+        self._lock = threading.RLock()
+        self.dedup = dedup
+        # Записи для индекса, ждущие фиксации транзакции
+        self._dedup_pending = []
+        if dedup is not None and len(dedup) and not self._has_rows():
+            # База пересоздана мимо init_db: индекс описывает чужие строки
+            dedup.clear()
+        self.batch_size = batch_size
+        # Пары (role_id, parsed_month), затронутые записью: по ним
+        # после загрузки пересчитывается salary_stats
+        self.touched = set()
+        self._buffers = {'vacancies': [], 'resumes': []}
+        # (hh_id, parsed_month, навыки) строк из буферов
+        self._skill_buffers = {'vacancies': [], 'resumes': []}
+        # id навыков справочника: подтверждённые и добавленные в текущей транзакции
+        self._skill_ids: Dict[str, int] = {}
+        self._skill_ids_pending: Dict[str, int] = {}
+        self._sql = {
+            'vacancies': _upsert_sql('vacancies', VACANCY_COLUMNS),
+            'resumes': _upsert_sql('resumes', RESUME_COLUMNS),
+        }
+
+    def _has_rows(self) -> bool:
+        return bool(self.conn.execute(
+            'SELECT EXISTS (SELECT 1 FROM vacancies) OR EXISTS (SELECT 1 FROM resumes)'
+        ).fetchone()[0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _add(self, table: str, items: List[Dict], role_id: str, parsed_at: Optional[datetime] = None) -> int:
+        return self.add_prepared(table, self.prepare(table, items, role_id, parsed_at))
+
+    def prepare(self, table: str, items: List[Dict], role_id: str,
+                parsed_at: Optional[datetime] = None) -> PreparedRows:
+        # Превращение записей в строки и хэши для индекса дублей, без
+        # блокировки: конвейер сбора готовит следующую страницу, пока
+        # пишется предыдущая. parsed_at задаёт дату сбора для загрузки
+        # старых данных (выгрузки страниц), по умолчанию — текущий момент
+        now = parsed_at or datetime.now()
+        parsed_date = now.strftime('%Y-%m-%d %H:%M:%S')
+        parsed_month = now.strftime('%Y-%m')
+        date_column = (VACANCY_COLUMNS if table == 'vacancies' else RESUME_COLUMNS).index('parsed_date')
+        month = month_number(parsed_month)
+        rows, skills, dedup_entries, unchanged = [], [], [], 0
+        for item in items:
+            try:
+                record = as_record(table, item)
+            except Exception as e:
+                print(f"Ошибка при подготовке записи {item.get('id')} для таблицы {table}: {e}")
+                continue
+            row = record.to_row(role_id, parsed_date, parsed_month)
+            if self.dedup is not None:
+                # Дата сбора в хэш не входит: она меняется при каждом запуске
+                key = record_key(table, row[0])
+                content = content_hash(row[:date_column] + row[date_column + 1:])
+                dedup_entries.append((key, record.listing_hash, content, month))
+                if self.dedup.is_unchanged(key, content, month):
+                    unchanged += 1
+                    continue
+            rows.append(row)
+            skills.append((row[0], parsed_month, record.skills))
+        return role_id, parsed_month, rows, skills, dedup_entries, unchanged
+
+    def add_prepared(self, table: str, prepared: PreparedRows) -> int:
+        role_id, parsed_month, rows, skills, dedup_entries, unchanged = prepared
+        with self._lock:
+            self.touched.add((role_id, parsed_month))
+            if unchanged:
+                metrics.inc('dedup_total', unchanged, {'kind': table, 'outcome': 'row_unchanged'})
+            buffer = self._buffers[table]
+            buffer.extend(rows)
+            self._skill_buffers[table].extend(skills)
+            self._dedup_pending.extend(dedup_entries)
+            if len(buffer) >= self.batch_size:
+                self.flush()
+        return len(rows)
+
+    def add_vacancies(self, vacancies: List[Dict], role_id: str, parsed_at: Optional[datetime] = None) -> int:
+        return self._add('vacancies', vacancies, role_id, parsed_at)
+
+    def add_resumes(self, resumes: List[Dict], role_id: str) -> int:
+        return self._add('resumes', resumes, role_id)
+
+    def _write_buffers(self):
+        # Id навыков, оставшиеся от откатившейся транзакции, недействительны
+        self._skill_ids_pending = {}
+        for table, buffer in self._buffers.items():
+            if buffer:
+                written = self._write_rows(table, buffer)
+                metrics.inc('db_rows_written_total', written, {'table': table})
+                buffer.clear()
+                self._write_skills(table)
+
+    def _write_rows(self, table: str, rows: List[tuple]) -> int:
+        # Пачка пишется одним executemany. Если одна строка её обрывает
+        # (тип, который sqlite не принимает, нарушение ограничения), пачка
+        # повторяется построчно: upsert идемпотентен, уже записанные строки
+        # не задваиваются, а плохие пропускаются и не попадают ни в связи
+        # с навыками, ни в индекс дублей
+        try:
+            self.conn.executemany(self._sql[table], rows)
+            return len(rows)
+        except ROW_ERRORS as e:
+            print(f"Пачка из {len(rows)} строк для таблицы {table} не записалась ({e}), записываем построчно")
+        failed = set()
+        for row in rows:
+            try:
+                self.conn.execute(self._sql[table], row)
+            except ROW_ERRORS as e:
+                print(f"Ошибка при сохранении записи {row[0]} в таблицу {table}: {e}")
+                failed.add(row[0])
+        if failed:
+            metrics.inc('db_rows_failed_total', len(failed), {'table': table})
+            skills = self._skill_buffers[table]
+            skills[:] = [entry for entry in skills if entry[0] not in failed]
+            failed_keys = {record_key(table, hh_id) for hh_id in failed}
+            self._dedup_pending = [entry for entry in self._dedup_pending if entry[0] not in failed_keys]
+        return len(rows) - len(failed)
+
+    def _write_skills(self, table: str):
+        # Связи с навыками пишутся после upsert: у новых строк только
+        # теперь есть id. Строка без hh_id по ключу не находится и
+        # остаётся без связей
+        pending = self._skill_buffers[table]
+        hh_ids = {}
+        for hh_id, parsed_month, _ in pending:
+            if hh_id is not None:
+                hh_ids.setdefault(parsed_month, {})[str(hh_id)] = None
+        row_ids = {}
+        for parsed_month, month_ids in hh_ids.items():
+            for chunk in _chunks(list(month_ids)):
+                for hh_id, row_id in self.conn.execute(
+                    f"SELECT hh_id, id FROM {table} WHERE parsed_month = ? "
+                    f"AND hh_id IN ({', '.join('?' for _ in chunk)})", [parsed_month] + chunk
+                ):
+                    row_ids[(hh_id, parsed_month)] = row_id
+        # Запись, собранная дважды за пачку, получает навыки последней версии
+        links = {}
+        for hh_id, parsed_month, names in pending:
+            row_id = row_ids.get((str(hh_id), parsed_month))
+            if row_id is not None:
+                links[row_id] = names
+        pending.clear()
+        if links:
+            self._skill_ids_pending.update(link_skills(
+                self.conn, table, list(links.items()), ChainMap(self._skill_ids_pending, self._skill_ids)
+            ))
+
+    def _committed(self):
+        # Вызывается после фиксации транзакции: индекс дублей и кэш id
+        # навыков не опережают базу
+        self._skill_ids.update(self._skill_ids_pending)
+        self._skill_ids_pending = {}
+        if self.dedup is not None and self._dedup_pending:
+            self.dedup.update(self._dedup_pending)
+            self._dedup_pending = []
+
+    def flush(self):
+        with self._lock:
+            started = time.perf_counter()
+            with self.conn:
+                self._write_buffers()
+            self._committed()
+            metrics.observe('db_transaction_seconds', time.perf_counter() - started, {'op': 'flush'},
+                            TRANSACTION_BUCKETS)
+
+    def checkpoint(self, role_id: str, kind: str, next_page: int, saved: int, completed: bool = False):
+        # Накопленные записи и курсор фиксируются одной транзакцией:
+        # после сбоя в базе не бывает страниц без курсора и наоборот
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            with metrics.timer('db_transaction_seconds', {'op': 'checkpoint'}, TRANSACTION_BUCKETS), self.conn:
+                self._write_buffers()
+                self.conn.execute(
+                    'INSERT INTO crawl_checkpoints (role_id, kind, next_page, saved, started_at, updated_at, completed_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (role_id, kind) DO UPDATE SET next_page = excluded.next_page, saved = excluded.saved, '
+                    'updated_at = excluded.updated_at, completed_at = excluded.completed_at',
+                    (role_id, kind, next_page, saved, now, now, now if completed else None)
+                )
+            self._committed()
+
+    def load_checkpoint(self, role_id: str, kind: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT next_page, saved, started_at, updated_at, completed_at FROM crawl_checkpoints '
+                'WHERE role_id = ? AND kind = ?', (role_id, kind)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('next_page', 'saved', 'started_at', 'updated_at', 'completed_at'), row))
+
+    def reset_checkpoint(self, role_id: str, kind: str):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM crawl_checkpoints WHERE role_id = ? AND kind = ?', (role_id, kind))
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+        if self.dedup is not None:
+            self.dedup.save()
@@ -0,0 +1,91 @@
+import pytest
+
+from benchmarks import stub_server
+from metrics import registry as metrics
+from parse_vacancies_resumes import PER_PAGE, HHAPIParser, crawl_role
+from rate_limiter import TokenBucket
+from storage import DBWriter
+
+
+@pytest.fixture
+def stub():
+    state = stub_server.StubState(latency=0.0, jitter=0.0)
+    server = stub_server.start(state)
+    yield state, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def writer(tmp_path):
+    with DBWriter(str(tmp_path / 'crawl.db')) as db_writer:
+        yield db_writer
+
+
+def make_parser(base_url: str, **kwargs) -> HHAPIParser:
+    parser = HHAPIParser(base_url=base_url, **kwargs)
+    # Случайные паузы между страницами заглушке не нужны
+    parser._pause = lambda low, high: None
+    return parser
+
+
+def count_rows(writer: DBWriter, table: str, role_id: str) -> int:
+    return writer.conn.execute(f"SELECT COUNT(*) FROM {table} WHERE role_id = ?", (role_id,)).fetchone()[0]
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_crawl_saves_pages_and_completes_checkpoint(stub, writer, workers):
+    state, base_url = stub
+    saved, completed = crawl_role(make_parser(base_url, max_workers=workers), writer, '96', 'vacancies',
+                                  max_items=100)
+    assert (saved, completed) == (100, True)
+    assert count_rows(writer, 'vacancies', '96') == 100
+    assert state.requests == 100 // PER_PAGE
+    checkpoint = writer.load_checkpoint('96', 'vacancies')
+    assert checkpoint['next_page'] == 5 and checkpoint['completed_at'] is not None
+
+
+def test_resume_details_are_fetched_per_resume(stub, writer):
+    state, base_url = stub
+    saved, completed = crawl_role(make_parser(base_url), writer, '96', 'resumes', max_items=40, known_ids=set())
+    assert (saved, completed) == (40, True)
+    assert count_rows(writer, 'resumes', '96') == 40
+    # Две страницы поиска и детали каждого резюме
+    assert state.requests == 2 + 40
+
+
+def test_throttled_requests_are_retried(stub, writer):
+    state, base_url = stub
+    # Последовательный сбор: ответы с 429 выпадают на одни и те же запросы
+    state.error_rate, state.error_status, state.retry_after = 0.3, 429, 0.01
+    metrics.reset()
+    parser = make_parser(base_url, rate_limiter=TokenBucket(rate=500, capacity=50, max_rate=1000))
+    saved, completed = crawl_role(parser, writer, '96', 'vacancies', max_items=200)
+    assert (saved, completed) == (200, True)
+    assert state.errors > 0
+    assert metrics.counter('hh_retries_total') == state.errors
+    assert state.requests == 200 // PER_PAGE + state.errors
+
+
+def test_budget_stop_resumes_from_checkpoint(stub, writer):
+    state, base_url = stub
+    parser = make_parser(base_url)
+    parser.request_budget = 2
+    assert crawl_role(parser, writer, '96', 'vacancies', max_items=100) == (2 * PER_PAGE, False)
+    checkpoint = writer.load_checkpoint('96', 'vacancies')
+    assert checkpoint['next_page'] == 2 and checkpoint['completed_at'] is None
+
+    # Следующий запуск начинает с третьей страницы, первые две не запрашиваются
+    parser.request_budget = None
+    before = state.requests
+    assert crawl_role(parser, writer, '96', 'vacancies', max_items=100) == (3 * PER_PAGE, True)
+    assert state.requests - before == 3
+    assert count_rows(writer, 'vacancies', '96') == 100
+    assert writer.load_checkpoint('96', 'vacancies')['completed_at'] is not None
+
+
+def test_results_ending_on_full_page_complete_checkpoint(stub, writer, monkeypatch):
+    # Выдача кратна PER_PAGE и меньше max_items: последняя страница полная
+    monkeypatch.setattr(stub_server, 'FOUND', 3 * PER_PAGE)
+    _, base_url = stub
+    assert crawl_role(make_parser(base_url), writer, '96', 'vacancies', max_items=100) == (3 * PER_PAGE, True)
+    assert writer.load_checkpoint('96', 'vacancies')['completed_at'] is not None
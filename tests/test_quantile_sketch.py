@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from quantile_sketch import DEFAULT_K, KLLSketch, merge_sketches, self_check
+from salary_stats import load_sketch
+from storage import connect, migrate
+
+
+def rank_errors(exact: np.ndarray, sketch: KLLSketch, q=np.arange(1, 100)) -> np.ndarray:
+    # Насколько ранг оценки перцентиля отходит от целевого
+    estimates = sketch.percentiles(q)
+    low = np.searchsorted(exact, estimates, side='left') / len(exact)
+    high = np.searchsorted(exact, estimates, side='right') / len(exact)
+    target = q / 100
+    return np.where(target < low, low - target, np.where(target > high, target - high, 0.0))
+
+
+def salaries(size: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.round(rng.lognormal(mean=11.7, sigma=0.5, size=size), -3)
+
+
+@pytest.mark.parametrize('k', [100, DEFAULT_K])
+def test_self_check_within_bound(k):
+    assert self_check(k, size=50000) <= KLLSketch(k).rank_error_bound
+
+
+def test_merged_parts_match_exact_percentiles():
+    values = salaries(60000)
+    merged = merge_sketches(KLLSketch.from_values(part, seed=i) for i, part in enumerate(np.array_split(values, 12)))
+    assert merged.n == len(values)
+    assert merged.min == values.min() and merged.max == values.max()
+    assert rank_errors(np.sort(values), merged).max() <= merged.rank_error_bound
+
+
+@pytest.mark.parametrize('first_k, second_k', [(200, 100), (100, 200)])
+def test_merge_with_different_k_compacts_to_smaller(first_k, second_k):
+    values = salaries(40000, seed=1)
+    first, second = np.array_split(values, 2)
+    merged = KLLSketch.from_values(first, first_k, seed=0).merge(KLLSketch.from_values(second, second_k, seed=1))
+    assert merged.k == 100
+    assert merged.n == len(values)
+    assert merged._retained() <= merged._max_retained()
+    assert rank_errors(np.sort(values), merged).max() <= merged.rank_error_bound
+
+
+def test_load_sketch_merges_months_with_different_k(tmp_path):
+    # Часть месяцев пересчитана с другим --sketch-k: слияние не падает
+    conn = connect(str(tmp_path / 'sketch.db'))
+    migrate(conn)
+    values = salaries(20000, seed=2)
+    for month, part, k in zip(('2026-01', '2026-02', '2026-03'), np.array_split(values, 3), (200, 100, 400)):
+        sketch = KLLSketch.from_values(part, k, seed=0)
+        conn.execute(
+            'INSERT INTO salary_sketches (kind, role_id, parsed_month, k, count, sketch, refreshed_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', ('vacancies', '96', month, k, sketch.n, sketch.to_bytes(), '2026-04-01')
+        )
+    merged = load_sketch(conn, 'vacancies', ['96'], '2026-01', '2026-03')
+    conn.close()
+    assert merged.k == 100
+    assert merged.n == len(values)
+    assert rank_errors(np.sort(values), merged).max() <= merged.rank_error_bound